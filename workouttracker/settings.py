@@ -10,9 +10,12 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.0/ref/settings/
 """
 
+import os
 from datetime import timedelta
 from pathlib import Path
 
+import dj_database_url
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -63,6 +66,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'workouttracker.tracker.middleware.ProfilingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
 
     'django.middleware.security.SecurityMiddleware',
@@ -72,6 +76,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'workouttracker.tracker.middleware.ReplicaPinMiddleware',
     #'workouttracker.tracker.middleware.MoveJWTRefreshCookieIntoTheBody',
 ]
 
@@ -99,14 +104,173 @@ WSGI_APPLICATION = 'workouttracker.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.0/ref/settings/#databases
 
+#
+# DATABASE_URL selects the primary database, e.g.
+# postgres://tracker:secret@db:5432/tracker; without it a local SQLite file is
+# used. Connections are kept for DATABASE_CONN_MAX_AGE seconds instead of being
+# opened for every request (0 closes them after each request). With
+# DATABASE_HEALTH_CHECKS=1 a kept connection is checked when a request starts
+# and replaced if the server has dropped it.
+#
+# Behind pgbouncer in transaction pooling mode set DATABASE_POOLER=pgbouncer:
+# a server-side cursor does not survive the pooled transaction, so they are
+# disabled.
+#
+# DATABASE_REPLICA_URLS is a comma-separated list of read replicas. Safe
+# requests to the tracker viewsets read tracker models from them; everything
+# else uses the primary. After a write, the user's reads stay on the primary
+# for DATABASE_REPLICA_PIN_SECONDS, which must exceed the replication lag.
+
+DATABASE_CONN_MAX_AGE = int(os.environ.get('DATABASE_CONN_MAX_AGE', 60))
+
 DATABASES = {
+    'default': dj_database_url.config(
+        default='sqlite:///%s' % (BASE_DIR / 'db.sqlite3'), conn_max_age=DATABASE_CONN_MAX_AGE),
+}
+
+for i, url in enumerate(filter(None, os.environ.get('DATABASE_REPLICA_URLS', '').split(','))):
+    DATABASES['replica_%s' % i] = dj_database_url.parse(url.strip(), conn_max_age=DATABASE_CONN_MAX_AGE)
+    DATABASES['replica_%s' % i]['TEST'] = {'MIRROR': 'default'}
+
+if os.environ.get('DATABASE_POOLER') == 'pgbouncer':
+    for database in DATABASES.values():
+        database['DISABLE_SERVER_SIDE_CURSORS'] = True
+
+TRACKER_DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+
+TRACKER_REPLICA_PIN_SECONDS = int(os.environ.get('DATABASE_REPLICA_PIN_SECONDS', 10))
+
+TRACKER_DB_HEALTH_CHECKS = os.environ.get('DATABASE_HEALTH_CHECKS') == '1'
+
+DATABASE_ROUTERS = ['workouttracker.tracker.db.ReplicaRouter']
+
+# Adds the replica aliases the router tests read from.
+TEST_RUNNER = 'workouttracker.tracker.testing.TrackerTestRunner'
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.0/topics/cache/
+#
+# The 'tracker' cache holds per-user list responses and the versions that
+# invalidate them, which every worker must see. List responses are therefore
+# only cached when REDIS_URL points at a shared Redis server (configured with
+# an LRU maxmemory-policy). TRACKER_RESPONSE_CACHE=1 caches them in the
+# per-process LocMemCache too, which is only correct with a single worker;
+# TRACKER_RESPONSE_CACHE=0 turns the cache off.
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'tracker': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'tracker',
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+}
+
+if os.environ.get('REDIS_URL'):
+    CACHES['tracker'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['REDIS_URL'],
+        'TIMEOUT': 300,
+        'KEY_PREFIX': 'workouttracker',
     }
+
+TRACKER_CACHE_ALIAS = 'tracker'
+
+TRACKER_RESPONSE_CACHE = os.environ.get(
+    'TRACKER_RESPONSE_CACHE', '1' if os.environ.get('REDIS_URL') else '0') == '1'
+
+
+# Async reads
+#
+# With TRACKER_ASYNC_READS=1, under an ASGI server list and retrieve requests
+# of the workout, exercise and set viewsets run concurrently on a pool of
+# TRACKER_ASYNC_READ_WORKERS threads. Each worker holds its own database
+# connection. It is off by default: in load tests the pool has been slower
+# than WSGI.
+
+TRACKER_ASYNC_READS = os.environ.get('TRACKER_ASYNC_READS') == '1'
+
+TRACKER_ASYNC_READ_WORKERS = int(os.environ.get('TRACKER_ASYNC_READ_WORKERS', 16))
+
+
+# Soft delete
+#
+# Deleted workouts, exercises, sets, exercise types and body weights are kept
+# for TRACKER_SOFT_DELETE_RETENTION_DAYS days before `manage.py purge_deleted`
+# removes them; schedule it to run daily.
+
+TRACKER_SOFT_DELETE_RETENTION_DAYS = int(os.environ.get('TRACKER_SOFT_DELETE_RETENTION_DAYS', 30))
+
+
+# Delta sync
+#
+# /sync/ never moves a client's watermark past TRACKER_SYNC_LAG_SECONDS ago,
+# so rows written by transactions that commit late are not skipped.
+
+TRACKER_SYNC_LAG_SECONDS = 5
+
+
+# Read-optimized lists
+#
+# The workout, exercise type, body weight and set lists are read with
+# values_list() into the same JSON their serializers produce. Set
+# TRACKER_VALUES_LISTS=0 to serve them through the serializers, e.g. to
+# benchmark one against the other.
+
+TRACKER_VALUES_LISTS = os.environ.get('TRACKER_VALUES_LISTS', '1') == '1'
+
+
+# Request profiling
+#
+# ProfilingMiddleware adds a Server-Timing header and logs one JSON line for
+# a TRACKER_PROFILE_SAMPLE_RATE fraction of requests (0 to 1, off by default).
+# Up to TRACKER_PROFILE_MAX_SLOW_QUERIES queries slower than
+# TRACKER_PROFILE_SLOW_QUERY_MS milliseconds are included in the log line.
+
+TRACKER_PROFILE_SAMPLE_RATE = float(os.environ.get('TRACKER_PROFILE_SAMPLE_RATE', 0))
+
+TRACKER_PROFILE_SLOW_QUERY_MS = float(os.environ.get('TRACKER_PROFILE_SLOW_QUERY_MS', 100))
+
+TRACKER_PROFILE_MAX_SLOW_QUERIES = 5
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'workouttracker.tracker.profiling': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
 }
 
 
+# Authentication
+#
+# JWTs are checked first, as most clients send them. With TRACKER_STATELESS_JWT
+# on (the default) the user is taken from the token's claims and only loaded
+# when a view needs more than its id, from a per-process cache that keeps it
+# for TRACKER_AUTH_USER_CACHE_SECONDS; so a deactivated user may keep access
+# for that long. DRF tokens ("Authorization: Token ...") are looked up as
+# before. Either way a request makes at most one authentication query.
+
+TRACKER_STATELESS_JWT = os.environ.get('TRACKER_STATELESS_JWT', '1') == '1'
+
+TRACKER_AUTH_USER_CACHE_SECONDS = int(os.environ.get('TRACKER_AUTH_USER_CACHE_SECONDS', 30))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
 
@@ -163,8 +327,9 @@ EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
+        'workouttracker.tracker.authentication.JWTClaimsAuthentication'
+        if TRACKER_STATELESS_JWT else 'dj_rest_auth.jwt_auth.JWTCookieAuthentication',
         'rest_framework.authentication.TokenAuthentication',
-        'dj_rest_auth.jwt_auth.JWTCookieAuthentication',
     ),
     'DEFAULT_SCHEMA_CLASS': \
         'rest_framework.schemas.coreapi.AutoSchema',
@@ -174,6 +339,9 @@ REST_FRAMEWORK = {
     'DEFAULT_FILTER_BACKENDS': (
         'django_filters.rest_framework.DjangoFilterBackend',
     ),
+    'DEFAULT_PAGINATION_CLASS': \
+        'workouttracker.tracker.pagination.TrackerPagination',
+    'PAGE_SIZE': 100,
 }
 
 REST_SESSION_LOGIN = False
@@ -195,6 +363,7 @@ SIMPLE_JWT = {
 
 AUTHENTICATION_BACKENDS = (
     'django.contrib.auth.backends.ModelBackend',
+    'workouttracker.tracker.backends.OwnershipPermissionBackend',
     'guardian.backends.ObjectPermissionBackend',
 )
 
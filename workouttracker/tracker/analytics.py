@@ -0,0 +1,501 @@
+import datetime
+from functools import reduce
+from itertools import groupby
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Max, Min, Q, QuerySet
+
+from workouttracker.tracker.models import ExerciseType, ExerciseSet, OneRepMax, DailyExerciseSummary, PersonalRecord
+
+
+def epley(weight, reps):
+    if reps <= 1:
+        return weight
+    return weight * (1 + reps / 30)
+
+
+def brzycki(weight, reps):
+    if reps <= 1:
+        return weight
+    if reps >= 37:
+        return None
+    return weight * 36 / (37 - reps)
+
+
+def summary_keys(exercise_sets):
+    """
+    Returns the ``(user_id, exercise_type_id, date_performed)`` summary keys
+    touched by ``exercise_sets``, which may be a queryset or model instances.
+    """
+    if isinstance(exercise_sets, QuerySet):
+        return set(exercise_sets.values_list('user_id', 'exercise_type_id', 'date_performed').distinct())
+    return {(s.user_id, s.exercise_type_id, s.date_performed) for s in exercise_sets}
+
+
+# SQLite rejects expressions nested deeper than 1000, which an OR over every
+# key of a large write would be, so filters cover this many keys at most.
+FILTER_BATCH_SIZE = 500
+
+
+def _batched_filters(items, build):
+    """
+    Yields one filter per batch of ``items``, ORing the conditions ``build``
+    returns for the (sorted) batch.
+    """
+    items = sorted(items)
+    for start in range(0, len(items), FILTER_BATCH_SIZE):
+        yield reduce(or_, build(items[start:start + FILTER_BATCH_SIZE]))
+
+
+def summary_ranges(exercise_sets):
+    """
+    Returns the first and last day of the sets in the ``exercise_sets``
+    queryset for each ``(user_id, exercise_type_id)`` pair, with one query.
+    Deletes that cascade to a whole history refresh these ranges rather than
+    one key per day.
+    """
+    return {
+        (row['user_id'], row['exercise_type_id']): (row['first'], row['last'])
+        for row in (exercise_sets
+                    .order_by()
+                    .values('user_id', 'exercise_type_id')
+                    .annotate(first=Min('date_performed'), last=Max('date_performed')))
+    }
+
+
+def _keys_filters(keys):
+    return _batched_filters(keys, lambda batch: (
+        Q(user_id=user_id, exercise_type_id=exercise_type_id,
+          date_performed__in=[date_performed for _, _, date_performed in group])
+        for (user_id, exercise_type_id), group in groupby(batch, key=lambda key: key[:2])
+    ))
+
+
+def _ranges_filters(ranges):
+    return _batched_filters(ranges.items(), lambda batch: (
+        Q(user_id=user_id, exercise_type_id=exercise_type_id, date_performed__range=dates)
+        for (user_id, exercise_type_id), dates in batch
+    ))
+
+
+def _pairs_filters(pairs):
+    return _batched_filters(pairs, lambda batch: (
+        Q(user_id=user_id, exercise_type_id=exercise_type_id) for user_id, exercise_type_id in batch
+    ))
+
+
+def summarize(key, sets):
+    """
+    Builds the summary row for one key from ``(reps, weight)`` pairs. The best
+    set is the one with the highest Epley estimate.
+    """
+    user_id, exercise_type_id, date_performed = key
+    best_reps, best_weight = max(sets, key=lambda s: (epley(s[1], s[0]), s[1]))
+    return DailyExerciseSummary(
+        user_id=user_id,
+        exercise_type_id=exercise_type_id,
+        date_performed=date_performed,
+        best_weight=best_weight,
+        best_reps=best_reps,
+        estimated_1rm=epley(best_weight, best_reps),
+        estimated_1rm_brzycki=brzycki(best_weight, best_reps),
+        volume=sum(reps * weight for reps, weight in sets),
+        set_count=len(sets),
+        total_reps=sum(reps for reps, _ in sets),
+    )
+
+
+def _lock_exercise_types(exercise_type_ids):
+    """
+    Locks the exercise types until the transaction ends, in pk order so that
+    writers locking several cannot deadlock. Summaries are replaced with a
+    DELETE and an INSERT, so two writers of the same day must not interleave
+    or the second INSERT breaks the unique (user, exercise type, date) key.
+    """
+    list(ExerciseType.all_objects
+         .select_for_update()
+         .filter(pk__in=exercise_type_ids)
+         .order_by('pk')
+         .values_list('pk', flat=True))
+
+
+def _refresh_summaries(pairs, filters):
+    """
+    Recomputes the daily summaries matched by ``filters``, which only match
+    days of the ``(user_id, exercise_type_id)`` ``pairs``, from their
+    performed exercise sets and returns them.
+    """
+    _lock_exercise_types({exercise_type_id for _, exercise_type_id in pairs})
+    filters = list(filters)
+    sets_by_key = {}
+    for keys_filter in filters:
+        rows = (ExerciseSet.objects
+                .filter(keys_filter, planned=False)
+                .values_list('user_id', 'exercise_type_id', 'date_performed', 'reps', 'weight'))
+        for user_id, exercise_type_id, date_performed, reps, weight in rows:
+            sets_by_key.setdefault((user_id, exercise_type_id, date_performed), []).append((reps, weight))
+
+    for keys_filter in filters:
+        DailyExerciseSummary.objects.filter(keys_filter).delete()
+    return DailyExerciseSummary.objects.bulk_create([
+        summarize(key, sets) for key, sets in sets_by_key.items()
+    ])
+
+
+@transaction.atomic
+def refresh_daily_summaries(keys, edited=(), deleted=()):
+    """
+    Recomputes the daily summaries for ``keys`` from their exercise sets and
+    updates the affected ``OneRepMax`` rows and personal records after the
+    sets in ``edited`` were saved and the sets with the ids in ``deleted``
+    were deleted. Only the given days are read, so the cost depends on the
+    size of the change rather than the history.
+
+    A record can only go down when the set holding it changed, or when the
+    volume of its day dropped; only then are the records of its exercise type
+    rebuilt from the history. New sets go through ``record_new_sets`` instead.
+    """
+    keys = set(keys)
+    if not keys:
+        return
+
+    pairs = {(user_id, exercise_type_id) for user_id, exercise_type_id, _ in keys}
+    summaries = _refresh_summaries(pairs, _keys_filters(keys))
+    refresh_one_rep_maxes(pairs)
+
+    changed = {s.pk for s in edited} | set(deleted)
+    volumes = {(s.user_id, s.exercise_type_id, s.date_performed): s.volume for s in summaries}
+
+    def lowered(record):
+        if record.kind == PersonalRecord.VOLUME:
+            key = (record.user_id, record.exercise_type_id, record.date_performed)
+            return key in keys and volumes.get(key, 0) < record.value
+        return record.exercise_set_id in changed
+
+    _update_personal_records(pairs, summaries, lowered, edited)
+
+
+@transaction.atomic
+def refresh_summary_ranges(ranges, added=False):
+    """
+    ``refresh_daily_summaries`` for every day of the ``summary_ranges``
+    ``ranges``, with one condition per pair however many days it spans.
+
+    With ``added`` the ranges only gained sets, as in an import, so no record
+    can go down; the performed sets of the ranges are offered to the records
+    instead of rebuilding those of the exercise types from their history.
+    """
+    if not ranges:
+        return
+
+    filters = list(_ranges_filters(ranges))
+    summaries = _refresh_summaries(set(ranges), filters)
+    refresh_one_rep_maxes(set(ranges))
+
+    if added:
+        book = RecordBook(
+            record
+            for pairs_filter in _pairs_filters(set(ranges))
+            for record in PersonalRecord.objects.select_for_update().filter(pairs_filter))
+        for ranges_filter in filters:
+            rows = (ExerciseSet.objects
+                    .filter(ranges_filter, planned=False)
+                    .order_by('date_performed', 'id')
+                    .values_list('id', 'user_id', 'exercise_type_id', 'date_performed', 'reps', 'weight')
+                    .iterator())
+            for row in rows:
+                book.offer_set(*row)
+        for summary in summaries:
+            book.offer(summary.user_id, summary.exercise_type_id, PersonalRecord.VOLUME, 0,
+                       summary.volume, summary.date_performed)
+        book.save()
+        return
+
+    def lowered(record):
+        first, last = ranges[(record.user_id, record.exercise_type_id)]
+        return first <= record.date_performed <= last
+
+    _update_personal_records(set(ranges), summaries, lowered)
+
+
+@transaction.atomic
+def rebuild_daily_summaries(user, batch_size=1000):
+    """
+    Rebuilds every daily summary and one rep max of ``user`` from scratch by
+    streaming their performed sets in key order. Returns the number of summaries.
+    """
+    _lock_exercise_types(ExerciseSet.all_objects.filter(user=user).values('exercise_type_id'))
+    DailyExerciseSummary.objects.filter(user=user).delete()
+
+    rows = (ExerciseSet.objects
+            .filter(user=user, planned=False)
+            .order_by('exercise_type_id', 'date_performed')
+            .values_list('user_id', 'exercise_type_id', 'date_performed', 'reps', 'weight')
+            .iterator(chunk_size=batch_size))
+
+    summaries = []
+    created = 0
+    for key, group in groupby(rows, key=lambda row: row[:3]):
+        summaries.append(summarize(key, [row[3:] for row in group]))
+        if len(summaries) >= batch_size:
+            DailyExerciseSummary.objects.bulk_create(summaries)
+            created += len(summaries)
+            summaries = []
+    DailyExerciseSummary.objects.bulk_create(summaries)
+    created += len(summaries)
+
+    pairs = set(DailyExerciseSummary.objects.filter(user=user).values_list('user_id', 'exercise_type_id'))
+    pairs |= set(OneRepMax.objects.filter(user=user).values_list('user_id', 'exercise_type_id'))
+    if pairs:
+        refresh_one_rep_maxes(pairs)
+    rebuild_personal_records(pairs | set(
+        PersonalRecord.objects.filter(user=user).values_list('user_id', 'exercise_type_id')))
+    return created
+
+
+def refresh_one_rep_maxes(pairs):
+    """
+    Sets the ``OneRepMax`` of each ``(user_id, exercise_type_id)`` pair to its
+    best estimated 1RM across all daily summaries.
+    """
+    best = {
+        (row['user_id'], row['exercise_type_id']): row['best']
+        for pairs_filter in _pairs_filters(pairs)
+        for row in (DailyExerciseSummary.objects
+                    .filter(pairs_filter)
+                    .values('user_id', 'exercise_type_id')
+                    .annotate(best=Max('estimated_1rm')))
+    }
+    set_one_rep_maxes(pairs, best)
+
+
+def set_one_rep_maxes(pairs, best, only_raise=False):
+    """
+    Writes the ``{(user_id, exercise_type_id): weight}`` one rep maxes in
+    ``best``. Existing ones of ``pairs`` missing from ``best`` are deleted,
+    unless ``only_raise`` is set, in which case no one rep max is lowered.
+    """
+    existing = {
+        (one_rep_max.user_id, one_rep_max.exercise_type_id): one_rep_max
+        for pairs_filter in _pairs_filters(pairs)
+        for one_rep_max in OneRepMax.objects.filter(pairs_filter)
+    }
+
+    to_update = []
+    to_create = []
+    for pair, weight in best.items():
+        if pair in existing:
+            if weight > existing[pair].weight or (existing[pair].weight != weight and not only_raise):
+                existing[pair].weight = weight
+                to_update.append(existing[pair])
+        else:
+            to_create.append(OneRepMax(user_id=pair[0], exercise_type_id=pair[1], weight=weight))
+
+    OneRepMax.objects.bulk_update(to_update, ['weight'])
+    OneRepMax.objects.bulk_create(to_create)
+    stale = [existing[pair].pk for pair in existing if pair not in best]
+    if stale and not only_raise:
+        OneRepMax.objects.filter(pk__in=stale).delete()
+
+
+class RecordBook:
+    """
+    The personal records of some ``(user_id, exercise_type_id)`` pairs,
+    keyed by ``(user_id, exercise_type_id, kind, reps)``. Results replace a
+    record when they beat it, or equal it on an earlier day, and the records
+    that changed are written back by ``save``.
+    """
+
+    def __init__(self, records=()):
+        self.records = {
+            (record.user_id, record.exercise_type_id, record.kind, record.reps): record for record in records
+        }
+        self.changed = {}
+
+    def offer(self, user_id, exercise_type_id, kind, reps, value, date_performed, exercise_set_id=None):
+        key = (user_id, exercise_type_id, kind, reps)
+        record = self.records.get(key)
+        if record is not None and (value < record.value or (
+                value == record.value and date_performed >= record.date_performed)):
+            return False
+        if record is None:
+            record = self.records[key] = PersonalRecord(
+                user_id=user_id, exercise_type_id=exercise_type_id, kind=kind, reps=reps)
+        record.value = value
+        record.date_performed = date_performed
+        record.exercise_set_id = exercise_set_id
+        self.changed[key] = record
+        return True
+
+    def offer_set(self, exercise_set_id, user_id, exercise_type_id, date_performed, reps, weight):
+        """
+        Offers one set for its rep count's weight record and the estimated 1RM
+        record, and returns the kinds it beat.
+        """
+        kinds = []
+        if self.offer(user_id, exercise_type_id, PersonalRecord.WEIGHT, reps, weight,
+                      date_performed, exercise_set_id):
+            kinds.append(PersonalRecord.WEIGHT)
+        if self.offer(user_id, exercise_type_id, PersonalRecord.ESTIMATED_1RM, 0, epley(weight, reps),
+                      date_performed, exercise_set_id):
+            kinds.append(PersonalRecord.ESTIMATED_1RM)
+        return kinds
+
+    def save(self):
+        """
+        Replaces the changed records, whether or not they existed before:
+        one INSERT, and one DELETE per ``FILTER_BATCH_SIZE`` records.
+        """
+        if not self.changed:
+            return
+        records_filters = _batched_filters(self.changed, lambda batch: (
+            Q(user_id=user_id, exercise_type_id=exercise_type_id, kind=kind, reps=reps)
+            for user_id, exercise_type_id, kind, reps in batch
+        ))
+        for records_filter in records_filters:
+            PersonalRecord.objects.filter(records_filter).delete()
+        for record in self.changed.values():
+            record.pk = None
+        PersonalRecord.objects.bulk_create(self.changed.values())
+        self.changed = {}
+
+
+@transaction.atomic
+def record_new_sets(exercise_sets):
+    """
+    Refreshes the daily summaries of newly created ``exercise_sets`` and
+    checks them against the personal records of their exercise types.
+    Only those records and the days written to are read, so the cost does
+    not grow with the history. New sets can only raise a one rep max, which
+    is the estimated 1RM record, so it is updated from the records too.
+
+    Returns the kinds of record each set beat, by set id. A new best session
+    volume is credited to the last set of that session in ``exercise_sets``.
+    Planned sets are skipped.
+    """
+    exercise_sets = [s for s in exercise_sets if not s.planned]
+    if not exercise_sets:
+        return {}
+    keys = summary_keys(exercise_sets)
+    pairs = {(user_id, exercise_type_id) for user_id, exercise_type_id, _ in keys}
+    summaries = _refresh_summaries(pairs, _keys_filters(keys))
+
+    book = RecordBook(
+        record
+        for pairs_filter in _pairs_filters(pairs)
+        for record in PersonalRecord.objects.select_for_update().filter(pairs_filter))
+
+    flags = {}
+    last_sets = {}
+    for s in exercise_sets:
+        flags[s.pk] = book.offer_set(s.pk, s.user_id, s.exercise_type_id, s.date_performed, s.reps, s.weight)
+        last_sets[(s.user_id, s.exercise_type_id, s.date_performed)] = s.pk
+
+    for summary in summaries:
+        if book.offer(summary.user_id, summary.exercise_type_id, PersonalRecord.VOLUME, 0,
+                      summary.volume, summary.date_performed):
+            flags[last_sets[(summary.user_id, summary.exercise_type_id, summary.date_performed)]].append(
+                PersonalRecord.VOLUME)
+
+    best = {
+        (record.user_id, record.exercise_type_id): record.value
+        for record in book.changed.values() if record.kind == PersonalRecord.ESTIMATED_1RM
+    }
+    if best:
+        set_one_rep_maxes(best, best, only_raise=True)
+    book.save()
+    return flags
+
+
+def _update_personal_records(pairs, summaries, lowered, edited=()):
+    """
+    Updates the personal records of ``pairs`` after their sets changed in the
+    days of ``summaries``. The records of a pair are rebuilt from its history
+    when ``lowered`` holds for one of them; the others only take the values
+    of the performed sets in ``edited`` and the volumes of ``summaries``.
+    """
+    records = [
+        record
+        for pairs_filter in _pairs_filters(pairs)
+        for record in PersonalRecord.objects.select_for_update().filter(pairs_filter)
+    ]
+    stale = {(record.user_id, record.exercise_type_id) for record in records if lowered(record)}
+
+    book = RecordBook(record for record in records if (record.user_id, record.exercise_type_id) not in stale)
+    for s in edited:
+        pair = (s.user_id, s.exercise_type_id)
+        if pair in pairs and pair not in stale and not s.planned:
+            book.offer_set(s.pk, s.user_id, s.exercise_type_id, s.date_performed, s.reps, s.weight)
+    for summary in summaries:
+        if (summary.user_id, summary.exercise_type_id) not in stale:
+            book.offer(summary.user_id, summary.exercise_type_id, PersonalRecord.VOLUME, 0,
+                       summary.volume, summary.date_performed)
+    book.save()
+    rebuild_personal_records(stale)
+
+
+@transaction.atomic
+def rebuild_personal_records(pairs, batch_size=2000):
+    """
+    Recomputes the personal records of each ``(user_id, exercise_type_id)``
+    pair from its whole history: the sets for the weight and estimated 1RM
+    records, the daily summaries for session volume. Ties go to the earliest
+    result.
+    """
+    pairs = set(pairs)
+    if not pairs:
+        return 0
+    filters = list(_pairs_filters(pairs))
+    for pairs_filter in filters:
+        PersonalRecord.objects.filter(pairs_filter).delete()
+
+    book = RecordBook()
+    for pairs_filter in filters:
+        rows = (ExerciseSet.objects
+                .filter(pairs_filter, planned=False)
+                .order_by('date_performed', 'id')
+                .values_list('id', 'user_id', 'exercise_type_id', 'date_performed', 'reps', 'weight')
+                .iterator(chunk_size=batch_size))
+        for row in rows:
+            book.offer_set(*row)
+
+        volumes = (DailyExerciseSummary.objects
+                   .filter(pairs_filter)
+                   .order_by('date_performed')
+                   .values_list('user_id', 'exercise_type_id', 'date_performed', 'volume'))
+        for user_id, exercise_type_id, date_performed, volume in volumes:
+            book.offer(user_id, exercise_type_id, PersonalRecord.VOLUME, 0, volume, date_performed)
+
+    PersonalRecord.objects.bulk_create(book.changed.values(), batch_size=batch_size)
+    return len(book.changed)
+
+
+def weekly_progress(daily_summaries):
+    """
+    Folds daily summaries (ordered by date) into ISO weeks, keyed by the
+    Monday of each week.
+    """
+    weeks = {}
+    for summary in daily_summaries:
+        week = summary.date_performed - datetime.timedelta(days=summary.date_performed.weekday())
+        current = weeks.get(week)
+        if current is None:
+            weeks[week] = {
+                'date': week,
+                'best_weight': summary.best_weight,
+                'best_reps': summary.best_reps,
+                'estimated_1rm': summary.estimated_1rm,
+                'estimated_1rm_brzycki': summary.estimated_1rm_brzycki,
+                'volume': summary.volume,
+            }
+            continue
+        current['volume'] += summary.volume
+        if summary.estimated_1rm > current['estimated_1rm']:
+            current.update(
+                best_weight=summary.best_weight,
+                best_reps=summary.best_reps,
+                estimated_1rm=summary.estimated_1rm,
+                estimated_1rm_brzycki=summary.estimated_1rm_brzycki,
+            )
+    return list(weeks.values())
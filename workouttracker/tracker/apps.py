@@ -1,6 +1,16 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.core.signals import request_started
+from django.db.models.signals import post_delete, post_save
 
 
 class TrackerConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'workouttracker.tracker'
+
+    def ready(self):
+        from workouttracker.tracker.authentication import evict_cached_user
+        from workouttracker.tracker.db import close_unusable_connections
+        request_started.connect(close_unusable_connections)
+        post_save.connect(evict_cached_user, sender=settings.AUTH_USER_MODEL)
+        post_delete.connect(evict_cached_user, sender=settings.AUTH_USER_MODEL)
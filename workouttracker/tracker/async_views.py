@@ -0,0 +1,73 @@
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils.decorators import classonlymethod
+
+from workouttracker.tracker.profiling import profile_phase
+
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_executor = None
+
+
+def get_read_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'TRACKER_ASYNC_READ_WORKERS', 16),
+            thread_name_prefix='tracker-read',
+        )
+    return _executor
+
+
+def run_read(view, request, *args, **kwargs):
+    """
+    Runs a sync view on a read worker thread. The response is rendered here
+    rather than on the event loop's sync thread, and the worker's database
+    connection is recycled on the same rules as a normal request's.
+    """
+    close_old_connections()
+    try:
+        response = view(request, *args, **kwargs)
+        if hasattr(response, 'render') and callable(response.render):
+            with profile_phase(request, 'render'):
+                response.render()
+        return response
+    finally:
+        close_old_connections()
+
+
+class AsyncReadMixin:
+    """
+    Serves the viewset from an async view when ``TRACKER_ASYNC_READS`` is on,
+    which ``asgi.py`` does. Under ASGI, Django runs every sync view on a single
+    thread, so concurrent requests queue behind each other's queries. Safe
+    requests (list and retrieve) are instead handed to a pool of
+    ``TRACKER_ASYNC_READ_WORKERS`` threads, each with its own connection;
+    writes stay on Django's sync thread so their transactions behave exactly
+    as they do under WSGI.
+
+    Django 4.0 has no async ORM, so queries still block, but they block a
+    worker rather than the whole application.
+    """
+
+    @classonlymethod
+    def as_view(cls, actions=None, **initkwargs):
+        view = super().as_view(actions, **initkwargs)
+        if not getattr(settings, 'TRACKER_ASYNC_READS', False):
+            return view
+
+        read = sync_to_async(functools.partial(run_read, view), thread_sensitive=False,
+                             executor=get_read_executor())
+        write = sync_to_async(view, thread_sensitive=True)
+
+        async def async_view(request, *args, **kwargs):
+            if request.method in SAFE_METHODS:
+                return await read(request, *args, **kwargs)
+            return await write(request, *args, **kwargs)
+
+        return functools.update_wrapper(async_view, view)
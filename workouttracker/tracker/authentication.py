@@ -0,0 +1,92 @@
+import copy
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.utils.functional import SimpleLazyObject
+from django.utils.translation import gettext_lazy as _
+from dj_rest_auth.jwt_auth import JWTCookieAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+
+# {user id: (expiry, user)}, local to the process.
+_users = {}
+
+USER_CACHE_MAX_ENTRIES = 10000
+
+
+def get_cached_user(user_id):
+    """
+    Returns the user with ``user_id``, loaded at most once every
+    ``TRACKER_AUTH_USER_CACHE_SECONDS`` per process. The instance is shared,
+    so callers must copy it before changing it. Raises
+    ``AuthenticationFailed`` for missing and inactive users.
+    """
+    now = time.monotonic()
+    entry = _users.get(user_id)
+    if entry is None or entry[0] <= now:
+        User = get_user_model()
+        try:
+            user = User._default_manager.get(**{api_settings.USER_ID_FIELD: user_id})
+        except User.DoesNotExist:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+
+        seconds = getattr(settings, 'TRACKER_AUTH_USER_CACHE_SECONDS', 30)
+        if seconds > 0:
+            if len(_users) >= USER_CACHE_MAX_ENTRIES:
+                _users.pop(next(iter(_users)), None)
+            _users[user_id] = (now + seconds, user)
+    else:
+        user = entry[1]
+
+    if not user.is_active:
+        raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+    return user
+
+
+def evict_cached_user(sender, instance, **kwargs):
+    _users.pop(getattr(instance, api_settings.USER_ID_FIELD), None)
+
+
+def clear_user_cache():
+    _users.clear()
+
+
+class ClaimsUser(SimpleLazyObject):
+    """
+    The user of a request authenticated by ``JWTClaimsAuthentication``. Its
+    id comes from the token, so checks that only need the id (ownership,
+    cached responses, ``is_authenticated``) do no work. Any other attribute,
+    or using it as a model instance, works on a copy of ``user``, so
+    permission caches set on it never leak into another request.
+    """
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, user_id, user):
+        # LazyObject forwards attribute writes to the wrapped user.
+        self.__dict__['id'] = self.__dict__['pk'] = user_id
+        super().__init__(lambda: copy.copy(user))
+
+    def __bool__(self):
+        return True
+
+
+class JWTClaimsAuthentication(JWTCookieAuthentication):
+    """
+    ``JWTCookieAuthentication`` without the per-request user query: the
+    user is checked against a cache that keeps it for
+    ``TRACKER_AUTH_USER_CACHE_SECONDS`` and the request gets a ``ClaimsUser``
+    built from the token. A user that is deactivated keeps access for at most
+    that long in another process; saving or deleting a user evicts it from
+    the cache of this one.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+        return ClaimsUser(user_id, get_cached_user(user_id))
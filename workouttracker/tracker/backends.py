@@ -0,0 +1,29 @@
+from django.contrib.auth.backends import BaseBackend
+
+from workouttracker.tracker.models import UserWeight, ExerciseType, Workout, Exercise, ExerciseSet
+
+
+OWNED_MODELS = (UserWeight, ExerciseType, Workout, Exercise, ExerciseSet)
+
+
+class OwnershipPermissionBackend(BaseBackend):
+    """
+    Grants every object permission on tracker rows to the user referenced by
+    the row's ``user`` FK. Listed ahead of guardian's backend so owners never
+    touch the object permission tables; guardian rows are only consulted for
+    objects that have been explicitly shared with another user or group.
+    """
+
+    def has_perm(self, user_obj, perm, obj=None):
+        if obj is None or not isinstance(obj, OWNED_MODELS):
+            return False
+        if not user_obj.is_active or user_obj.is_anonymous:
+            return False
+
+        app_label, _, codename = perm.rpartition('.')
+        if app_label and app_label != obj._meta.app_label:
+            return False
+        if not codename.endswith('_' + obj._meta.model_name):
+            return False
+
+        return obj.user_id == user_obj.pk
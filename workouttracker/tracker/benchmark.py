@@ -0,0 +1,186 @@
+import datetime
+import gc
+import statistics
+import time
+import tracemalloc
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from workouttracker.tracker.cache import get_cache
+from workouttracker.tracker.export import stream_csv, export_rows
+from workouttracker.tracker.models import ExerciseType, Workout, Exercise, ExerciseSet, OneRepMax
+
+
+def percentile(values, p):
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    return values[min(int(len(values) * p / 100), len(values) - 1)]
+
+
+class Scenario:
+    def __init__(self, name, method, path, data=None, format='json'):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.data = data
+        self.format = format
+
+    def get_data(self):
+        return self.data() if callable(self.data) else self.data
+
+    def request(self, client, data):
+        response = getattr(client, self.method.lower())(self.path, data, format=self.format)
+        if response.streaming:
+            for _ in response.streaming_content:
+                pass
+        return response
+
+
+def build_scenarios(user):
+    """
+    Returns one scenario per tracker route, pointed at objects owned by
+    ``user``. Writes are measured inside a savepoint that is rolled back, so
+    every repetition sees the same data.
+    """
+    exercise_type = ExerciseType.objects.filter(user=user).first()
+    workout = Workout.objects.filter(user=user).order_by('-date_performed').first()
+    exercise = Exercise.objects.filter(workout=workout).first()
+    exercise_set = ExerciseSet.objects.filter(exercise=exercise).first()
+    end = workout.date_performed
+    start = end - datetime.timedelta(days=30)
+    date_range = 'start_date=%s&end_date=%s' % (start, end)
+
+    def nested_workout():
+        return {
+            'name': 'Benchmark', 'date_performed': str(end), 'exercises': [{
+                'exercise_type': exercise_type.pk, 'date_performed': str(end), 'exercise_sets': [
+                    {'reps': 5, 'weight': 100 + i * 5, 'date_performed': str(end)} for i in range(5)
+                ]} for _ in range(3)
+            ]}
+
+    def exercise_sets(count):
+        return [{'exercise': exercise.pk, 'exercise_type': exercise_type.pk,
+                 'date_performed': str(end), 'reps': 5, 'weight': 100} for _ in range(count)]
+
+    def plan_template():
+        # Four sessions a week of three exercises, 12 weeks: 720 sets.
+        exercise_types = list(ExerciseType.objects.filter(user=user)[:3])
+        for planned_type in exercise_types:
+            OneRepMax.objects.get_or_create(user=user, exercise_type=planned_type, defaults={'weight': 100})
+        return {
+            'start_date': str(end), 'weeks': 12, 'days': [{'day': day, 'exercises': [
+                {'exercise_type': planned_type.pk, 'sets': 5, 'reps': 5, 'percentage': 70, 'progression': 2.5}
+                for planned_type in exercise_types
+            ]} for day in range(4)]}
+
+    def history_upload():
+        upload = ''.join(stream_csv(export_rows(user, start_date=start, end_date=end)))
+        return {'file': SimpleUploadedFile('history.csv', upload.encode('utf-8'), content_type='text/csv')}
+
+    return [
+        Scenario('api root', 'GET', '/'),
+        Scenario('users list', 'GET', '/users/'),
+        Scenario('users detail', 'GET', '/users/%s/' % user.pk),
+        Scenario('exercisetypes list', 'GET', '/exercisetypes/'),
+        Scenario('exercisetypes detail', 'GET', '/exercisetypes/%s/' % exercise_type.pk),
+        Scenario('exercisetypes progress', 'GET', '/exercisetypes/%s/progress/' % exercise_type.pk),
+        Scenario('exercisetypes progress weekly', 'GET',
+                 '/exercisetypes/%s/progress/?period=week' % exercise_type.pk),
+        Scenario('exercisetypes records', 'GET', '/exercisetypes/%s/records/' % exercise_type.pk),
+        Scenario('workouts list', 'GET', '/workouts/'),
+        Scenario('workouts detail', 'GET', '/workouts/%s/' % workout.pk),
+        Scenario('workouts create', 'POST', '/workouts/', {'name': 'Benchmark', 'date_performed': str(end)}),
+        Scenario('exercises list', 'GET', '/exercises/?%s' % date_range),
+        Scenario('exercises detail', 'GET', '/exercises/%s/' % exercise.pk),
+        Scenario('exercisesets list', 'GET', '/exercisesets/?%s' % date_range),
+        Scenario('exercisesets list 1000', 'GET', '/exercisesets/?page_size=1000'),
+        Scenario('exercisesets list 1000 columnar', 'GET', '/exercisesets/?page_size=1000&format=columnar'),
+        Scenario('exercisesets list 1000 packed', 'GET', '/exercisesets/?page_size=1000&format=packed'),
+        Scenario('exercisesets detail', 'GET', '/exercisesets/%s/' % exercise_set.pk),
+        Scenario('exercisesets create', 'POST', '/exercisesets/', lambda: exercise_sets(1)[0]),
+        Scenario('exercisesets update', 'PATCH', '/exercisesets/%s/' % exercise_set.pk, {'reps': 6}),
+        Scenario('exercisesets delete', 'DELETE', '/exercisesets/%s/' % exercise_set.pk),
+        Scenario('exercisesets bulk create', 'POST', '/exercisesets/bulk/', lambda: exercise_sets(100)),
+        Scenario('dailyvolume list', 'GET', '/dailyvolume/?%s' % date_range),
+        Scenario('exercisesnested list', 'GET', '/exercisesnested/?%s' % date_range),
+        Scenario('exercisesnested detail', 'GET', '/exercisesnested/%s/' % exercise.pk),
+        Scenario('workoutsnested list', 'GET', '/workoutsnested/?%s' % date_range),
+        Scenario('workoutsnested detail', 'GET', '/workoutsnested/%s/' % workout.pk),
+        Scenario('workoutsnested create', 'POST', '/workoutsnested/', nested_workout),
+        Scenario('export csv', 'GET', '/export/csv/'),
+        Scenario('export ndjson', 'GET', '/export/ndjson/'),
+        Scenario('import csv', 'POST', '/import/csv/', history_upload, format='multipart'),
+        Scenario('plans create 12 weeks', 'POST', '/plans/', plan_template),
+        Scenario('sync', 'GET', '/sync/'),
+    ]
+
+
+class BenchmarkRunner:
+    """
+    Sends each scenario ``repeat`` times through the test client, with a DRF
+    token or, if ``auth`` is ``'jwt'``, a JWT, so authentication is part of
+    what is measured, and reports latency
+    percentiles in milliseconds along with the number of SQL queries. One
+    further pass records the peak memory allocated by Python while handling
+    the request.
+
+    Unless ``cached`` is set, the tracker cache is cleared before every
+    request so list endpoints are measured against the database.
+    """
+
+    def __init__(self, user, repeat=20, cached=False, auth='token'):
+        self.repeat = repeat
+        self.cached = cached
+        self.client = APIClient()
+        if auth == 'jwt':
+            self.client.credentials(HTTP_AUTHORIZATION='Bearer %s' % AccessToken.for_user(user))
+        else:
+            self.client.credentials(HTTP_AUTHORIZATION='Token %s' % Token.objects.get_or_create(user=user)[0].key)
+
+    def send(self, scenario, trace_memory=False):
+        if not self.cached:
+            get_cache().clear()
+        with transaction.atomic():
+            data = scenario.get_data()
+            gc.collect()
+            if trace_memory:
+                tracemalloc.start()
+            try:
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    response = scenario.request(self.client, data)
+                    elapsed = time.perf_counter() - started
+                peak = tracemalloc.get_traced_memory()[1] if trace_memory else None
+            finally:
+                tracemalloc.stop()
+            transaction.set_rollback(True)
+        return response, elapsed * 1000, len(queries), peak
+
+    def measure(self, scenario):
+        response = self.send(scenario)[0]
+        samples = [self.send(scenario) for _ in range(self.repeat)]
+        timings = sorted(sample[1] for sample in samples)
+        queries = samples[-1][2]
+        peak = self.send(scenario, trace_memory=True)[3]
+
+        return {
+            'name': scenario.name,
+            'method': scenario.method,
+            'path': scenario.path,
+            'status': response.status_code,
+            'mean': statistics.mean(timings),
+            'p50': percentile(timings, 50),
+            'p95': percentile(timings, 95),
+            'p99': percentile(timings, 99),
+            'queries': queries,
+            'peak_memory_kb': peak / 1024,
+        }
+
+    def run(self, scenarios):
+        return [self.measure(scenario) for scenario in scenarios]
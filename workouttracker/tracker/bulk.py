@@ -0,0 +1,149 @@
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import serializers, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+from workouttracker.tracker.shortcuts import get_objects_for_owner, parse_pk
+
+
+class BulkWriteMixin:
+    """
+    Adds ``/<prefix>/bulk/`` to a viewset: POST a list of objects to create
+    them, PATCH a list of partial objects with ``id`` to update them, or DELETE
+    a list of ids. Related primary keys are resolved for the whole payload up
+    front and rows are written with ``bulk_create``/``bulk_update``, so the
+    number of queries does not depend on the number of items. Updates take one
+    ``bulk_update`` per distinct set of fields sent.
+
+    The response lists one result per item, in payload order, with the item's
+    ``index``, an HTTP ``status`` and either the object ``data`` or ``errors``.
+    """
+    bulk_max_items = 1000
+
+    @action(detail=False, methods=['post', 'patch', 'delete'], url_path='bulk')
+    def bulk(self, request, *args, **kwargs):
+        items = request.data
+        if not isinstance(items, list):
+            raise ValidationError({'non_field_errors': ['Expected a list of items.']})
+        if len(items) > self.bulk_max_items:
+            raise ValidationError({'non_field_errors': [
+                'At most %s items can be sent at once.' % self.bulk_max_items]})
+
+        with transaction.atomic():
+            if request.method == 'POST':
+                results = self.bulk_create(items)
+            elif request.method == 'PATCH':
+                results = self.bulk_update(items)
+            else:
+                results = self.bulk_destroy(items)
+        return Response({'results': results})
+
+    def get_bulk_permission_queryset(self, action):
+        model = self.get_queryset().model
+        return get_objects_for_owner(
+            self.request.user, '%s.%s_%s' % (model._meta.app_label, action, model._meta.model_name),
+            request=self.request)
+
+    def get_bulk_context(self, items):
+        """
+        Resolves every related primary key referenced by ``items`` with one
+        permission-filtered query per related field.
+        """
+        context = self.get_serializer_context()
+        fields = self.get_serializer_class()(context=context).fields
+        related_objects = {}
+        for name, field in fields.items():
+            if field.read_only or not isinstance(field, serializers.PrimaryKeyRelatedField):
+                continue
+            pks = {parse_pk(item.get(name)) for item in items if isinstance(item, dict)}
+            pks.discard(None)
+            related_objects[name] = field.get_queryset().in_bulk(pks)
+        context['related_objects'] = related_objects
+        return context
+
+    def bulk_create(self, items):
+        context = self.get_bulk_context(items)
+        results = []
+        valid = []
+        for index, item in enumerate(items):
+            serializer = self.get_serializer_class()(data=item, context=context)
+            if serializer.is_valid():
+                valid.append((index, serializer))
+            else:
+                results.append({'index': index, 'status': status.HTTP_400_BAD_REQUEST, 'errors': serializer.errors})
+
+        model = self.get_queryset().model
+        objs = self.perform_bulk_create([
+            model(user=self.request.user, **serializer.validated_data) for _, serializer in valid
+        ])
+        for (index, serializer), obj in zip(valid, objs):
+            serializer.instance = obj
+            results.append({'index': index, 'status': status.HTTP_201_CREATED, 'data': serializer.data})
+        return sorted(results, key=lambda result: result['index'])
+
+    def bulk_update(self, items):
+        context = self.get_bulk_context(items)
+        ids = [parse_pk(item.get('id')) if isinstance(item, dict) else None for item in items]
+        # Locked until the bulk transaction ends, so that no other write to
+        # these rows lands between reading them and writing them back.
+        instances = self.get_bulk_permission_queryset('change').select_for_update().in_bulk(
+            {pk for pk in ids if pk is not None})
+
+        results = []
+        changed = []
+        for index, (item, pk) in enumerate(zip(items, ids)):
+            instance = instances.get(pk)
+            if instance is None:
+                results.append({'index': index, 'status': status.HTTP_404_NOT_FOUND,
+                                'errors': {'id': ['Not found.']}})
+                continue
+            serializer = self.get_serializer_class()(instance, data=item, partial=True, context=context)
+            if not serializer.is_valid():
+                results.append({'index': index, 'status': status.HTTP_400_BAD_REQUEST, 'errors': serializer.errors})
+                continue
+            changed.append((index, serializer))
+
+        # Items are written in groups by the fields they sent, so that no item
+        # writes back a field it did not change.
+        model = self.get_queryset().model
+        now = timezone.now()
+        groups = {}
+        for _, serializer in changed:
+            obj = serializer.instance
+            original = model(**{field.attname: getattr(obj, field.attname) for field in obj._meta.concrete_fields})
+            for attr, value in serializer.validated_data.items():
+                setattr(obj, attr, value)
+            obj.updated_at = now
+            objs, originals = groups.setdefault(tuple(sorted(serializer.validated_data)), ([], []))
+            objs.append(obj)
+            originals.append(original)
+        for fields, (objs, originals) in groups.items():
+            self.perform_bulk_update(objs, list(fields) + ['updated_at'], originals)
+
+        for index, serializer in changed:
+            results.append({'index': index, 'status': status.HTTP_200_OK, 'data': serializer.data})
+        return sorted(results, key=lambda result: result['index'])
+
+    def bulk_destroy(self, items):
+        pks = [parse_pk(pk) for pk in items]
+        queryset = self.get_bulk_permission_queryset('delete').filter(pk__in=[pk for pk in pks if pk is not None])
+        found = set(queryset.values_list('pk', flat=True))
+        self.perform_bulk_destroy(queryset)
+
+        return [
+            {'index': index, 'status': status.HTTP_204_NO_CONTENT, 'id': pk}
+            if pk in found else
+            {'index': index, 'status': status.HTTP_404_NOT_FOUND, 'errors': {'id': ['Not found.']}}
+            for index, pk in enumerate(pks)
+        ]
+
+    def perform_bulk_create(self, objs):
+        return self.get_queryset().model.objects.bulk_create(objs)
+
+    def perform_bulk_update(self, objs, fields, originals):
+        self.get_queryset().model.objects.bulk_update(objs, fields)
+
+    def perform_bulk_destroy(self, queryset):
+        queryset.delete()
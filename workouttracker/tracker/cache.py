@@ -0,0 +1,129 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.http import quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+
+def get_cache():
+    return caches[getattr(settings, 'TRACKER_CACHE_ALIAS', 'default')]
+
+
+def response_cache_enabled():
+    """
+    Whether list responses are cached, which needs a cache that every worker
+    shares (see ``TRACKER_RESPONSE_CACHE``).
+    """
+    return getattr(settings, 'TRACKER_RESPONSE_CACHE', False)
+
+
+def _version_key(user_id, model):
+    return 'tracker:version:%s:%s' % (user_id, model._meta.label_lower)
+
+
+def get_versions(user, models):
+    """
+    Returns the current version of each of ``models`` for ``user``. A version
+    is the time of the last write; missing versions (never written or evicted)
+    are initialised to now, so an evicted version can never match a stale
+    response cached under an older one.
+    """
+    cache = get_cache()
+    keys = [_version_key(user.pk, model) for model in models]
+    versions = cache.get_many(keys)
+
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        now = time.time()
+        for key in missing:
+            cache.add(key, now, timeout=None)
+        versions.update(cache.get_many(missing))
+    return [versions.get(key, 0) for key in keys]
+
+
+def invalidate_cache(user, models):
+    """
+    Bumps the versions of ``models`` for ``user``, which orphans every cached
+    response that depends on them.
+    """
+    if not response_cache_enabled():
+        return
+    now = time.time()
+    get_cache().set_many({_version_key(user.pk, model): now for model in models}, timeout=None)
+
+
+def normalize_query_params(query_params):
+    return '&'.join(
+        '%s=%s' % (key, ','.join(sorted(query_params.getlist(key))))
+        for key in sorted(query_params)
+    )
+
+
+class InvalidatesCacheMixin:
+    """
+    Invalidates the requesting user's cached responses for ``cache_invalidates``
+    after any successful write through the viewset, including cascades.
+    """
+    cache_invalidates = ()
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if (request.method not in ('GET', 'HEAD', 'OPTIONS')
+                and status.is_success(response.status_code)
+                and request.user.is_authenticated
+                and self.cache_invalidates):
+            invalidate_cache(request.user, self.cache_invalidates)
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class CachedListMixin:
+    """
+    Caches list responses per user, endpoint and normalized query string. The
+    key embeds the user's versions of ``cache_dependencies``, so writes never
+    need to find and delete entries; superseded ones age out of the cache.
+
+    Responses carry an ETag derived from the same versions, which lets
+    conditional requests be answered with 304 before touching the database.
+    There is no Last-Modified: HTTP dates have whole seconds, so a write in
+    the same second as a response would go unnoticed.
+
+    Versions are per user, so a change by another user to an object they
+    share does not supersede the entry; it shows once the entry expires.
+
+    Without a shared cache (``response_cache_enabled``) lists are served
+    uncached and without validators.
+    """
+    cache_dependencies = ()
+
+    def list(self, request, *args, **kwargs):
+        if not response_cache_enabled():
+            return super().list(request, *args, **kwargs)
+
+        versions = get_versions(request.user, self.cache_dependencies)
+        params = normalize_query_params(request.query_params)
+        digest = hashlib.md5(('%s|%s|%s|%r' % (
+            request.user.pk, self.basename, params, versions)).encode('utf-8')).hexdigest()
+        etag = quote_etag(digest)
+
+        if self.is_not_modified(request, etag):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            cache = get_cache()
+            key = 'tracker:list:%s:%s' % (request.user.pk, digest)
+            data = cache.get(key)
+            if data is None:
+                response = super().list(request, *args, **kwargs)
+                cache.set(key, response.data)
+            else:
+                response = Response(data)
+
+        response['ETag'] = etag
+        return response
+
+    def is_not_modified(self, request, etag):
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match is None:
+            return False
+        return etag in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*'
@@ -0,0 +1,143 @@
+import datetime
+import json
+import math
+import struct
+import sys
+from array import array
+
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.response import Response
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+# Columns of a set in the order they are sent, with the ``array`` typecode
+# each is packed as in the binary format.
+COLUMNAR_FIELDS = (
+    ('id', 'q'),
+    ('date_performed', 'i'),
+    ('exercise_type', 'q'),
+    ('exercise', 'q'),
+    ('reps', 'i'),
+    ('weight', 'd'),
+    ('percentage', 'd'),
+    ('planned', 'b'),
+)
+
+PACKED_MAGIC = b'TRK1'
+EPOCH = datetime.date(1970, 1, 1)
+
+
+def build_columns(rows, fields):
+    """
+    Turns ``values_list()`` rows into ``{field: [values]}``.
+    """
+    columns = list(zip(*rows)) if rows else [()] * len(fields)
+    return {field: list(values) for field, values in zip(fields, columns)}
+
+
+class ColumnarJSONRenderer(JSONRenderer):
+    media_type = 'application/vnd.tracker.columnar+json'
+    format = 'columnar'
+
+
+class ColumnarMessagePackRenderer(BaseRenderer):
+    media_type = 'application/vnd.tracker.columnar+msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=self.encode)
+
+    def encode(self, value):
+        if isinstance(value, (datetime.date, datetime.datetime)):
+            return value.isoformat()
+        return DjangoJSONEncoder().default(value)
+
+
+class ColumnarPackedRenderer(BaseRenderer):
+    """
+    Packs each column as a little-endian array, which clients can wrap in a
+    typed array without parsing anything::
+
+        b'TRK1'  uint32 row count  uint32 header length  header (JSON)
+        one array per column, in the header's ``columns`` order
+
+    The header carries the pagination links and the columns with their
+    ``array`` typecodes. Dates are days since 1970-01-01, a missing
+    percentage is NaN and ``planned`` is 0 or 1.
+    """
+    media_type = 'application/vnd.tracker.columnar+octet-stream'
+    format = 'packed'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        columns = data.get('results', data)
+        header = {key: value for key, value in data.items() if key != 'results'} if 'results' in data else {}
+        header['columns'] = [[field, typecode] for field, typecode in COLUMNAR_FIELDS]
+        header = json.dumps(header, cls=DjangoJSONEncoder, separators=(',', ':')).encode('utf-8')
+
+        count = len(columns['id'])
+        chunks = [PACKED_MAGIC, struct.pack('<II', count, len(header)), header]
+        for field, typecode in COLUMNAR_FIELDS:
+            values = columns[field]
+            if field == 'date_performed':
+                values = [(value - EPOCH).days for value in values]
+            elif typecode == 'd':
+                values = [math.nan if value is None else value for value in values]
+            packed = array(typecode, values)
+            if sys.byteorder == 'big':
+                packed.byteswap()
+            chunks.append(packed.tobytes())
+        return b''.join(chunks)
+
+
+COLUMNAR_RENDERERS = (ColumnarJSONRenderer, ColumnarPackedRenderer)
+if msgpack is not None:
+    COLUMNAR_RENDERERS += (ColumnarMessagePackRenderer,)
+
+
+class ColumnarListMixin:
+    """
+    Lets clients ask for a list as parallel arrays, one per field, with
+    ``Accept`` or ``?format=columnar``, ``packed`` or, when ``msgpack`` is
+    installed, ``msgpack``. The page is read with ``values_list()``, so no
+    model instances or serializer fields are built. Other actions and error
+    responses keep the regular renderers.
+    """
+    columnar_fields = tuple(field for field, _ in COLUMNAR_FIELDS)
+
+    def get_renderers(self):
+        renderers = super().get_renderers()
+        if self.action == 'list':
+            renderers += [renderer() for renderer in COLUMNAR_RENDERERS]
+        return renderers
+
+    def is_columnar(self, request):
+        return isinstance(getattr(request, 'accepted_renderer', None), COLUMNAR_RENDERERS)
+
+    def list(self, request, *args, **kwargs):
+        if not self.is_columnar(request):
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset()).values_list(*self.columnar_fields, named=True)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(build_columns(page, self.columnar_fields))
+        return Response(build_columns(list(queryset), self.columnar_fields))
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if response.status_code >= 400 and self.is_columnar(request):
+            request.accepted_renderer = JSONRenderer()
+            request.accepted_media_type = JSONRenderer.media_type
+        return super().finalize_response(request, response, *args, **kwargs)
@@ -0,0 +1,104 @@
+import contextvars
+import random
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from workouttracker.tracker.cache import get_cache
+
+
+_replica_reads = contextvars.ContextVar('tracker_replica_reads', default=False)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+PIN_COOKIE = 'tracker_primary_until'
+
+
+def _pin_key(user_id):
+    return 'tracker:primary:%s' % user_id
+
+
+def pin_to_primary(request, response):
+    """
+    Sends the reads of ``request.user`` to the primary for the next
+    ``TRACKER_REPLICA_PIN_SECONDS``, which should exceed the replication lag.
+    The window is kept both in the tracker cache, for clients that drop
+    cookies, and in a cookie, which holds even where the cache is per process.
+    """
+    seconds = getattr(settings, 'TRACKER_REPLICA_PIN_SECONDS', 10)
+    get_cache().set(_pin_key(request.user.pk), True, timeout=seconds)
+    response.set_cookie(PIN_COOKIE, '%d' % (time.time() + seconds), max_age=seconds, httponly=True, samesite='Lax')
+
+
+def is_pinned_to_primary(request):
+    try:
+        if int(request.COOKIES.get(PIN_COOKIE, 0)) > time.time():
+            return True
+    except ValueError:
+        pass
+    return request.user.is_authenticated and get_cache().get(_pin_key(request.user.pk)) is not None
+
+
+class ReplicaRouter:
+    """
+    Reads tracker models from a random database of
+    ``TRACKER_DATABASE_REPLICAS`` while ``ReplicaReadMixin`` allows it. Every other read of a tracker model and
+    every write of one, even of an object read from a replica, goes to the
+    primary. Replicas are physical copies of the primary, so relations
+    between them are allowed and migrations are left to the defaults.
+    """
+
+    def db_for_read(self, model, **hints):
+        replicas = getattr(settings, 'TRACKER_DATABASE_REPLICAS', ())
+        if replicas and model._meta.app_label == 'tracker' and _replica_reads.get():
+            return random.choice(replicas)
+        return None
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label == 'tracker':
+            return DEFAULT_DB_ALIAS
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *getattr(settings, 'TRACKER_DATABASE_REPLICAS', ())}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+class ReplicaReadMixin:
+    """
+    Serves safe requests from the replicas, if any are configured, unless
+    the user is pinned to the primary by a recent write. Authentication and
+    permission checks still read from the primary, as the user is only known
+    once they have run.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if (request.method in SAFE_METHODS
+                and getattr(settings, 'TRACKER_DATABASE_REPLICAS', ())
+                and not is_pinned_to_primary(request)):
+            self._replica_reads = _replica_reads.set(True)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, '_replica_reads', None)
+        if token is not None:
+            _replica_reads.reset(token)
+            self._replica_reads = None
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+def close_unusable_connections(**kwargs):
+    """
+    Closes kept connections that no longer work at the start of a request,
+    so the request opens a new one instead of failing on a connection the
+    server or a pooler has dropped. Django 4.0 has no ``CONN_HEALTH_CHECKS``;
+    this does the same when ``TRACKER_DB_HEALTH_CHECKS`` is on.
+    """
+    if not getattr(settings, 'TRACKER_DB_HEALTH_CHECKS', False):
+        return
+    for connection in connections.all():
+        if connection.connection is not None and not connection.in_atomic_block and not connection.is_usable():
+            connection.close()
@@ -0,0 +1,64 @@
+import csv
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from workouttracker.tracker.models import ExerciseSet
+
+
+EXPORT_COLUMNS = (
+    ('workout_id', 'exercise__workout_id'),
+    ('workout_name', 'exercise__workout__name'),
+    ('workout_date', 'exercise__workout__date_performed'),
+    ('exercise_id', 'exercise_id'),
+    ('exercise_type', 'exercise_type__name'),
+    ('set_id', 'id'),
+    ('date_performed', 'date_performed'),
+    ('reps', 'reps'),
+    ('weight', 'weight'),
+    ('percentage', 'percentage'),
+)
+
+EXPORT_HEADER = [name for name, _ in EXPORT_COLUMNS]
+
+
+def export_rows(user, start_date=None, end_date=None, chunk_size=2000):
+    """
+    Yields one tuple per performed set of ``user`` in ``EXPORT_COLUMNS``
+    order, with the workout and exercise it belongs to. Rows are fetched
+    ``chunk_size`` at a time through a server-side cursor where the database
+    supports one, so memory use does not grow with the history.
+    """
+    queryset = ExerciseSet.objects.filter(user=user, planned=False)
+    if start_date is not None:
+        queryset = queryset.filter(date_performed__gte=start_date)
+    if end_date is not None:
+        queryset = queryset.filter(date_performed__lte=end_date)
+
+    return (queryset
+            .order_by('date_performed', 'exercise__workout_id', 'exercise_id', 'id')
+            .values_list(*[lookup for _, lookup in EXPORT_COLUMNS])
+            .iterator(chunk_size=chunk_size))
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_HEADER)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def stream_ndjson(rows):
+    encoder = DjangoJSONEncoder()
+    for row in rows:
+        yield encoder.encode(dict(zip(EXPORT_HEADER, row))) + '\n'
+
+
+EXPORT_FORMATS = {
+    'csv': (stream_csv, 'text/csv'),
+    'ndjson': (stream_ndjson, 'application/x-ndjson'),
+}
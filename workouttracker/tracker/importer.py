@@ -0,0 +1,257 @@
+import csv
+import datetime
+import io
+import json
+
+from django.db import connections, router, transaction
+
+from workouttracker.tracker.analytics import refresh_summary_ranges
+from workouttracker.tracker.cache import invalidate_cache
+from workouttracker.tracker.models import ExerciseType, Workout, Exercise, ExerciseSet
+
+
+MAX_REPORTED_ERRORS = 100
+
+# The exercise set columns that come from each row, in the order
+# ``insert_exercise_sets`` reads them; the others are the same for every set.
+ROW_FIELDS = ('exercise_id', 'exercise_type_id', 'date_performed', 'reps', 'weight', 'percentage')
+
+
+class RowError(ValueError):
+    pass
+
+
+def read_csv(fileobj):
+    """
+    Yields ``(line_number, row)`` for each data row of a CSV file in the
+    export format. ``fileobj`` may be opened in binary or text mode.
+    """
+    if not isinstance(fileobj, io.TextIOBase):
+        fileobj = io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')
+    reader = csv.DictReader(fileobj)
+    for row in reader:
+        yield reader.line_num, row
+
+
+def read_ndjson(fileobj):
+    """
+    Yields ``(line_number, row)`` for each non-blank line of a newline
+    delimited JSON file whose lines are objects in the export format.
+    """
+    if not isinstance(fileobj, io.TextIOBase):
+        fileobj = io.TextIOWrapper(fileobj, encoding='utf-8-sig')
+    for line_number, line in enumerate(fileobj, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            row = e
+        yield line_number, row
+
+
+IMPORT_READERS = {
+    'csv': read_csv,
+    'ndjson': read_ndjson,
+}
+
+
+def _parse_date(value, field):
+    if isinstance(value, datetime.date):
+        return value
+    try:
+        return datetime.date.fromisoformat(str(value).strip())
+    except ValueError:
+        raise RowError('%s: "%s" is not a YYYY-MM-DD date' % (field, value))
+
+
+def _parse_number(value, field, cast, required=True):
+    if value is None or str(value).strip() == '':
+        if required:
+            raise RowError('%s is required' % field)
+        return None
+    try:
+        return cast(value)
+    except (TypeError, ValueError):
+        raise RowError('%s: "%s" is not a number' % (field, value))
+
+
+def parse_row(row):
+    """
+    Normalises one export-format row. ``workout_date``, ``exercise_type``,
+    ``reps`` and ``weight`` are required; ``workout_id`` and ``exercise_id``
+    are only used to group rows into workouts and exercises.
+    """
+    if not isinstance(row, dict):
+        raise RowError('expected an object, got %s' % (row if isinstance(row, ValueError) else type(row).__name__))
+
+    exercise_type = str(row.get('exercise_type') or '').strip()
+    if not exercise_type:
+        raise RowError('exercise_type is required')
+    if len(exercise_type) > ExerciseType._meta.get_field('name').max_length:
+        raise RowError('exercise_type is too long')
+    workout_name = str(row.get('workout_name') or 'Workout').strip()[:Workout._meta.get_field('name').max_length]
+
+    workout_date = _parse_date(row.get('workout_date') or row.get('date_performed'), 'workout_date')
+    date_performed = _parse_date(row.get('date_performed') or workout_date, 'date_performed')
+    workout_key = str(row.get('workout_id') or '') or (workout_name, workout_date)
+    exercise_key = (workout_key, str(row.get('exercise_id') or '') or exercise_type)
+
+    return {
+        'workout_key': workout_key,
+        'workout_name': workout_name,
+        'workout_date': workout_date,
+        'exercise_key': exercise_key,
+        'exercise_type': exercise_type,
+        'date_performed': date_performed,
+        'reps': _parse_number(row.get('reps'), 'reps', int),
+        'weight': _parse_number(row.get('weight'), 'weight', float),
+        'percentage': _parse_number(row.get('percentage'), 'percentage', float, required=False),
+    }
+
+
+class HistoryImporter:
+    """
+    Imports ``(line_number, row)`` pairs for one user in batches of
+    ``batch_size`` sets. Each batch creates its missing exercise types,
+    workouts and exercises with one ``bulk_create`` apiece and its sets with
+    one ``executemany``. Rows that fail to parse are skipped and reported.
+    Only the days between the first and last imported set of each exercise
+    type have their summaries and records refreshed. With ``dry_run``
+    everything is rolled back at the end, so the statistics describe what
+    would be imported.
+
+    ``progress`` is called with the running statistics after every batch.
+    """
+
+    def __init__(self, user, batch_size=5000, dry_run=False, progress=None):
+        self.user = user
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.progress = progress
+        self.stats = {
+            'rows': 0,
+            'exercise_types': 0,
+            'workouts': 0,
+            'exercises': 0,
+            'sets': 0,
+            'errors': [],
+            'error_count': 0,
+            'dry_run': dry_run,
+        }
+
+    def run(self, rows):
+        with transaction.atomic():
+            self.exercise_types = {
+                exercise_type.name: exercise_type
+                for exercise_type in ExerciseType.objects.filter(user=self.user).order_by('-pk')
+            }
+            self.workouts = {}
+            self.exercises = {}
+            self.ranges = {}
+
+            batch = []
+            for line_number, row in rows:
+                self.stats['rows'] += 1
+                try:
+                    batch.append(parse_row(row))
+                except RowError as e:
+                    self.add_error(line_number, str(e))
+                if len(batch) >= self.batch_size:
+                    self.import_batch(batch)
+                    batch = []
+            self.import_batch(batch)
+
+            refresh_summary_ranges(self.ranges, added=True)
+            if self.dry_run:
+                transaction.set_rollback(True)
+
+        if self.stats['sets'] and not self.dry_run:
+            invalidate_cache(self.user, (ExerciseType, Workout, Exercise, ExerciseSet))
+        return self.stats
+
+    def add_error(self, line_number, message):
+        self.stats['error_count'] += 1
+        if len(self.stats['errors']) < MAX_REPORTED_ERRORS:
+            self.stats['errors'].append({'line': line_number, 'error': message})
+
+    def import_batch(self, batch):
+        if not batch:
+            return
+
+        names = {row['exercise_type'] for row in batch} - set(self.exercise_types)
+        for exercise_type in ExerciseType.objects.bulk_create([
+                ExerciseType(user=self.user, name=name) for name in sorted(names)]):
+            self.exercise_types[exercise_type.name] = exercise_type
+        self.stats['exercise_types'] += len(names)
+
+        new_workouts = {}
+        for row in batch:
+            if row['workout_key'] not in self.workouts and row['workout_key'] not in new_workouts:
+                new_workouts[row['workout_key']] = Workout(
+                    user=self.user, name=row['workout_name'], date_performed=row['workout_date'])
+        Workout.objects.bulk_create(new_workouts.values())
+        self.workouts.update({key: workout.pk for key, workout in new_workouts.items()})
+        self.stats['workouts'] += len(new_workouts)
+
+        new_exercises = {}
+        for row in batch:
+            if row['exercise_key'] not in self.exercises and row['exercise_key'] not in new_exercises:
+                new_exercises[row['exercise_key']] = Exercise(
+                    user=self.user,
+                    workout_id=self.workouts[row['workout_key']],
+                    exercise_type=self.exercise_types[row['exercise_type']],
+                    date_performed=row['workout_date'],
+                )
+        Exercise.objects.bulk_create(new_exercises.values())
+        self.exercises.update({
+            key: (exercise.pk, exercise.exercise_type_id) for key, exercise in new_exercises.items()
+        })
+        self.stats['exercises'] += len(new_exercises)
+
+        self.insert_exercise_sets(batch)
+        self.stats['sets'] += len(batch)
+
+        if self.progress is not None:
+            self.progress(self.stats)
+
+    def insert_exercise_sets(self, batch):
+        """
+        Inserts the sets of ``batch`` with a single ``executemany``. Sets are
+        the bulk of any import and nothing needs their primary keys, so this
+        skips building a model instance and compiling an INSERT per row, which
+        is where ``bulk_create`` spends most of its time. The columns come
+        from the model, and those the rows do not fill get the values of a new
+        set.
+        """
+        connection = connections[router.db_for_write(ExerciseSet)]
+        ops = connection.ops
+        fields = [field for field in ExerciseSet._meta.concrete_fields if not field.primary_key]
+        template = ExerciseSet(user=self.user)
+        defaults = [field.get_db_prep_save(field.pre_save(template, True), connection) for field in fields]
+        sql = 'INSERT INTO %s (%s) VALUES (%s)' % (
+            ops.quote_name(ExerciseSet._meta.db_table),
+            ', '.join(ops.quote_name(field.column) for field in fields),
+            ', '.join(['%s'] * len(fields)),
+        )
+        row_indexes = [
+            (index, ROW_FIELDS.index(field.attname))
+            for index, field in enumerate(fields) if field.attname in ROW_FIELDS
+        ]
+
+        params = []
+        for row in batch:
+            exercise_id, exercise_type_id = self.exercises[row['exercise_key']]
+            values = (exercise_id, exercise_type_id, ops.adapt_datefield_value(row['date_performed']),
+                      row['reps'], row['weight'], row['percentage'])
+            row_params = list(defaults)
+            for index, position in row_indexes:
+                row_params[index] = values[position]
+            params.append(row_params)
+
+            pair = (self.user.pk, exercise_type_id)
+            first, last = self.ranges.get(pair, (row['date_performed'], row['date_performed']))
+            self.ranges[pair] = (min(first, row['date_performed']), max(last, row['date_performed']))
+
+        with connection.cursor() as cursor:
+            cursor.executemany(sql, params)
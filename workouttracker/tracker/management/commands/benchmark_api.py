@@ -0,0 +1,88 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test.utils import override_settings
+
+from workouttracker.tracker.benchmark import BenchmarkRunner, build_scenarios
+from workouttracker.tracker.synthetic import create_synthetic_user, seed_training_history
+
+
+class Command(BaseCommand):
+    help = (
+        'Seeds synthetic users inside a transaction that is rolled back, sends '
+        'a request to every tracker route through the test client and reports '
+        'p50/p95/p99 latency, SQL query count and peak memory per route.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=3, help='Synthetic users to seed.')
+        parser.add_argument('--workouts', type=int, default=500, help='Workouts per user.')
+        parser.add_argument('--exercises', type=int, default=3, help='Exercises per workout.')
+        parser.add_argument('--sets', type=int, default=5, help='Sets per exercise.')
+        parser.add_argument('--repeat', type=int, default=20, help='Timed requests per route.')
+        parser.add_argument(
+            '--cached', action='store_true',
+            help='Keep the tracker cache between requests instead of measuring cold lists.')
+        parser.add_argument(
+            '--auth', choices=('token', 'jwt'), default='token',
+            help='Authenticate with a DRF token or with a JWT.')
+        parser.add_argument('--only', nargs='+', default=[], help='Only run routes whose name contains one of these.')
+        parser.add_argument('--output', help='Write the results as JSON to this file.')
+        parser.add_argument('--compare', help='JSON results of an earlier run to report changes against.')
+
+    def handle(self, *args, **options):
+        baseline = {}
+        if options['compare']:
+            try:
+                with open(options['compare']) as fileobj:
+                    baseline = {result['name']: result for result in json.load(fileobj)['results']}
+            except (OSError, ValueError, KeyError) as e:
+                raise CommandError('Could not read %s: %s' % (options['compare'], e))
+
+        # The test client sends requests for the 'testserver' host, all from this
+        # process, so --cached can cache responses in a local cache.
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+                               TRACKER_RESPONSE_CACHE=options['cached']), transaction.atomic():
+            users = [create_synthetic_user('benchmark-api-%s@example.com' % i) for i in range(options['users'])]
+            sets = sum(
+                seed_training_history(user, options['workouts'], options['exercises'], options['sets'])
+                for user in users
+            )
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                '%s users, %s exercise sets' % (len(users), sets)))
+
+            scenarios = build_scenarios(users[0])
+            if options['only']:
+                scenarios = [s for s in scenarios if any(name in s.name for name in options['only'])]
+
+            runner = BenchmarkRunner(users[0], repeat=options['repeat'], cached=options['cached'],
+                                     auth=options['auth'])
+            results = []
+            for scenario in scenarios:
+                result = runner.measure(scenario)
+                results.append(result)
+                self.report(result, baseline.get(result['name']))
+
+            transaction.set_rollback(True)
+
+        if options['output']:
+            with open(options['output'], 'w') as fileobj:
+                json.dump({
+                    'settings': {key: options[key] for key in (
+                        'users', 'workouts', 'exercises', 'sets', 'repeat', 'cached', 'auth')},
+                    'results': results,
+                }, fileobj, indent=2)
+
+    def report(self, result, baseline):
+        line = '  %-32s %3s  p50 %8.2f ms  p95 %8.2f ms  p99 %8.2f ms  %4s queries  %9.1f KiB' % (
+            result['name'], result['status'], result['p50'], result['p95'], result['p99'],
+            result['queries'], result['peak_memory_kb'])
+        if baseline is not None:
+            line += '  (p50 %+.0f%%, queries %+d)' % (
+                (result['p50'] / baseline['p50'] - 1) * 100 if baseline['p50'] else 0,
+                result['queries'] - baseline['queries'])
+        if result['status'] >= 400:
+            line = self.style.ERROR(line)
+        self.stdout.write(line)
@@ -0,0 +1,62 @@
+import time
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.core.signals import request_finished, request_started
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.backends.signals import connection_created
+
+from workouttracker.tracker.benchmark import percentile
+from workouttracker.tracker.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Runs a one-query request cycle against the database, first opening a '
+        'connection for every request (CONN_MAX_AGE=0) and then keeping it '
+        '(DATABASE_CONN_MAX_AGE), and reports the latency and connections '
+        'opened for each.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Requests per mode.')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='Database alias to measure.')
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        original = connection.settings_dict['CONN_MAX_AGE']
+        try:
+            for max_age in (0, getattr(settings, 'DATABASE_CONN_MAX_AGE', 60) or 60):
+                connection.close()
+                connection.settings_dict['CONN_MAX_AGE'] = max_age
+                self.report(max_age, *self.run(connection, options['requests']))
+        finally:
+            connection.close()
+            connection.settings_dict['CONN_MAX_AGE'] = original
+
+    def run(self, connection, requests):
+        opened = []
+
+        def count(sender, connection, **kwargs):
+            opened.append(connection.alias)
+
+        connection_created.connect(count)
+        latencies = []
+        try:
+            for _ in range(requests):
+                start = time.perf_counter()
+                # The same signals a real request sends, so connections are
+                # opened, checked and closed exactly as they would be.
+                request_started.send(sender=WSGIHandler, environ={})
+                User.objects.using(connection.alias).filter(pk=0).exists()
+                request_finished.send(sender=WSGIHandler)
+                latencies.append((time.perf_counter() - start) * 1000)
+        finally:
+            connection_created.disconnect(count)
+        return sorted(latencies), opened.count(connection.alias)
+
+    def report(self, max_age, latencies, opened):
+        self.stdout.write('CONN_MAX_AGE=%-4s %6s connections  p50 %7.3f ms  p95 %7.3f ms  mean %7.3f ms' % (
+            max_age, opened, percentile(latencies, 50), percentile(latencies, 95),
+            sum(latencies) / len(latencies)))
@@ -0,0 +1,88 @@
+import datetime
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from workouttracker.tracker.models import UserWeight
+from workouttracker.tracker.shortcuts import get_objects_for_owner
+from workouttracker.tracker.synthetic import create_synthetic_user, seed_training_history
+
+
+EXERCISES_PER_WORKOUT = 3
+SETS_PER_EXERCISE = 5
+SETS_PER_WORKOUT = EXERCISES_PER_WORKOUT * SETS_PER_EXERCISE
+
+
+class Command(BaseCommand):
+    help = (
+        'Seeds growing synthetic set histories inside a transaction that is '
+        'rolled back, and reports the query plan and latency of the date range '
+        'queries issued by the tracker viewsets at each table size.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', type=int, nargs='+', default=[10000, 100000, 1000000],
+            help='Total exercise set counts to measure at.')
+        parser.add_argument(
+            '--users', type=int, default=4,
+            help='Number of users the sets are spread across.')
+        parser.add_argument(
+            '--repeat', type=int, default=20,
+            help='Executions per query when measuring latency.')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            users = [create_synthetic_user('benchmark-%s@example.com' % i) for i in range(options['users'])]
+            total_sets = 0
+
+            for size in sorted(options['sizes']):
+                workouts = max((size - total_sets) // (SETS_PER_WORKOUT * len(users)), 0)
+                for user in users:
+                    total_sets += seed_training_history(
+                        user, workouts, EXERCISES_PER_WORKOUT, SETS_PER_EXERCISE)
+                with connection.cursor() as cursor:
+                    cursor.execute('ANALYZE')
+
+                self.stdout.write(self.style.MIGRATE_HEADING('%s exercise sets' % total_sets))
+                for name, queryset in self.get_queries(users[0]):
+                    self.report(name, queryset, options['repeat'])
+
+            transaction.set_rollback(True)
+
+    def get_queries(self, user):
+        start = datetime.date(2015, 3, 1)
+        end = start + datetime.timedelta(days=30)
+        exercise_type = user.exercisetype_set.first()
+
+        sets = get_objects_for_owner(user, 'tracker.view_exerciseset')
+        exercises = get_objects_for_owner(user, 'tracker.view_exercise')
+        return [
+            ('exercisesets by date range',
+             sets.filter(date_performed__gte=start, date_performed__lte=end)),
+            ('exercisesets by type and date range',
+             sets.filter(exercise_type__in=[exercise_type], date_performed__gte=start, date_performed__lte=end)),
+            ('exercises by type and date range',
+             exercises.filter(exercise_type__in=[exercise_type], date_performed__gte=start, date_performed__lte=end)),
+            ('latest user weights',
+             UserWeight.objects.filter(user=user).order_by('-date')),
+        ]
+
+    def report(self, name, queryset, repeat):
+        queryset = queryset.order_by(*(queryset.query.order_by or ('date_performed', 'id')))[:100]
+        plan = queryset.explain()
+
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            list(queryset.all())
+            timings.append((time.perf_counter() - started) * 1000)
+
+        self.stdout.write('  %-38s median %7.2f ms  max %7.2f ms' % (
+            name, statistics.median(timings), max(timings)))
+        table = queryset.model._meta.db_table
+        for line in plan.splitlines():
+            if table in line or 'MULTI-INDEX' in line or 'TEMP B-TREE' in line:
+                self.stdout.write('      ' + line.strip())
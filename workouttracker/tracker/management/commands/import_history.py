@@ -0,0 +1,54 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from workouttracker.tracker.importer import IMPORT_READERS, HistoryImporter
+from workouttracker.tracker.models import User
+
+
+class Command(BaseCommand):
+    help = 'Imports a CSV or NDJSON training history (in the export format) for a user.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('email', help='Email of the user the history belongs to.')
+        parser.add_argument('path', help='File to import.')
+        parser.add_argument(
+            '--format', choices=sorted(IMPORT_READERS),
+            help='File format. Defaults to the file extension.')
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Number of sets inserted per batch.')
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Parse and insert everything, then roll back.')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(email=options['email'])
+        except User.DoesNotExist:
+            raise CommandError('No user with email "%s"' % options['email'])
+
+        import_format = options['format'] or os.path.splitext(options['path'])[1].lstrip('.').lower()
+        if import_format not in IMPORT_READERS:
+            raise CommandError('Cannot tell the format of "%s"; pass --format' % options['path'])
+
+        started = time.perf_counter()
+
+        def progress(stats):
+            elapsed = time.perf_counter() - started
+            self.stdout.write('%s rows, %s sets (%.0f sets/s)' % (
+                stats['rows'], stats['sets'], stats['sets'] / elapsed if elapsed else 0))
+
+        importer = HistoryImporter(
+            user, batch_size=options['batch_size'], dry_run=options['dry_run'], progress=progress)
+        with open(options['path'], 'rb') as fileobj:
+            stats = importer.run(IMPORT_READERS[import_format](fileobj))
+
+        for error in stats['errors']:
+            self.stderr.write('line %(line)s: %(error)s' % error)
+        self.stdout.write(self.style.SUCCESS(
+            '%s %s exercise types, %s workouts, %s exercises and %s sets in %.1fs (%s rows skipped)' % (
+                'Would import' if stats['dry_run'] else 'Imported',
+                stats['exercise_types'], stats['workouts'], stats['exercises'], stats['sets'],
+                time.perf_counter() - started, stats['error_count'])))
@@ -0,0 +1,113 @@
+import http.client
+import json
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand
+from rest_framework.authtoken.models import Token
+
+from workouttracker.tracker.benchmark import percentile
+from workouttracker.tracker.models import User, Workout
+from workouttracker.tracker.synthetic import create_synthetic_user, seed_training_history
+
+
+DEFAULT_PATHS = [
+    '/workouts/',
+    '/exercises/',
+    '/exercisesets/',
+    '/exercisesnested/',
+    '/workoutsnested/',
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Sends concurrent authenticated GET requests to a running server and '
+        'reports throughput and latency per path. Run it once against '
+        '"gunicorn workouttracker.wsgi" and once against "uvicorn '
+        'workouttracker.asgi:application" to compare the two request paths.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('base_url', help='Server to load, e.g. http://127.0.0.1:8000')
+        parser.add_argument(
+            '--email', default='loadtest@example.com',
+            help='User to authenticate as. Created with a synthetic history if missing.')
+        parser.add_argument(
+            '--workouts', type=int, default=200,
+            help='Workouts to seed when the user is created.')
+        parser.add_argument('--path', dest='paths', nargs='+', default=DEFAULT_PATHS)
+        parser.add_argument(
+            '--concurrency', type=int, nargs='+', default=[1, 8, 32],
+            help='Numbers of concurrent clients to measure at.')
+        parser.add_argument(
+            '--requests', type=int, default=500,
+            help='Requests per path and concurrency level.')
+        parser.add_argument('--json', action='store_true', help='Print the results as JSON.')
+
+    def handle(self, *args, **options):
+        token = self.get_token(options['email'], options['workouts'])
+        url = urlsplit(options['base_url'])
+        headers = {'Authorization': 'Token %s' % token, 'Accept': 'application/json'}
+
+        results = []
+        for path in options['paths']:
+            for concurrency in options['concurrency']:
+                result = self.run(url, path, headers, concurrency, options['requests'])
+                results.append(result)
+                if not options['json']:
+                    self.stdout.write(
+                        '%(path)-20s c=%(concurrency)-4s %(throughput)8.1f req/s  '
+                        'p50 %(p50).1fms  p95 %(p95).1fms  p99 %(p99).1fms  errors %(errors)s' % result)
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+
+    def get_token(self, email, workouts):
+        user = User.objects.filter(email=email).first()
+        if user is None:
+            user = create_synthetic_user(email)
+        if not Workout.objects.filter(user=user).exists():
+            seed_training_history(user, workouts)
+        token, _ = Token.objects.get_or_create(user=user)
+        return token.key
+
+    def run(self, url, path, headers, concurrency, requests):
+        local = threading.local()
+        connection_class = http.client.HTTPSConnection if url.scheme == 'https' else http.client.HTTPConnection
+
+        def request(_):
+            if not hasattr(local, 'connection'):
+                local.connection = connection_class(url.netloc, timeout=60)
+            start = time.perf_counter()
+            try:
+                local.connection.request('GET', url.path.rstrip('/') + path, headers=headers)
+                response = local.connection.getresponse()
+                response.read()
+                ok = response.status == 200
+            except (OSError, http.client.HTTPException):
+                local.connection.close()
+                del local.connection
+                ok = False
+            return time.perf_counter() - start, ok
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            samples = list(executor.map(request, range(requests)))
+        elapsed = time.perf_counter() - start
+
+        latencies = sorted(latency * 1000 for latency, _ in samples)
+        return {
+            'path': path,
+            'concurrency': concurrency,
+            'requests': requests,
+            'errors': sum(1 for _, ok in samples if not ok),
+            'throughput': requests / elapsed,
+            'mean': statistics.mean(latencies),
+            'p50': percentile(latencies, 50),
+            'p95': percentile(latencies, 95),
+            'p99': percentile(latencies, 99),
+        }
@@ -0,0 +1,59 @@
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand
+from django.db import models, transaction
+from django.db.models import Exists, OuterRef
+from django.db.models.functions import Cast
+from guardian.models import UserObjectPermission
+
+from workouttracker.tracker.backends import OWNED_MODELS
+
+
+class Command(BaseCommand):
+    help = (
+        'Deletes guardian user object permissions that only restate ownership. '
+        'Owners are authorized through OwnershipPermissionBackend; rows granting '
+        'access to other users (explicit shares) are kept.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Report how many rows would be deleted without deleting them.')
+        parser.add_argument(
+            '--batch-size', type=int, default=10000,
+            help='Maximum number of rows deleted per statement.')
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        batch_size = options['batch_size']
+        total = 0
+
+        for model in OWNED_MODELS:
+            ctype = ContentType.objects.get_for_model(model)
+            owned = model.all_objects.filter(
+                pk=Cast(OuterRef('object_pk'), models.BigIntegerField()),
+                user=OuterRef('user'),
+            )
+            redundant = UserObjectPermission.objects.filter(content_type=ctype).filter(Exists(owned))
+
+            if dry_run:
+                count = redundant.count()
+            else:
+                count = 0
+                while True:
+                    with transaction.atomic():
+                        pks = list(redundant.values_list('pk', flat=True)[:batch_size])
+                        if not pks:
+                            break
+                        UserObjectPermission.objects.filter(pk__in=pks).delete()
+                    count += len(pks)
+
+            kept = UserObjectPermission.objects.filter(content_type=ctype).count()
+            if dry_run:
+                kept -= count
+            self.stdout.write('%s: %s owner permission(s) %s, %s shared permission(s) kept' % (
+                model._meta.label, count, 'to prune' if dry_run else 'pruned', kept))
+            total += count
+
+        self.stdout.write(self.style.SUCCESS('%s permission row(s) %s' % (
+            total, 'would be pruned' if dry_run else 'pruned')))
@@ -0,0 +1,73 @@
+import datetime
+import time
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from guardian.models import UserObjectPermission, GroupObjectPermission
+
+from workouttracker.tracker.models import UserWeight, ExerciseType, Workout, Exercise, ExerciseSet
+
+
+# Children before parents, so a purged parent never cascades into rows that
+# are still waiting for their own batch.
+PURGE_ORDER = (ExerciseSet, Exercise, Workout, UserWeight, ExerciseType)
+
+
+class Command(BaseCommand):
+    help = (
+        'Permanently deletes rows that were soft-deleted more than the '
+        'retention period ago, in bounded batches, together with any guardian '
+        'permissions on them.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=getattr(settings, 'TRACKER_SOFT_DELETE_RETENTION_DAYS', 30),
+            help='Only purge rows deleted at least this many days ago. /sync/ only asks clients '
+                 'to resync from scratch after TRACKER_SOFT_DELETE_RETENTION_DAYS, so stay above it.')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Maximum number of rows deleted per transaction.')
+        parser.add_argument(
+            '--sleep', type=float, default=0,
+            help='Seconds to pause between batches to leave room for other writers.')
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Report how many rows would be purged without deleting them.')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - datetime.timedelta(days=options['days'])
+        total = 0
+
+        for model in PURGE_ORDER:
+            expired = model.all_objects.filter(deleted_at__lt=cutoff)
+            if options['dry_run']:
+                count = expired.count()
+            else:
+                count = self.purge(model, expired, options['batch_size'], options['sleep'])
+            self.stdout.write('%s: %s row(s) %s' % (
+                model._meta.label, count, 'to purge' if options['dry_run'] else 'purged'))
+            total += count
+
+        self.stdout.write(self.style.SUCCESS('%s row(s) %s' % (
+            total, 'would be purged' if options['dry_run'] else 'purged')))
+
+    def purge(self, model, expired, batch_size, sleep):
+        ctype = ContentType.objects.get_for_model(model)
+        count = 0
+        while True:
+            with transaction.atomic():
+                pks = list(expired.order_by('deleted_at').values_list('pk', flat=True)[:batch_size])
+                if not pks:
+                    break
+                object_pks = [str(pk) for pk in pks]
+                UserObjectPermission.objects.filter(content_type=ctype, object_pk__in=object_pks).delete()
+                GroupObjectPermission.objects.filter(content_type=ctype, object_pk__in=object_pks).delete()
+                model.all_objects.filter(pk__in=pks).hard_delete()
+            count += len(pks)
+            if sleep:
+                time.sleep(sleep)
+        return count
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from workouttracker.tracker.analytics import rebuild_daily_summaries
+from workouttracker.tracker.models import User
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the daily exercise summaries and one rep maxes from the exercise sets.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'emails', nargs='*',
+            help='Only rebuild these users. Defaults to every user.')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of summaries inserted per statement.')
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by('pk')
+        if options['emails']:
+            users = users.filter(email__in=options['emails'])
+
+        total = 0
+        for user in users.iterator():
+            created = rebuild_daily_summaries(user, batch_size=options['batch_size'])
+            if options['verbosity'] > 1:
+                self.stdout.write('%s: %s summaries' % (user.email, created))
+            total += created
+
+        self.stdout.write(self.style.SUCCESS('Rebuilt %s daily summaries' % total))
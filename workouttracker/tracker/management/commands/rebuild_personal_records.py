@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from workouttracker.tracker.analytics import rebuild_personal_records
+from workouttracker.tracker.models import User, ExerciseSet, PersonalRecord
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuilds the personal records from the exercise sets and daily '
+        'summaries. Run rebuild_daily_summaries first if those are stale.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'emails', nargs='*',
+            help='Only rebuild these users. Defaults to every user.')
+        parser.add_argument(
+            '--batch-size', type=int, default=2000,
+            help='Number of sets read per round trip.')
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by('pk')
+        if options['emails']:
+            users = users.filter(email__in=options['emails'])
+
+        total = 0
+        for user in users.iterator():
+            pairs = set(ExerciseSet.objects.filter(user=user).values_list('user_id', 'exercise_type_id').distinct())
+            pairs |= set(PersonalRecord.objects.filter(user=user).values_list('user_id', 'exercise_type_id'))
+            created = rebuild_personal_records(pairs, batch_size=options['batch_size'])
+            if options['verbosity'] > 1:
+                self.stdout.write('%s: %s records' % (user.email, created))
+            total += created
+
+        self.stdout.write(self.style.SUCCESS('Rebuilt %s personal records' % total))
@@ -1,9 +1,16 @@
-import imp
 import json
-from urllib import response
+import random
+import time
+
+from django.conf import settings
 from django.http import HttpRequest, HttpResponse
 from django.utils.deprecation import MiddlewareMixin
-from settings import JWT_REFRESH_COOKIE
+
+from workouttracker.tracker.db import SAFE_METHODS, pin_to_primary
+from workouttracker.tracker.profiling import RequestProfile
+
+
+JWT_REFRESH_COOKIE = getattr(settings, 'JWT_REFRESH_COOKIE', 'jwt-refresh-token')
 
 
 class MoveJWTRefreshCookieIntoTheBody(MiddlewareMixin):    
@@ -26,3 +33,64 @@ class MoveJWTRefreshCookieIntoTheBody(MiddlewareMixin):
             else:
                 pass
         return None
+
+
+class ProfilingMiddleware:
+    """
+    Profiles a ``TRACKER_PROFILE_SAMPLE_RATE`` fraction of requests (0 turns
+    it off). Sampled responses get a ``Server-Timing`` header with the total,
+    database, authentication, permission, serialization and render times, and
+    one JSON line is logged to ``workouttracker.tracker.profiling``.
+    Unsampled requests cost one random number.
+
+    For streaming responses the total covers the view, not the body.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        sample_rate = getattr(settings, 'TRACKER_PROFILE_SAMPLE_RATE', 0)
+        if not sample_rate or random.random() >= sample_rate:
+            return self.get_response(request)
+
+        profile = request.tracker_profile = RequestProfile(
+            slow_query_ms=getattr(settings, 'TRACKER_PROFILE_SLOW_QUERY_MS', 100),
+            max_slow_queries=getattr(settings, 'TRACKER_PROFILE_MAX_SLOW_QUERIES', 5),
+        )
+        with profile.capture_queries():
+            response = self.get_response(request)
+
+        timings = profile.get_timings()
+        response['Server-Timing'] = profile.server_timing(timings)
+        profile.log(request, response, timings)
+        return response
+
+    def process_template_response(self, request, response):
+        profile = getattr(request, 'tracker_profile', None)
+        if profile is not None:
+            started = time.perf_counter()
+            response.add_post_render_callback(
+                lambda response: profile.add('render', time.perf_counter() - started))
+        return response
+
+
+class ReplicaPinMiddleware:
+    """
+    Pins a user's reads to the primary after any successful write they make,
+    so they never read their own changes from a lagging replica. Does nothing
+    without replicas.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        user = getattr(request, 'user', None)
+        if (getattr(settings, 'TRACKER_DATABASE_REPLICAS', ())
+                and request.method not in SAFE_METHODS
+                and 200 <= response.status_code < 400
+                and user is not None and user.is_authenticated):
+            pin_to_primary(request, response)
+        return response
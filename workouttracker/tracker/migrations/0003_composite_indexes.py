@@ -0,0 +1,37 @@
+# Generated by Django 4.0.5 on 2026-10-18 14:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0002_rename_date_joined_user_created_at_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='exercise',
+            index=models.Index(fields=['user', 'date_performed'], name='exercise_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='exercise',
+            index=models.Index(fields=['user', 'exercise_type', 'date_performed'], name='exercise_user_type_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='exerciseset',
+            index=models.Index(fields=['user', 'date_performed'], name='exset_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='exerciseset',
+            index=models.Index(fields=['user', 'exercise_type', 'date_performed'], name='exset_user_type_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userweight',
+            index=models.Index(fields=['user', '-date'], name='userweight_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='workout',
+            index=models.Index(fields=['user', 'date_performed'], name='workout_user_date_idx'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.0.5 on 2026-10-18 14:07
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0003_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyExerciseSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date_performed', models.DateField()),
+                ('best_weight', models.FloatField()),
+                ('best_reps', models.IntegerField()),
+                ('estimated_1rm', models.FloatField()),
+                ('estimated_1rm_brzycki', models.FloatField(blank=True, null=True)),
+                ('volume', models.FloatField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('exercise_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_summaries', to='tracker.exercisetype')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Daily Exercise Summary',
+                'verbose_name_plural': 'Daily Exercise Summaries',
+                'db_table': 'daily_exercise_summary',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dailyexercisesummary',
+            constraint=models.UniqueConstraint(fields=('user', 'exercise_type', 'date_performed'), name='daily_summary_user_type_date_uniq'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.0.5 on 2026-10-18 14:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0004_daily_exercise_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dailyexercisesummary',
+            name='set_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='dailyexercisesummary',
+            name='total_reps',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='dailyexercisesummary',
+            index=models.Index(fields=['user', 'date_performed'], name='daily_summary_user_date_idx'),
+        ),
+    ]
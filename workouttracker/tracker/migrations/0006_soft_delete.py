@@ -0,0 +1,81 @@
+# Generated by Django 4.0.5 on 2026-10-18 14:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0005_daily_volume_rollup'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='exercise',
+            name='exercise_user_date_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='exercise',
+            name='exercise_user_type_date_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='exerciseset',
+            name='exset_user_date_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='exerciseset',
+            name='exset_user_type_date_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='userweight',
+            name='userweight_user_date_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='workout',
+            name='workout_user_date_idx',
+        ),
+        migrations.AddIndex(
+            model_name='exercise',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['user', 'date_performed'], name='exercise_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='exercise',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['user', 'exercise_type', 'date_performed'], name='exercise_user_type_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='exercise',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', False)), fields=['deleted_at'], name='exercise_deleted_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='exerciseset',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['user', 'date_performed'], name='exset_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='exerciseset',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['user', 'exercise_type', 'date_performed'], name='exset_user_type_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='exerciseset',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', False)), fields=['deleted_at'], name='exset_deleted_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='exercisetype',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', False)), fields=['deleted_at'], name='exercisetype_deleted_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userweight',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['user', '-date'], name='userweight_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userweight',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', False)), fields=['deleted_at'], name='userweight_deleted_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='workout',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['user', 'date_performed'], name='workout_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='workout',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', False)), fields=['deleted_at'], name='workout_deleted_at_idx'),
+        ),
+    ]
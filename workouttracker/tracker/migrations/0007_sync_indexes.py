@@ -0,0 +1,33 @@
+# Generated by Django 4.0.5 on 2026-10-18 14:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0006_soft_delete'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='exercise',
+            index=models.Index(fields=['user', 'updated_at', 'id'], name='exercise_user_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='exerciseset',
+            index=models.Index(fields=['user', 'updated_at', 'id'], name='exset_user_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='exercisetype',
+            index=models.Index(fields=['user', 'updated_at', 'id'], name='exercisetype_user_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userweight',
+            index=models.Index(fields=['user', 'updated_at', 'id'], name='userweight_user_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='workout',
+            index=models.Index(fields=['user', 'updated_at', 'id'], name='workout_user_updated_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.0.5 on 2026-10-18 14:38
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0007_sync_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PersonalRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('weight', 'Best weight for a rep count'), ('estimated_1rm', 'Best estimated 1RM'), ('volume', 'Best session volume')], max_length=16)),
+                ('reps', models.IntegerField(default=0)),
+                ('value', models.FloatField()),
+                ('date_performed', models.DateField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('exercise_set', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='tracker.exerciseset')),
+                ('exercise_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='personal_records', to='tracker.exercisetype')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Personal Record',
+                'verbose_name_plural': 'Personal Records',
+                'db_table': 'personal_record',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='personalrecord',
+            constraint=models.UniqueConstraint(fields=('user', 'exercise_type', 'kind', 'reps'), name='personal_record_user_type_kind_reps_uniq'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.0.5 on 2026-10-18 14:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0008_personal_record'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exerciseset',
+            name='planned',
+            field=models.BooleanField(default=False),
+        ),
+    ]
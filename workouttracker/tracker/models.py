@@ -1,4 +1,5 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Q
 from django.contrib.auth.models import BaseUserManager, AbstractBaseUser, AbstractUser, PermissionsMixin
 from django.utils import timezone
 
@@ -36,6 +37,85 @@ class UserManager(BaseUserManager):
         return user
 
 
+###############################################################################
+#                                SOFT DELETE                                  #
+###############################################################################
+
+LIVE = Q(deleted_at__isnull=True)
+DELETED = Q(deleted_at__isnull=False)
+
+
+class SoftDeleteQuerySet(models.QuerySet):
+    def delete(self):
+        return soft_delete(self, timezone.now())
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+    def hard_delete(self):
+        return super().delete()
+
+    hard_delete.alters_data = True
+    hard_delete.queryset_only = True
+
+
+def soft_delete(queryset, now):
+    """
+    Marks the rows of ``queryset`` deleted at ``now`` instead of removing
+    them. Soft-deletable rows that an ``on_delete=CASCADE`` would remove are
+    marked too, with one UPDATE per table. Returns the same
+    ``(count, per_model)`` pair as ``QuerySet.delete()``.
+    """
+    counts = {}
+    with transaction.atomic(using=queryset.db):
+        _soft_delete(queryset.filter(LIVE), now, counts)
+    counts = {label: count for label, count in counts.items() if count}
+    return sum(counts.values()), counts
+
+
+def _soft_delete(queryset, now, counts):
+    # Children first, while the parents still match their filter.
+    for relation in queryset.model._meta.related_objects:
+        if relation.on_delete is models.CASCADE and issubclass(relation.related_model, SoftDeleteModel):
+            children = relation.related_model.all_objects.filter(
+                LIVE, **{'%s__in' % relation.field.name: queryset.values('pk')})
+            _soft_delete(children, now, counts)
+    label = queryset.model._meta.label
+    counts[label] = counts.get(label, 0) + queryset.update(deleted_at=now, updated_at=now)
+
+
+class SoftDeleteManager(models.Manager.from_queryset(SoftDeleteQuerySet)):
+    def get_queryset(self):
+        return super().get_queryset().filter(LIVE)
+
+
+class SoftDeleteModel(models.Model):
+    """
+    ``objects`` only sees live rows and is the default manager, so related
+    managers and permission querysets skip deleted rows too; ``all_objects``
+    sees everything. Deleted rows are removed for good by the
+    ``purge_deleted`` command.
+    """
+    objects = SoftDeleteManager()
+    all_objects = models.Manager.from_queryset(SoftDeleteQuerySet)()
+
+    class Meta:
+        abstract = True
+
+    def delete(self, using=None, keep_parents=False):
+        now = timezone.now()
+        result = soft_delete(type(self).all_objects.using(using or self._state.db).filter(pk=self.pk), now)
+        self.deleted_at = self.updated_at = now
+        return result
+
+    def hard_delete(self, using=None, keep_parents=False):
+        return super().delete(using=using, keep_parents=keep_parents)
+
+
+###############################################################################
+#                                   MODELS                                    #
+###############################################################################
+
 class User(AbstractBaseUser, GuardianUserMixin, PermissionsMixin):
     email = models.EmailField(max_length=254, unique=True)
     name = models.CharField(max_length=254, blank=True, null=True)
@@ -60,7 +140,7 @@ class User(AbstractBaseUser, GuardianUserMixin, PermissionsMixin):
     #    return "/users/%i/" %(self.pk)
 
 
-class UserWeight(models.Model):
+class UserWeight(SoftDeleteModel):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='user_weights')
     weight = models.FloatField()
     date = models.DateField(auto_now_add=True)
@@ -71,12 +151,17 @@ class UserWeight(models.Model):
 
     class Meta:
         ordering = ['-date']
+        indexes = [
+            models.Index(fields=['user', '-date'], name='userweight_user_date_idx', condition=LIVE),
+            models.Index(fields=['deleted_at'], name='userweight_deleted_at_idx', condition=DELETED),
+            models.Index(fields=['user', 'updated_at', 'id'], name='userweight_user_updated_idx'),
+        ]
 
     def __str__(self):
         return str(self.weight) + ' @ ' + str(self.date)
 
 
-class ExerciseType(models.Model):
+class ExerciseType(SoftDeleteModel):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     name = models.CharField(max_length=100)
 
@@ -91,9 +176,13 @@ class ExerciseType(models.Model):
         db_table = 'exercise_type'
         verbose_name = 'Exercise Type'
         verbose_name_plural = 'Exercise Types'
+        indexes = [
+            models.Index(fields=['deleted_at'], name='exercisetype_deleted_at_idx', condition=DELETED),
+            models.Index(fields=['user', 'updated_at', 'id'], name='exercisetype_user_updated_idx'),
+        ]
     
 
-class Workout(models.Model):
+class Workout(SoftDeleteModel):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='workouts')
     name = models.CharField(max_length=100)
     date_performed = models.DateField()
@@ -109,9 +198,14 @@ class Workout(models.Model):
         db_table = 'workout'
         verbose_name = 'Workout'
         verbose_name_plural = 'Workouts'
+        indexes = [
+            models.Index(fields=['user', 'date_performed'], name='workout_user_date_idx', condition=LIVE),
+            models.Index(fields=['deleted_at'], name='workout_deleted_at_idx', condition=DELETED),
+            models.Index(fields=['user', 'updated_at', 'id'], name='workout_user_updated_idx'),
+        ]
 
 
-class Exercise(models.Model):
+class Exercise(SoftDeleteModel):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     date_performed = models.DateField()
     exercise_type = models.ForeignKey(ExerciseType, on_delete=models.CASCADE)
@@ -126,9 +220,16 @@ class Exercise(models.Model):
         db_table = 'exercise'
         verbose_name = 'Exercise'
         verbose_name_plural = 'Exercises'
+        indexes = [
+            models.Index(fields=['user', 'date_performed'], name='exercise_user_date_idx', condition=LIVE),
+            models.Index(fields=['user', 'exercise_type', 'date_performed'], name='exercise_user_type_date_idx',
+                         condition=LIVE),
+            models.Index(fields=['deleted_at'], name='exercise_deleted_at_idx', condition=DELETED),
+            models.Index(fields=['user', 'updated_at', 'id'], name='exercise_user_updated_idx'),
+        ]
 
 
-class ExerciseSet(models.Model):
+class ExerciseSet(SoftDeleteModel):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     date_performed = models.DateField()
     exercise_type = models.ForeignKey(ExerciseType, on_delete=models.CASCADE, related_name='exercise_sets')
@@ -136,6 +237,8 @@ class ExerciseSet(models.Model):
     reps = models.IntegerField()
     weight = models.FloatField()
     percentage = models.FloatField(null=True, blank=True)
+    # Written by a training plan and not performed yet; analytics skip it.
+    planned = models.BooleanField(default=False)
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -148,6 +251,13 @@ class ExerciseSet(models.Model):
         db_table = 'exercise_set'
         verbose_name = 'Exercise Set'
         verbose_name_plural = 'Exercise Sets'
+        indexes = [
+            models.Index(fields=['user', 'date_performed'], name='exset_user_date_idx', condition=LIVE),
+            models.Index(fields=['user', 'exercise_type', 'date_performed'], name='exset_user_type_date_idx',
+                         condition=LIVE),
+            models.Index(fields=['deleted_at'], name='exset_deleted_at_idx', condition=DELETED),
+            models.Index(fields=['user', 'updated_at', 'id'], name='exset_user_updated_idx'),
+        ]
 
 
 ###############################################################################
@@ -166,4 +276,72 @@ class OneRepMax(models.Model):
     class Meta:
         db_table = 'one_rep_max'
         verbose_name = 'One Rep Max'
-        verbose_name_plural = 'One Rep Maxes'
\ No newline at end of file
+        verbose_name_plural = 'One Rep Maxes'
+
+###############################################################################
+#                              ANALYTICS MODELS                               #
+###############################################################################
+
+class DailyExerciseSummary(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    exercise_type = models.ForeignKey(ExerciseType, on_delete=models.CASCADE, related_name='daily_summaries')
+    date_performed = models.DateField()
+    best_weight = models.FloatField()
+    best_reps = models.IntegerField()
+    estimated_1rm = models.FloatField()
+    estimated_1rm_brzycki = models.FloatField(null=True, blank=True)
+    volume = models.FloatField()
+    set_count = models.IntegerField(default=0)
+    total_reps = models.IntegerField(default=0)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'daily_exercise_summary'
+        verbose_name = 'Daily Exercise Summary'
+        verbose_name_plural = 'Daily Exercise Summaries'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'exercise_type', 'date_performed'], name='daily_summary_user_type_date_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'date_performed'], name='daily_summary_user_date_idx'),
+        ]
+
+
+class PersonalRecord(models.Model):
+    """
+    The best result of a user on an exercise type: the heaviest weight for
+    each rep count (``reps``), the best estimated 1RM and the best session
+    volume (``reps`` is 0 for both). One row per record, so checking a new set
+    against them is a lookup rather than a scan of the history.
+    """
+    WEIGHT = 'weight'
+    ESTIMATED_1RM = 'estimated_1rm'
+    VOLUME = 'volume'
+    KIND_CHOICES = (
+        (WEIGHT, 'Best weight for a rep count'),
+        (ESTIMATED_1RM, 'Best estimated 1RM'),
+        (VOLUME, 'Best session volume'),
+    )
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    exercise_type = models.ForeignKey(ExerciseType, on_delete=models.CASCADE, related_name='personal_records')
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES)
+    reps = models.IntegerField(default=0)
+    value = models.FloatField()
+    date_performed = models.DateField()
+    exercise_set = models.ForeignKey(ExerciseSet, null=True, blank=True, on_delete=models.SET_NULL, related_name='+')
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'personal_record'
+        verbose_name = 'Personal Record'
+        verbose_name_plural = 'Personal Records'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'exercise_type', 'kind', 'reps'], name='personal_record_user_type_kind_reps_uniq'),
+        ]
@@ -0,0 +1,71 @@
+from rest_framework import pagination
+
+
+class TrackerCursorPagination(pagination.CursorPagination):
+    """
+    Keyset pagination ordered by ``(date_performed, id)``. Views over models
+    without a ``date_performed`` column declare their own ``ordering``.
+
+    DRF only seeks on the first ordering field and skips rows sharing its
+    value with an offset, so a page reads the rows of its first day again
+    before the ones it returns; that stays cheap while days hold few rows.
+    """
+    ordering = ('date_performed', 'id')
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+    def get_ordering(self, request, queryset, view):
+        self.ordering = getattr(view, 'ordering', None) or self.ordering
+        return super().get_ordering(request, queryset, view)
+
+
+class TrackerLimitOffsetPagination(pagination.LimitOffsetPagination):
+    max_limit = 1000
+
+
+class TrackerPagination(pagination.BasePagination):
+    """
+    Uses cursor pagination unless the client opts in to offset pagination by
+    passing ``limit`` or ``offset``.
+    """
+    cursor_class = TrackerCursorPagination
+    limit_offset_class = TrackerLimitOffsetPagination
+
+    def __init__(self):
+        self.cursor_paginator = self.cursor_class()
+        self.limit_offset_paginator = self.limit_offset_class()
+        self.paginator = self.cursor_paginator
+
+    @property
+    def display_page_controls(self):
+        return self.paginator.display_page_controls
+
+    def uses_limit_offset(self, request):
+        return (self.limit_offset_paginator.limit_query_param in request.query_params
+                or self.limit_offset_paginator.offset_query_param in request.query_params)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.uses_limit_offset(request):
+            self.paginator = self.limit_offset_paginator
+            ordering = getattr(view, 'ordering', None) or self.cursor_class.ordering
+            queryset = queryset.order_by(*ordering)
+        else:
+            self.paginator = self.cursor_paginator
+        return self.paginator.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return self.paginator.get_paginated_response(data)
+
+    def get_paginated_response_schema(self, schema):
+        return self.paginator.get_paginated_response_schema(schema)
+
+    def to_html(self):
+        return self.paginator.to_html()
+
+    def get_schema_fields(self, view):
+        return (self.cursor_paginator.get_schema_fields(view)
+                + self.limit_offset_paginator.get_schema_fields(view))
+
+    def get_schema_operation_parameters(self, view):
+        return (self.cursor_paginator.get_schema_operation_parameters(view)
+                + self.limit_offset_paginator.get_schema_operation_parameters(view))
@@ -0,0 +1,85 @@
+import datetime
+
+from django.db import transaction
+from rest_framework.exceptions import ValidationError
+
+from workouttracker.tracker.cache import invalidate_cache
+from workouttracker.tracker.models import Workout, Exercise, ExerciseSet, OneRepMax
+
+
+MAX_PLAN_SETS = 10000
+
+
+def round_load(weight, rounding):
+    if rounding:
+        return round(weight / rounding) * rounding
+    return round(weight, 2)
+
+
+def generate_plan(user, template):
+    """
+    Expands a template validated by ``PlanTemplateSerializer`` into workouts
+    for ``user``: every day of the template once a week for ``weeks`` weeks,
+    each exercise with ``sets`` sets of ``reps`` at ``percentage`` (plus
+    ``progression`` per week) of the user's one rep max for it. The one rep
+    maxes are read with one query and the workouts, exercises and sets are
+    written with one ``bulk_create`` apiece, in a single transaction.
+
+    Sets are marked ``planned``, so they do not count towards summaries or
+    personal records until they are saved as performed.
+    """
+    exercise_types = {
+        exercise['exercise_type'] for day in template['days'] for exercise in day['exercises']}
+    planned_sets = template['weeks'] * sum(
+        exercise['sets'] for day in template['days'] for exercise in day['exercises'])
+    if planned_sets > MAX_PLAN_SETS:
+        raise ValidationError({'weeks': ['A plan has at most %s sets, this one has %s.' % (
+            MAX_PLAN_SETS, planned_sets)]})
+
+    one_rep_maxes = dict(
+        OneRepMax.objects
+        .filter(user=user, exercise_type__in=exercise_types)
+        .order_by('updated_at')
+        .values_list('exercise_type_id', 'weight'))
+    missing = sorted(exercise_type.name for exercise_type in exercise_types
+                     if exercise_type.pk not in one_rep_maxes)
+    if missing:
+        raise ValidationError({'days': ['No one rep max for %s.' % ', '.join(missing)]})
+
+    with transaction.atomic():
+        days = []
+        for week in range(template['weeks']):
+            for day in template['days']:
+                date = template['start_date'] + datetime.timedelta(weeks=week, days=day['day'])
+                name = '%s week %s' % (day.get('name') or template['name'], week + 1)
+                days.append((week, day, Workout(user=user, name=name, date_performed=date)))
+        Workout.objects.bulk_create([workout for _, _, workout in days])
+
+        exercises = []
+        for week, day, workout in days:
+            for exercise in day['exercises']:
+                exercises.append((week, exercise, Exercise(
+                    user=user, workout=workout, exercise_type=exercise['exercise_type'],
+                    date_performed=workout.date_performed)))
+        Exercise.objects.bulk_create([obj for _, _, obj in exercises])
+
+        exercise_sets = []
+        for week, exercise, obj in exercises:
+            percentage = exercise['percentage'] + exercise['progression'] * week
+            weight = round_load(one_rep_maxes[obj.exercise_type_id] * percentage / 100, template['rounding'])
+            exercise_sets.extend(
+                ExerciseSet(
+                    user=user, exercise=obj, exercise_type_id=obj.exercise_type_id,
+                    date_performed=obj.date_performed, reps=exercise['reps'], weight=weight,
+                    percentage=percentage, planned=True)
+                for _ in range(exercise['sets']))
+        ExerciseSet.objects.bulk_create(exercise_sets)
+
+    invalidate_cache(user, (Workout, Exercise, ExerciseSet))
+    return {
+        'workouts': len(days),
+        'exercises': len(exercises),
+        'sets': len(exercise_sets),
+        'start_date': min(workout.date_performed for _, _, workout in days),
+        'end_date': max(workout.date_performed for _, _, workout in days),
+    }
@@ -0,0 +1,150 @@
+import contextlib
+import json
+import logging
+import time
+
+from django.db import connections
+
+
+logger = logging.getLogger('workouttracker.tracker.profiling')
+
+
+class RequestProfile:
+    """
+    Collects the timings of one sampled request. It is installed as a
+    database execute wrapper, so queries are counted and timed without
+    ``DEBUG`` or the debug cursor; queries slower than ``slow_query_ms`` are
+    kept, up to ``max_slow_queries`` of them.
+
+    Phases may nest. Each phase records its wall time and the query time
+    spent inside it, which lets ``serialize`` be reported as the view's own
+    Python time: the view less authentication, permission checks and queries.
+    """
+
+    def __init__(self, slow_query_ms=100, max_slow_queries=5):
+        self.started = time.perf_counter()
+        self.slow_query_ms = slow_query_ms
+        self.max_slow_queries = max_slow_queries
+        self.query_count = 0
+        self.query_time = 0.0
+        self.slow_queries = []
+        self.phases = {}
+        self.phase_query_time = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.query_count += 1
+            self.query_time += duration
+            if duration * 1000 >= self.slow_query_ms and len(self.slow_queries) < self.max_slow_queries:
+                self.slow_queries.append({
+                    'alias': context['connection'].alias,
+                    'sql': sql[:1000],
+                    'ms': round(duration * 1000, 2),
+                })
+
+    @contextlib.contextmanager
+    def capture_queries(self):
+        """
+        Wraps the current thread's connections. Views that run on another
+        thread than the middleware enter this again; connections that are
+        already wrapped are left alone so nothing is counted twice.
+        """
+        with contextlib.ExitStack() as stack:
+            for connection in connections.all():
+                if self not in connection.execute_wrappers:
+                    stack.enter_context(connection.execute_wrapper(self))
+            yield
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        query_time = self.query_time
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started, self.query_time - query_time)
+
+    def add(self, name, duration, query_time=0.0):
+        self.phases[name] = self.phases.get(name, 0.0) + duration
+        self.phase_query_time[name] = self.phase_query_time.get(name, 0.0) + query_time
+
+    def get_timings(self):
+        """
+        Returns the phase durations in milliseconds, in Server-Timing order.
+        """
+        timings = {'total': time.perf_counter() - self.started, 'db': self.query_time}
+        for name in ('auth', 'perm'):
+            if name in self.phases:
+                timings[name] = self.phases[name]
+        if 'view' in self.phases:
+            nested = ('auth', 'perm')
+            timings['serialize'] = max(
+                self.phases['view'] - sum(self.phases.get(name, 0.0) for name in nested)
+                - (self.phase_query_time['view'] - sum(self.phase_query_time.get(name, 0.0) for name in nested)),
+                0.0)
+        if 'render' in self.phases:
+            timings['render'] = self.phases['render']
+        return {name: round(duration * 1000, 2) for name, duration in timings.items()}
+
+    def server_timing(self, timings):
+        return ', '.join(
+            '%s;dur=%s;desc="%s queries"' % (name, duration, self.query_count) if name == 'db' else
+            '%s;dur=%s' % (name, duration)
+            for name, duration in timings.items()
+        )
+
+    def log(self, request, response, timings):
+        resolver_match = getattr(request, 'resolver_match', None)
+        user = getattr(request, 'user', None)
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'view': resolver_match.view_name if resolver_match else None,
+            'status': response.status_code,
+            'user': user.pk if user is not None and user.is_authenticated else None,
+            'queries': self.query_count,
+            'timings': timings,
+            'slow_queries': self.slow_queries,
+        }))
+
+
+def profile_phase(request, name):
+    """
+    Times ``name`` on the request's profile, or does nothing when the request
+    is not being profiled.
+    """
+    profile = getattr(request, 'tracker_profile', None)
+    if profile is None:
+        return contextlib.nullcontext()
+    return profile.phase(name)
+
+
+class ProfiledViewMixin:
+    """
+    Splits the time of a profiled request into authentication, permission
+    checks and the view itself. Queries are also captured here because the
+    view may run on another thread than the middleware.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        profile = getattr(request, 'tracker_profile', None)
+        if profile is None:
+            return super().dispatch(request, *args, **kwargs)
+        with profile.capture_queries(), profile.phase('view'):
+            return super().dispatch(request, *args, **kwargs)
+
+    def perform_authentication(self, request):
+        with profile_phase(request, 'auth'):
+            super().perform_authentication(request)
+
+    def check_permissions(self, request):
+        with profile_phase(request, 'perm'):
+            super().check_permissions(request)
+
+    def check_object_permissions(self, request, obj):
+        with profile_phase(request, 'perm'):
+            super().check_object_permissions(request, obj)
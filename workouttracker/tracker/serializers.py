@@ -1,40 +1,104 @@
 from asyncore import read
 import re
 from requests import request
+from django.db import transaction
+from django.db.models import prefetch_related_objects
 from rest_framework import serializers
-from guardian.shortcuts import get_objects_for_user
-from workouttracker.tracker.models import User, UserWeight, ExerciseType, Workout, Exercise, ExerciseSet
-from guardian.shortcuts import assign_perm
-
-
-class ExerciseTypePKField(serializers.PrimaryKeyRelatedField):
+from workouttracker.tracker.models import User, UserWeight, ExerciseType, Workout, Exercise, ExerciseSet, DailyExerciseSummary, PersonalRecord
+from workouttracker.tracker.analytics import record_new_sets
+from workouttracker.tracker.shortcuts import get_objects_for_owner, parse_pk
+
+
+def _referenced_values(data, field_name):
+    """
+    Yields every value stored under ``field_name`` anywhere in a parsed
+    request payload, however deeply it is nested.
+    """
+    stack = [data]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, dict):
+            for key, item in value.items():
+                if key == field_name:
+                    yield item
+                elif isinstance(item, (dict, list)):
+                    stack.append(item)
+        elif isinstance(value, list):
+            stack.extend(value)
+
+
+class PrefetchedPKFieldMixin:
+    """
+    Resolves primary keys without one query per item. A bulk request can
+    pass already fetched objects in ``context['related_objects']``; otherwise
+    the first lookup collects every primary key the request payload sends
+    for this field and fetches them with one permission-filtered ``IN``
+    query, memoized on the request for the fields of every nested item.
+    """
+    def get_related_objects(self):
+        related_objects = self.context.get('related_objects', {}).get(self.field_name)
+        if related_objects is not None:
+            return None, related_objects
+
+        request = self.context.get('request')
+        if request is None:
+            return None, None
+        memo = getattr(request, '_tracker_related_objects', None)
+        if memo is None:
+            memo = request._tracker_related_objects = {}
+
+        key = (type(self), self.field_name)
+        if key not in memo:
+            pks = {parse_pk(value) for value in _referenced_values(request.data, self.field_name)}
+            pks.discard(None)
+            memo[key] = (pks, self.get_queryset().in_bulk(pks))
+        return memo[key]
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        pks, related_objects = self.get_related_objects()
+        if related_objects is None:
+            return super().to_internal_value(data)
+        try:
+            pk = int(data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if pk in related_objects:
+            return related_objects[pk]
+        if pks is not None and pk not in pks:
+            return super().to_internal_value(data)
+        self.fail('does_not_exist', pk_value=data)
+
+
+class ExerciseTypePKField(PrefetchedPKFieldMixin, serializers.PrimaryKeyRelatedField):
     def get_queryset(self):
-        user = self.context['request'].user
-        return get_objects_for_user(user, 'tracker.view_exercisetype')
+        request = self.context['request']
+        return get_objects_for_owner(request.user, 'tracker.view_exercisetype', request=request)
 
 
-class ExerciseSetPKField(serializers.PrimaryKeyRelatedField):
+class ExerciseSetPKField(PrefetchedPKFieldMixin, serializers.PrimaryKeyRelatedField):
     def get_queryset(self):
-        user = self.context['request'].user
-        return get_objects_for_user(user, 'tracker.view_exerciseset')
+        request = self.context['request']
+        return get_objects_for_owner(request.user, 'tracker.view_exerciseset', request=request)
 
 
-class ExercisePKField(serializers.PrimaryKeyRelatedField):
+class ExercisePKField(PrefetchedPKFieldMixin, serializers.PrimaryKeyRelatedField):
     def get_queryset(self):
-        user = self.context['request'].user
-        return get_objects_for_user(user, 'tracker.view_exercise')
+        request = self.context['request']
+        return get_objects_for_owner(request.user, 'tracker.view_exercise', request=request)
 
 
-class WorkoutPKField(serializers.PrimaryKeyRelatedField):
+class WorkoutPKField(PrefetchedPKFieldMixin, serializers.PrimaryKeyRelatedField):
     def get_queryset(self):
-        user = self.context['request'].user
-        return get_objects_for_user(user, 'tracker.view_workout')
+        request = self.context['request']
+        return get_objects_for_owner(request.user, 'tracker.view_workout', request=request)
 
 
 class ExerciseSetRelatedField(serializers.RelatedField):
     def get_queryset(self):
-        user = self.context['request'].user
-        return get_objects_for_user(user, 'tracker.view_exerciseset')
+        request = self.context['request']
+        return get_objects_for_owner(request.user, 'tracker.view_exerciseset', request=request)
 
     def to_representation(self, value):
         # return dict(id=value.id, reps=value.reps, weight=value.weight, percentage=value.percentage)
@@ -43,14 +107,14 @@ class ExerciseSetRelatedField(serializers.RelatedField):
 
 class ExerciseRelatedField(serializers.RelatedField):
     def get_queryset(self):
-        user = self.context['request'].user
-        return get_objects_for_user(user, 'tracker.view_exercise')
+        request = self.context['request']
+        return get_objects_for_owner(request.user, 'tracker.view_exercise', request=request)
 
 
 class ExerciseTypeRelatedField(serializers.RelatedField):
     def get_queryset(self):
-        user = self.context['request'].user
-        return get_objects_for_user(user, 'tracker.view_exercisetype')
+        request = self.context['request']
+        return get_objects_for_owner(request.user, 'tracker.view_exercisetype', request=request)
 
 
 ###############################################################################
@@ -84,6 +148,33 @@ class ExerciseTypeSerializer(serializers.HyperlinkedModelSerializer):
         fields = ('id', 'name',)
 
 
+class ExerciseProgressSerializer(serializers.Serializer):
+    date = serializers.DateField(source='date_performed')
+    best_weight = serializers.FloatField()
+    best_reps = serializers.IntegerField()
+    estimated_1rm = serializers.FloatField()
+    estimated_1rm_brzycki = serializers.FloatField(allow_null=True)
+    volume = serializers.FloatField()
+
+
+class WeeklyExerciseProgressSerializer(ExerciseProgressSerializer):
+    date = serializers.DateField()
+
+
+class PersonalRecordSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PersonalRecord
+        fields = ('kind', 'reps', 'value', 'date_performed', 'exercise_set',)
+        read_only_fields = fields
+
+
+class DailyVolumeSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DailyExerciseSummary
+        fields = ('id', 'date_performed', 'exercise_type', 'volume', 'set_count', 'total_reps',)
+        read_only_fields = fields
+
+
 class WorkoutSerializer(serializers.HyperlinkedModelSerializer):
     class Meta:
         model = Workout
@@ -99,49 +190,60 @@ class ExerciseSerializer(serializers.HyperlinkedModelSerializer):
         fields = ('id', 'date_performed', 'exercise_type', 'workout',)
 
 
-class ExerciseSetSerializer(serializers.HyperlinkedModelSerializer):    
+class PersonalRecordFlagsMixin:
+    """
+    Adds the personal records each set beat to create responses. The creating
+    code stores them by set id in ``context['personal_records']``, which
+    nested serializers share with their root.
+    """
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        personal_records = self.context.get('personal_records')
+        if personal_records is not None:
+            data['personal_records'] = personal_records.get(instance.pk, [])
+        return data
+
+
+class ExerciseSetSerializer(PersonalRecordFlagsMixin, serializers.HyperlinkedModelSerializer):
     exercise_type = ExerciseTypePKField()
     exercise = ExercisePKField()
 
     class Meta:
         model = ExerciseSet
-        fields = ('id', 'date_performed', 'exercise_type', 'exercise', 'reps', 'weight', 'percentage',)
+        fields = ('id', 'date_performed', 'exercise_type', 'exercise', 'reps', 'weight', 'percentage', 'planned',)
 
 
 ################################################################################
 
-class ExerciseSetNestedSerializer(serializers.HyperlinkedModelSerializer):
+class ExerciseSetNestedSerializer(PersonalRecordFlagsMixin, serializers.HyperlinkedModelSerializer):
     class Meta:
         model = ExerciseSet
-        fields = ('id', 'date_performed', 'reps', 'weight', 'percentage',)
+        fields = ('id', 'date_performed', 'reps', 'weight', 'percentage', 'planned',)
+
+
+def build_exercise_sets(exercise, exercise_sets_data):
+    return [
+        ExerciseSet(
+            user=exercise.user,
+            exercise=exercise,
+            exercise_type=exercise.exercise_type,
+            **exercise_set_data
+            )
+        for exercise_set_data in exercise_sets_data
+    ]
 
 
 class NestedExerciseSerializer(serializers.ModelSerializer):
+    exercise_type = ExerciseTypePKField()
     exercise_sets = ExerciseSetNestedSerializer(many=True)
 
+    @transaction.atomic
     def create(self, validated_data):
         exercise_sets_data = validated_data.pop('exercise_sets')
-        userr = validated_data.pop('user')
-        exercise_typee = validated_data.pop('exercise_type')
-        exercise = Exercise.objects.create(
-            user=userr,
-            exercise_type=exercise_typee,
-            **validated_data
-            )
-        assign_perm('tracker.view_exercise', userr, exercise)
-        assign_perm('tracker.add_exercise', userr, exercise)
-        assign_perm('tracker.change_exercise', userr, exercise)
-        assign_perm('tracker.delete_exercise', userr, exercise)
-        for exercise_set_data in exercise_sets_data:
-            exercise_set = ExerciseSet.objects.create(
-                user=userr,
-                exercise=exercise,
-                exercise_type=exercise_typee, 
-                **exercise_set_data
-                )
-            assign_perm('tracker.view_exerciseset', userr, exercise_set)
-            assign_perm('tracker.add_exerciseset', userr, exercise_set)
-            assign_perm('tracker.change_exerciseset', userr, exercise_set)
+        exercise = Exercise.objects.create(**validated_data)
+        exercise_sets = ExerciseSet.objects.bulk_create(build_exercise_sets(exercise, exercise_sets_data))
+        self.context['personal_records'] = record_new_sets(exercise_sets)
+        prefetch_related_objects([exercise], 'exercise_sets')
         return exercise
     
     class Meta:
@@ -152,45 +254,69 @@ class NestedExerciseSerializer(serializers.ModelSerializer):
 class NestedWorkoutSerializer(serializers.ModelSerializer):
     exercises = NestedExerciseSerializer(many=True)
 
+    # Exercises and sets are inserted with one bulk INSERT each, so the number
+    # of queries does not depend on the size of the workout.
+    @transaction.atomic
     def create(self, validated_data):
         exercises_data = validated_data.pop('exercises')
-        date_performedd = validated_data.pop('date_performed')
         userr = validated_data.pop('user')
-        workout = Workout.objects.create(
-            user=userr,
-            date_performed=date_performedd,
-            **validated_data
-            )
-        assign_perm('tracker.view_workout', userr, workout)
-        assign_perm('tracker.add_workout', userr, workout)
-        assign_perm('tracker.change_workout', userr, workout)
-        assign_perm('tracker.delete_workout', userr, workout)
+        workout = Workout.objects.create(user=userr, **validated_data)
+
+        exercises = []
+        exercise_sets_data = []
         for exercise_data in exercises_data:
-            exercise_typee = exercise_data.pop('exercise_type')
-            exercise_sets_data = exercise_data.pop('exercise_sets')
-            exercise = Exercise.objects.create(
-                user=userr,
-                workout=workout,
-                exercise_type=exercise_typee,
-                **exercise_data
-                )
-            assign_perm('tracker.view_exercise', userr, exercise)
-            assign_perm('tracker.add_exercise', userr, exercise)
-            assign_perm('tracker.change_exercise', userr, exercise)
-            assign_perm('tracker.delete_exercise', userr, exercise)
-            for exercise_set_data in exercise_sets_data:
-                exercise_set = ExerciseSet.objects.create(
-                    user=userr,
-                    exercise=exercise,
-                    exercise_type=exercise_typee,
-                    **exercise_set_data
-                    )
-                assign_perm('tracker.view_exerciseset', userr, exercise_set)
-                assign_perm('tracker.add_exerciseset', userr, exercise_set)
-                assign_perm('tracker.change_exerciseset', userr, exercise_set)
-                assign_perm('tracker.delete_exerciseset', userr, exercise_set)
+            exercise_sets_data.append(exercise_data.pop('exercise_sets'))
+            exercises.append(Exercise(user=userr, workout=workout, **exercise_data))
+        Exercise.objects.bulk_create(exercises)
+
+        exercise_sets = []
+        for exercise, sets_data in zip(exercises, exercise_sets_data):
+            exercise_sets.extend(build_exercise_sets(exercise, sets_data))
+        ExerciseSet.objects.bulk_create(exercise_sets)
+        self.context['personal_records'] = record_new_sets(exercise_sets)
+
+        prefetch_related_objects([workout], 'exercises__exercise_sets')
         return workout
 
     class Meta:
         model = Workout
-        fields = ('id', 'date_performed', 'name', 'exercises',)
\ No newline at end of file
+        fields = ('id', 'date_performed', 'name', 'exercises',)
+
+
+################################################################################
+
+class PlanExerciseSerializer(serializers.Serializer):
+    exercise_type = ExerciseTypePKField()
+    sets = serializers.IntegerField(min_value=1, max_value=20)
+    reps = serializers.IntegerField(min_value=1, max_value=100)
+    # Of the one rep max in the first week, plus ``progression`` points a week.
+    percentage = serializers.FloatField(min_value=1, max_value=150)
+    progression = serializers.FloatField(min_value=-20, max_value=20, default=0)
+
+
+class PlanDaySerializer(serializers.Serializer):
+    # Days after the start of each week.
+    day = serializers.IntegerField(min_value=0, max_value=6)
+    name = serializers.CharField(max_length=80, required=False)
+    exercises = PlanExerciseSerializer(many=True, allow_empty=False)
+
+
+class PlanTemplateSerializer(serializers.Serializer):
+    name = serializers.CharField(max_length=80, default='Plan')
+    start_date = serializers.DateField()
+    weeks = serializers.IntegerField(min_value=1, max_value=52)
+    # Loads are rounded to a multiple of this; 0 keeps them exact.
+    rounding = serializers.FloatField(min_value=0, default=2.5)
+    days = PlanDaySerializer(many=True, allow_empty=False)
+
+    def validate_days(self, days):
+        if len(days) > 7:
+            raise serializers.ValidationError('A week has at most 7 days.')
+        return days
+
+    def validate(self, data):
+        for day in data['days']:
+            for exercise in day['exercises']:
+                if exercise['percentage'] + exercise['progression'] * (data['weeks'] - 1) <= 0:
+                    raise serializers.ValidationError({'days': ['Percentages must stay above 0.']})
+        return data
@@ -0,0 +1,112 @@
+from django.apps import apps
+from django.contrib.contenttypes.models import ContentType
+from django.db import models
+from django.db.models import Exists, OuterRef, Q
+from django.db.models.functions import Cast
+from guardian.core import ObjectPermissionChecker
+from guardian.models import UserObjectPermission, GroupObjectPermission
+
+
+def parse_pk(value):
+    """
+    Returns ``value`` from parsed request data as an integer primary key, or
+    ``None`` when it cannot be one.
+    """
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str) and value.isdigit():
+        return int(value)
+    return None
+
+
+def _get_queryset(perm, klass):
+    if klass is None:
+        app_label, codename = perm.split('.', 1)
+        klass = apps.get_model(app_label, codename.split('_', 1)[1])
+    if isinstance(klass, models.QuerySet):
+        return klass
+    if isinstance(klass, models.Manager):
+        return klass.all()
+    return klass._default_manager.all()
+
+
+def _shared_object_pks(permissions, user_filter, codename, ctype, user):
+    # Owners need no share, and legacy rows for their own objects would
+    # otherwise make every owner look like they had shares.
+    owned = ctype.model_class()._base_manager.filter(pk=OuterRef('object_id'), user=user)
+    return (permissions
+            .filter(user_filter, content_type=ctype, permission__codename=codename)
+            .annotate(object_id=Cast('object_pk', models.BigIntegerField()))
+            .exclude(Exists(owned))
+            .values('object_id'))
+
+
+def has_shares(user, codename, ctype, request=None):
+    """
+    Whether an object of ``ctype`` that ``user`` does not own is shared with
+    them, or one of their groups, for ``codename``. Asked with one query, at
+    most once per ``request`` when one is given.
+    """
+    shares = getattr(request, '_tracker_shares', None)
+    if shares is None:
+        shares = {}
+        if request is not None:
+            request._tracker_shares = shares
+    key = (ctype.pk, codename)
+    if key not in shares:
+        shares[key] = (
+            _shared_object_pks(UserObjectPermission.objects, Q(user=user), codename, ctype, user)
+            .union(_shared_object_pks(GroupObjectPermission.objects, Q(group__user=user), codename, ctype, user))
+            .exists())
+    return shares[key]
+
+
+def get_objects_for_owner(user, perm, klass=None, request=None):
+    """
+    Drop-in replacement for ``guardian.shortcuts.get_objects_for_user`` for
+    models with a ``user`` FK. Returns the objects owned by ``user`` plus those
+    explicitly shared with the user or one of their groups through guardian.
+
+    ``klass`` may be a model, manager or queryset; when omitted the model is
+    derived from ``perm`` (e.g. ``tracker.view_workout``). Pass the
+    ``request`` to ask ``has_shares`` once per model for it.
+
+    Without shares the queryset is only filtered by ``user``: ORing the share
+    subqueries into it keeps the ``(user, date_performed, id)`` indexes from
+    serving the ordering, and the database sorts the whole result instead.
+    """
+    queryset = _get_queryset(perm, klass)
+
+    if user.is_superuser:
+        return queryset
+    if user.is_anonymous:
+        return queryset.none()
+
+    codename = perm.split('.', 1)[-1]
+    ctype = ContentType.objects.get_for_model(queryset.model)
+    if not has_shares(user, codename, ctype, request):
+        return queryset.filter(user=user)
+
+    shared_with_user = _shared_object_pks(
+        UserObjectPermission.objects, Q(user=user), codename, ctype, user)
+    shared_with_groups = _shared_object_pks(
+        GroupObjectPermission.objects, Q(group__user=user), codename, ctype, user)
+    return queryset.filter(
+        Q(user=user) | Q(pk__in=shared_with_user) | Q(pk__in=shared_with_groups))
+
+
+def get_permission_checker(request, objects=None):
+    """
+    Returns a guardian ``ObjectPermissionChecker`` for ``request.user`` that
+    lives as long as the request, so each object's shared permissions are
+    fetched at most once however many checks are made. ``objects`` are
+    prefetched in one query per permission table.
+    """
+    checker = getattr(request, '_tracker_permission_checker', None)
+    if checker is None:
+        checker = request._tracker_permission_checker = ObjectPermissionChecker(request.user)
+    if objects:
+        checker.prefetch_perms(objects)
+    return checker
@@ -0,0 +1,107 @@
+import base64
+import binascii
+import datetime
+import json
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+
+from workouttracker.tracker.models import UserWeight, ExerciseType, Workout, Exercise, ExerciseSet
+
+
+# Parents before children, so a client applying a delta in order never sees
+# a row before the row it references. Fields match the regular serializers.
+SYNC_MODELS = (
+    ('exercisetypes', ExerciseType, ('id', 'name')),
+    ('workouts', Workout, ('id', 'date_performed', 'name')),
+    ('exercises', Exercise, ('id', 'date_performed', 'exercise_type', 'workout')),
+    ('exercisesets', ExerciseSet, ('id', 'date_performed', 'exercise_type', 'exercise', 'reps', 'weight', 'percentage', 'planned')),
+    ('userweights', UserWeight, ('id', 'weight', 'date')),
+)
+
+
+class ResyncRequired(APIException):
+    status_code = status.HTTP_410_GONE
+    default_detail = 'The watermark is older than deleted rows are kept; sync again without one.'
+    default_code = 'full_resync'
+
+
+def encode_watermark(cursors):
+    data = {name: [updated_at.isoformat(), pk] for name, (updated_at, pk) in cursors.items()}
+    return base64.urlsafe_b64encode(json.dumps(data, separators=(',', ':')).encode('utf-8')).decode('ascii')
+
+
+def decode_watermark(watermark):
+    """
+    Returns the ``{name: (updated_at, pk)}`` cursors of a watermark issued by
+    ``encode_watermark``. An empty watermark means nothing has been synced.
+    """
+    if not watermark:
+        return {}
+    try:
+        data = json.loads(base64.urlsafe_b64decode(watermark.encode('ascii')))
+        return {
+            name: (datetime.datetime.fromisoformat(updated_at), int(pk))
+            for name, (updated_at, pk) in data.items()
+        }
+    except (binascii.Error, UnicodeError, ValueError, TypeError, AttributeError):
+        raise ValidationError({'since': ['Invalid watermark.']})
+
+
+def get_changes(user, watermark=None, limit=500):
+    """
+    Returns the rows of ``user`` created, updated or deleted since
+    ``watermark``, at most ``limit`` of them, with the watermark to send next
+    time. Each model is read in ``(updated_at, id)`` order from its own cursor,
+    so a page that stops part way through a model resumes exactly there.
+    Deleted rows are sent as ``{id, updated_at, deleted_at}``.
+
+    Writes can commit after rows with a later ``updated_at`` have been read.
+    Cursors therefore never move past ``TRACKER_SYNC_LAG_SECONDS`` ago, not
+    even part way through a model: the most recent rows are sent again next
+    time, which is harmless as clients upsert by id.
+
+    Deleted rows are purged ``TRACKER_SOFT_DELETE_RETENTION_DAYS`` after
+    their deletion, so a watermark older than that may have missed some and
+    raises ``ResyncRequired``.
+    """
+    cursors = decode_watermark(watermark)
+    retention = datetime.timedelta(days=getattr(settings, 'TRACKER_SOFT_DELETE_RETENTION_DAYS', 30))
+    if any(updated_at < timezone.now() - retention for updated_at, _ in cursors.values()):
+        raise ResyncRequired()
+    safe = (timezone.now() - datetime.timedelta(seconds=getattr(settings, 'TRACKER_SYNC_LAG_SECONDS', 5)), 0)
+    changes = {}
+    has_more = False
+
+    for name, model, fields in SYNC_MODELS:
+        queryset = model.all_objects.filter(user=user)
+        cursor = cursors.get(name)
+        if cursor is not None:
+            queryset = queryset.filter(
+                Q(updated_at__gt=cursor[0]) | Q(updated_at=cursor[0], pk__gt=cursor[1]))
+
+        remaining = limit - sum(len(rows) for rows in changes.values())
+        rows = list(queryset.order_by('updated_at', 'pk').values(*fields, 'updated_at', 'deleted_at')[:remaining + 1])
+        if len(rows) > remaining:
+            rows = rows[:remaining]
+            has_more = True
+
+        changes[name] = [
+            {'id': row['id'], 'updated_at': row['updated_at'], 'deleted_at': row['deleted_at']}
+            if row['deleted_at'] is not None else row
+            for row in rows
+        ]
+        if rows:
+            last = (rows[-1]['updated_at'], rows[-1]['id'])
+            cursor = min(last, safe if has_more else max(cursor or safe, safe))
+        if cursor is not None:
+            cursors[name] = cursor
+        if has_more:
+            break
+
+    for name, _, _ in SYNC_MODELS:
+        changes.setdefault(name, [])
+    return {'watermark': encode_watermark(cursors), 'has_more': has_more, **changes}
@@ -0,0 +1,77 @@
+import datetime
+import random
+
+from workouttracker.tracker.models import User, UserWeight, ExerciseType, Workout, Exercise, ExerciseSet
+
+
+EXERCISE_TYPE_NAMES = ('Squat', 'Bench Press', 'Deadlift', 'Overhead Press', 'Barbell Row', 'Pull Up')
+
+
+def create_synthetic_user(email, exercise_types=len(EXERCISE_TYPE_NAMES)):
+    user = User.objects.create(email=email)
+    ExerciseType.objects.bulk_create([
+        ExerciseType(user=user, name=EXERCISE_TYPE_NAMES[i % len(EXERCISE_TYPE_NAMES)])
+        for i in range(exercise_types)
+    ])
+    return user
+
+
+def seed_training_history(user, workouts, exercises_per_workout=3, sets_per_exercise=5,
+                          start_date=datetime.date(2015, 1, 1), chunk_size=500, seed=0):
+    """
+    Bulk-inserts ``workouts`` daily workouts for ``user``, each with
+    ``exercises_per_workout`` exercises of ``sets_per_exercise`` sets, plus one
+    body weight entry per workout. Rows are generated ``chunk_size`` workouts
+    at a time so memory stays bounded for large histories.
+
+    Returns the number of sets created.
+    """
+    rng = random.Random(seed)
+    exercise_types = list(ExerciseType.objects.filter(user=user))
+    if not exercise_types:
+        raise ValueError('%s has no exercise types to seed with' % user)
+
+    latest = Workout.objects.filter(user=user).order_by('-date_performed').first()
+    if latest is not None:
+        start_date = latest.date_performed + datetime.timedelta(days=1)
+
+    created_sets = 0
+    for offset in range(0, workouts, chunk_size):
+        dates = [start_date + datetime.timedelta(days=day)
+                 for day in range(offset, min(offset + chunk_size, workouts))]
+
+        workout_objs = Workout.objects.bulk_create([
+            Workout(user=user, name='Workout %s' % date.isoformat(), date_performed=date)
+            for date in dates
+        ])
+        UserWeight.objects.bulk_create([
+            UserWeight(user=user, weight=round(rng.uniform(70, 90), 1)) for _ in dates
+        ])
+
+        exercise_objs = Exercise.objects.bulk_create([
+            Exercise(
+                user=user,
+                workout=workout,
+                date_performed=workout.date_performed,
+                exercise_type=exercise_types[(i + j) % len(exercise_types)],
+            )
+            for i, workout in enumerate(workout_objs)
+            for j in range(exercises_per_workout)
+        ])
+
+        set_objs = [
+            ExerciseSet(
+                user=user,
+                exercise=exercise,
+                exercise_type=exercise.exercise_type,
+                date_performed=exercise.date_performed,
+                reps=rng.randint(1, 12),
+                weight=rng.randrange(40, 200, 5),
+            )
+            for exercise in exercise_objs
+            for _ in range(sets_per_exercise)
+        ]
+        ExerciseSet.objects.bulk_create(set_objs, batch_size=5000)
+        created_sets += len(set_objs)
+
+    return created_sets
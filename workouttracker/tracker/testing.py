@@ -0,0 +1,23 @@
+from django.db import connections
+from django.test.runner import DiscoverRunner
+
+
+# Read by the router tests; they mirror the test database.
+REPLICA_ALIASES = ('replica_0', 'replica_1')
+
+
+class TrackerTestRunner(DiscoverRunner):
+    """
+    Adds the ``REPLICA_ALIASES`` the tests ask for but the settings do not
+    configure, as test mirrors of the primary, so that deployments never
+    carry them.
+    """
+
+    def get_databases(self, suite):
+        databases = super().get_databases(suite)
+        for alias in REPLICA_ALIASES:
+            if alias in databases and alias not in connections.settings:
+                settings_dict = connections['default'].settings_dict
+                connections.settings[alias] = {
+                    **settings_dict, 'TEST': {**settings_dict['TEST'], 'MIRROR': 'default'}}
+        return databases
@@ -1,3 +1,1387 @@
-from django.test import TestCase
+import array
+import asyncio
+import datetime
+import io
+import json
+import math
+import os
+import struct
+import tempfile
+import time
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import connection, connections
+from django.core.files.uploadedfile import SimpleUploadedFile
+from asgiref.sync import async_to_sync
+from django.test import AsyncRequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.http import http_date
+from guardian.models import UserObjectPermission
+from guardian.shortcuts import assign_perm
+from rest_framework.request import Request
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+from rest_framework_simplejwt.tokens import AccessToken
+
+from workouttracker.tracker.models import User, UserWeight, ExerciseType, Workout, Exercise, ExerciseSet, OneRepMax, DailyExerciseSummary, PersonalRecord
+from workouttracker.tracker.analytics import epley, rebuild_daily_summaries
+from workouttracker.tracker.authentication import clear_user_cache
+from workouttracker.tracker.cache import get_cache
+from workouttracker.tracker.importer import HistoryImporter, read_ndjson
+from workouttracker.tracker.serializers import NestedWorkoutSerializer
+from workouttracker.tracker.shortcuts import get_objects_for_owner
+from workouttracker.tracker.testing import REPLICA_ALIASES
+from workouttracker.tracker.values import ValuesSerializer
+from workouttracker.tracker.views import IsOwner, UserWeightViewSet, WorkoutViewSet, ExerciseSetViewSet, NestedWorkoutViewSet
+from workouttracker.urls import router
+
+
+class TrackerTestMixin:
+    def setUp(self):
+        get_cache().clear()
+        self.user = User.objects.create(email='lifter@example.com')
+        self.other = User.objects.create(email='other@example.com')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.squat = ExerciseType.objects.create(user=self.user, name='Squat')
+        self.bench = ExerciseType.objects.create(user=self.user, name='Bench Press')
+
+    def create_workout(self, user=None, date=datetime.date(2022, 6, 1), exercises=2, sets=3):
+        user = user or self.user
+        workout = Workout.objects.create(user=user, name='Workout', date_performed=date)
+        for exercise_type in (self.squat, self.bench)[:exercises]:
+            exercise = Exercise.objects.create(
+                user=user, workout=workout, exercise_type=exercise_type, date_performed=date)
+            for i in range(sets):
+                ExerciseSet.objects.create(
+                    user=user, exercise=exercise, exercise_type=exercise_type,
+                    date_performed=date, reps=5, weight=100 + i * 5)
+        return workout
+
+
+class TrackerTestCase(TrackerTestMixin, TestCase):
+    pass
+
+
+class OwnershipPermissionTests(TrackerTestCase):
+    def test_owner_has_object_permissions_without_guardian_rows(self):
+        workout = self.create_workout()
+
+        self.assertTrue(self.user.has_perm('tracker.change_workout', workout))
+        self.assertFalse(self.other.has_perm('tracker.view_workout', workout))
+        self.assertFalse(UserObjectPermission.objects.exists())
+
+    def test_objects_for_owner_includes_explicit_shares(self):
+        own = self.create_workout()
+        shared = self.create_workout(user=self.other)
+        self.create_workout(user=self.other)
+        assign_perm('tracker.view_workout', self.user, shared)
+
+        workouts = get_objects_for_owner(self.user, 'tracker.view_workout')
+
+        self.assertEqual(set(workouts), {own, shared})
+
+    def test_objects_for_owner_without_shares_only_filter_by_user(self):
+        shared = self.create_workout(user=self.other)
+        assign_perm('tracker.view_exercise', self.user, shared.exercises.first())
+        # Rows left on owned objects from before ownership checks are not shares.
+        assign_perm('tracker.view_workout', self.user, self.create_workout())
+
+        workouts = get_objects_for_owner(self.user, 'tracker.view_workout').order_by('date_performed', 'id')
+
+        where = str(workouts.query).split(' WHERE ', 1)[1]
+        self.assertNotIn(' OR ', where)
+        self.assertNotIn('objectpermission', where)
+
+    def test_create_writes_no_permission_rows(self):
+        response = self.client.post('/workouts/', {'name': 'Legs', 'date_performed': '2022-06-01'})
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Workout.objects.get().user, self.user)
+        self.assertFalse(UserObjectPermission.objects.exists())
+
+    def test_owner_detail_and_update_make_no_per_object_permission_queries(self):
+        exercise_set = self.create_workout().exercises.first().exercise_sets.first()
+        ContentType.objects.get_for_models(ExerciseSet)
+
+        # The user's shares are read once per request, then nothing per object.
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/exercisesets/%s/' % exercise_set.pk)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(queries), 2)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch('/exercisesets/%s/' % exercise_set.pk, {'reps': 6})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len([q for q in queries if 'objectpermission' in q['sql']]), 1)
+        tables = {q['sql'].split(' FROM ', 1)[1].split()[0] for q in queries if ' FROM ' in q['sql']}
+        self.assertNotIn('"tracker_user"', tables)
+
+    def test_shared_objects_need_the_permission_for_the_method(self):
+        shared = self.create_workout(user=self.other)
+        assign_perm('tracker.view_workout', self.user, shared)
+
+        self.assertEqual(self.client.get('/workouts/%s/' % shared.pk).status_code, 200)
+        self.assertEqual(self.client.patch('/workouts/%s/' % shared.pk, {'name': 'Mine'}).status_code, 403)
+        self.assertEqual(self.client.delete('/workouts/%s/' % shared.pk).status_code, 403)
+
+        assign_perm('tracker.change_workout', self.user, shared)
+        self.assertEqual(self.client.patch('/workouts/%s/' % shared.pk, {'name': 'Mine'}).status_code, 200)
+
+    def test_permission_checker_is_shared_across_checks(self):
+        shared = self.create_workout(user=self.other)
+        assign_perm('tracker.view_workout', self.user, shared)
+        request = Request(APIRequestFactory().get('/workouts/%s/' % shared.pk))
+        request.user = self.user
+        ContentType.objects.get_for_models(Workout)
+
+        with CaptureQueriesContext(connection) as queries:
+            IsOwner().has_object_permission(request, None, shared)
+        with self.assertNumQueries(0):
+            self.assertTrue(IsOwner().has_object_permission(request, None, shared))
+        self.assertTrue(queries)
+
+    def test_prune_owner_permissions_keeps_shares(self):
+        own = self.create_workout()
+        for perm in ('view', 'add', 'change', 'delete'):
+            assign_perm('tracker.%s_workout' % perm, self.user, own)
+        assign_perm('tracker.view_workout', self.other, own)
+
+        call_command('prune_owner_permissions', stdout=io.StringIO())
+
+        self.assertEqual(
+            list(UserObjectPermission.objects.values_list('user', flat=True)), [self.other.pk])
+
+
+class NestedWorkoutCreateTests(TrackerTestCase):
+    def post_workout(self, sets, exercise_types=None):
+        payload = {
+            'name': 'Heavy day',
+            'date_performed': '2022-06-01',
+            'exercises': [
+                {
+                    'date_performed': '2022-06-01',
+                    'exercise_type': exercise_type.pk,
+                    'exercise_sets': [
+                        {'date_performed': '2022-06-01', 'reps': 5, 'weight': 100 + i}
+                        for i in range(sets)
+                    ],
+                }
+                for exercise_type in exercise_types or (self.squat, self.bench)
+            ],
+        }
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/workoutsnested/', payload, format='json')
+        return response, len(queries)
+
+    def test_creates_nested_rows(self):
+        response, _ = self.post_workout(sets=3)
+        self.assertEqual(response.status_code, 201, response.data)
+
+        workout = Workout.objects.get(pk=response.data['id'])
+        self.assertEqual(workout.exercises.count(), 2)
+        self.assertEqual(ExerciseSet.objects.filter(exercise__workout=workout, user=self.user).count(), 6)
+        self.assertEqual(len(response.data['exercises'][0]['exercise_sets']), 3)
+
+    def test_query_count_does_not_grow_with_sets(self):
+        _, small = self.post_workout(sets=1)
+        _, large = self.post_workout(sets=20)
+
+        self.assertEqual(small, large)
+        self.assertLessEqual(large, 20)
+
+    def test_query_count_does_not_grow_with_exercises(self):
+        _, small = self.post_workout(sets=5, exercise_types=[self.squat])
+        _, large = self.post_workout(sets=5, exercise_types=[self.squat, self.bench] * 5)
+
+        self.assertEqual(small, large)
+
+    def test_rejects_exercise_types_of_other_users(self):
+        theirs = ExerciseType.objects.create(user=self.other, name='Squat')
+
+        response, _ = self.post_workout(sets=1, exercise_types=[self.squat, theirs])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('exercise_type', response.data['exercises'][1])
+        self.assertFalse(Workout.objects.exists())
+
+
+class NestedListQueryTests(TrackerTestCase):
+    def setUp(self):
+        super().setUp()
+        # Content types are cached per process; load them outside the measurement.
+        ContentType.objects.get_for_models(Workout, Exercise, ExerciseSet)
+
+    def count_list_queries(self, url):
+        get_cache().clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_workouts_nested_query_count_is_fixed(self):
+        self.create_workout(exercises=1, sets=1)
+        _, small = self.count_list_queries('/workoutsnested/')
+
+        for day in range(2, 6):
+            self.create_workout(date=datetime.date(2022, 6, day), exercises=2, sets=5)
+        response, large = self.count_list_queries('/workoutsnested/')
+
+        self.assertEqual(len(response.data['results']), 5)
+        self.assertEqual(small, large)
+        self.assertEqual(large, 6)
+
+    def test_exercises_nested_query_count_is_fixed(self):
+        self.create_workout(exercises=1, sets=1)
+        _, small = self.count_list_queries('/exercisesnested/')
+
+        for day in range(2, 6):
+            self.create_workout(date=datetime.date(2022, 6, day), exercises=2, sets=5)
+        _, large = self.count_list_queries('/exercisesnested/')
+
+        self.assertEqual(small, large)
+        self.assertEqual(large, 4)
+
+    def test_nested_prefetch_hides_other_users_sets(self):
+        workout = self.create_workout(exercises=1, sets=2)
+        ExerciseSet.objects.create(
+            user=self.other, exercise=workout.exercises.get(), exercise_type=self.squat,
+            date_performed=workout.date_performed, reps=1, weight=1)
+
+        response = self.client.get('/workoutsnested/')
+
+        self.assertEqual(len(response.data['results'][0]['exercises'][0]['exercise_sets']), 2)
+
+
+class PaginationTests(TrackerTestCase):
+    def setUp(self):
+        super().setUp()
+        for day in range(1, 11):
+            self.create_workout(date=datetime.date(2022, 6, day), exercises=1, sets=2)
+
+    def collect_pages(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+        return ids
+
+    def test_cursor_pages_follow_date_then_id(self):
+        ids = self.collect_pages('/exercisesets/?page_size=3')
+
+        expected = ExerciseSet.objects.order_by('date_performed', 'id').values_list('id', flat=True)
+        self.assertEqual(ids, list(expected))
+
+    def test_cursor_pages_respect_date_filters(self):
+        ids = self.collect_pages('/workoutsnested/?page_size=2&start_date=2022-06-03&end_date=2022-06-07')
+
+        expected = Workout.objects.filter(
+            date_performed__range=('2022-06-03', '2022-06-07')).order_by('date_performed', 'id')
+        self.assertEqual(ids, [workout.id for workout in expected])
+
+    def test_limit_offset_is_opt_in(self):
+        response = self.client.get('/workouts/?limit=3&offset=3')
+
+        self.assertEqual(response.data['count'], 10)
+        self.assertEqual(
+            [item['date_performed'] for item in response.data['results']],
+            ['2022-06-04', '2022-06-05', '2022-06-06'])
+
+
+class ProgressTests(TrackerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.workout = self.create_workout(exercises=1, sets=0)
+        self.exercise = self.workout.exercises.get()
+
+    def post_set(self, date, reps, weight):
+        response = self.client.post('/exercisesets/', {
+            'date_performed': date, 'exercise_type': self.squat.pk, 'exercise': self.exercise.pk,
+            'reps': reps, 'weight': weight,
+        })
+        self.assertEqual(response.status_code, 201, response.data)
+        return response.data['id']
+
+    def test_sets_maintain_daily_summary_and_one_rep_max(self):
+        self.post_set('2022-06-01', 5, 100)
+        self.post_set('2022-06-01', 1, 110)
+
+        summary = DailyExerciseSummary.objects.get(exercise_type=self.squat)
+        self.assertEqual((summary.best_reps, summary.best_weight), (5, 100))
+        self.assertAlmostEqual(summary.estimated_1rm, 100 * (1 + 5 / 30))
+        self.assertAlmostEqual(summary.estimated_1rm_brzycki, 100 * 36 / 32)
+        self.assertEqual(summary.volume, 610)
+        self.assertAlmostEqual(OneRepMax.objects.get(exercise_type=self.squat).weight, summary.estimated_1rm)
+
+    def test_update_and_delete_refresh_summaries(self):
+        first = self.post_set('2022-06-01', 5, 100)
+        second = self.post_set('2022-06-02', 3, 100)
+
+        self.client.patch('/exercisesets/%s/' % first, {'date_performed': '2022-06-02'})
+        self.assertEqual(
+            list(DailyExerciseSummary.objects.values_list('date_performed', 'volume')),
+            [(datetime.date(2022, 6, 2), 800)])
+
+        self.client.delete('/exercisesets/%s/' % second)
+        self.client.delete('/exercisesets/%s/' % first)
+        self.assertFalse(DailyExerciseSummary.objects.exists())
+        self.assertFalse(OneRepMax.objects.exists())
+
+    def test_summary_writers_lock_the_exercise_type_first(self):
+        first = self.post_set('2022-06-01', 5, 100)
+        writes = (
+            ('post', '/exercisesets/', {
+                'date_performed': '2022-06-01', 'exercise_type': self.squat.pk, 'exercise': self.exercise.pk,
+                'reps': 3, 'weight': 100}),
+            ('patch', '/exercisesets/%s/' % first, {'reps': 4}),
+            ('delete', '/exercisesets/%s/' % first, None),
+        )
+
+        for method, url, data in writes:
+            with CaptureQueriesContext(connection) as queries:
+                getattr(self.client, method)(url, data)
+            sql = [q['sql'] for q in queries]
+            lock = next(i for i, q in enumerate(sql) if q.startswith('SELECT "exercise_type"."id" FROM "exercise_type"'))
+            delete = next(i for i, q in enumerate(sql) if q.startswith('DELETE FROM "daily_exercise_summary"'))
+            self.assertLess(lock, delete, method)
+
+    def test_progress_endpoint_groups_by_day_and_week(self):
+        self.post_set('2022-06-06', 5, 100)
+        self.post_set('2022-06-08', 5, 120)
+        self.post_set('2022-06-13', 5, 110)
+
+        daily = self.client.get('/exercisetypes/%s/progress/' % self.squat.pk)
+        weekly = self.client.get('/exercisetypes/%s/progress/?period=week' % self.squat.pk)
+        ranged = self.client.get('/exercisetypes/%s/progress/?start_date=2022-06-07' % self.squat.pk)
+
+        self.assertEqual([row['date'] for row in daily.data], ['2022-06-06', '2022-06-08', '2022-06-13'])
+        self.assertEqual(
+            [(row['date'], row['best_weight'], row['volume']) for row in weekly.data],
+            [('2022-06-06', 120, 1100), ('2022-06-13', 110, 550)])
+        self.assertEqual(len(ranged.data), 2)
+        self.assertEqual(
+            self.client.get('/exercisetypes/%s/progress/?period=month' % self.squat.pk).status_code, 400)
+
+    def test_nested_create_and_delete_maintain_summaries(self):
+        response = self.client.post('/workoutsnested/', {
+            'name': 'Legs', 'date_performed': '2022-07-01',
+            'exercises': [{
+                'date_performed': '2022-07-01', 'exercise_type': self.bench.pk,
+                'exercise_sets': [{'date_performed': '2022-07-01', 'reps': 10, 'weight': 60}] * 2,
+            }],
+        }, format='json')
+
+        self.assertEqual(DailyExerciseSummary.objects.get(exercise_type=self.bench).volume, 1200)
+
+        self.client.delete('/workoutsnested/%s/' % response.data['id'])
+        self.assertFalse(DailyExerciseSummary.objects.filter(exercise_type=self.bench).exists())
+
+
+class PersonalRecordTests(TrackerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.workout = self.create_workout(exercises=1, sets=0)
+        self.exercise = self.workout.exercises.get()
+
+    def post_set(self, date, reps, weight):
+        response = self.client.post('/exercisesets/', {
+            'date_performed': date, 'exercise_type': self.squat.pk, 'exercise': self.exercise.pk,
+            'reps': reps, 'weight': weight,
+        })
+        self.assertEqual(response.status_code, 201, response.data)
+        return response.data
+
+    def records(self):
+        return {
+            (record['kind'], record['reps']): record['value']
+            for record in self.client.get('/exercisetypes/%s/records/' % self.squat.pk).data
+        }
+
+    def test_create_flags_new_records(self):
+        self.assertEqual(self.post_set('2022-06-01', 5, 100)['personal_records'], ['weight', 'estimated_1rm', 'volume'])
+        self.assertEqual(self.post_set('2022-06-01', 5, 95)['personal_records'], ['volume'])
+        self.assertEqual(self.post_set('2022-06-02', 5, 100)['personal_records'], [])
+        self.assertEqual(self.post_set('2022-06-02', 3, 105)['personal_records'], ['weight'])
+
+        self.assertEqual(self.records(), {
+            ('estimated_1rm', 0): 100 * (1 + 5 / 30), ('volume', 0): 975, ('weight', 3): 105, ('weight', 5): 100,
+        })
+        self.assertNotIn('personal_records', self.client.get('/exercisesets/').data['results'][0])
+
+    def test_create_cost_does_not_grow_with_history(self):
+        self.post_set('2022-06-01', 5, 100)
+        ContentType.objects.get_for_models(ExerciseType, Exercise, ExerciseSet)
+        with CaptureQueriesContext(connection) as queries:
+            self.post_set('2022-06-02', 5, 100)
+        short_history = len(queries)
+        for day in range(3, 23):
+            self.post_set('2022-06-%02d' % day, 5, 100 + day)
+
+        with self.assertNumQueries(short_history):
+            self.post_set('2022-06-23', 5, 90)
+
+    def test_edit_and_delete_rebuild_records(self):
+        first = self.post_set('2022-06-01', 5, 100)['id']
+        second = self.post_set('2022-06-02', 5, 110)['id']
+
+        self.client.delete('/exercisesets/%s/' % second)
+        record = PersonalRecord.objects.get(kind=PersonalRecord.WEIGHT, reps=5)
+        self.assertEqual((record.value, record.exercise_set_id), (100, first))
+
+        self.client.patch('/exercisesets/%s/' % first, {'weight': 90})
+        self.assertEqual(self.records()[('weight', 5)], 90)
+
+        self.client.delete('/exercisesets/%s/' % first)
+        self.assertEqual(self.records(), {})
+
+    def test_edits_that_keep_records_do_not_rebuild_them(self):
+        for day in range(1, 21):
+            self.post_set('2022-06-%02d' % day, 5, 100 + day)
+        kept = self.post_set('2022-06-21', 5, 90)['id']
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.patch('/exercisesets/%s/' % kept, {'weight': 95})
+        self.assertFalse([q for q in queries if 'ORDER BY "exercise_set"."date_performed"' in q['sql']])
+
+        self.client.patch('/exercisesets/%s/' % kept, {'reps': 3, 'weight': 130})
+        self.client.delete('/exercisesets/%s/' % self.post_set('2022-06-22', 5, 50)['id'])
+        fields = ('exercise_type', 'kind', 'reps', 'value', 'date_performed', 'exercise_set')
+        incremental = set(PersonalRecord.objects.values_list(*fields))
+        self.assertIn((self.squat.pk, 'weight', 3, 130, datetime.date(2022, 6, 21), kept), incremental)
+
+        call_command('rebuild_personal_records', stdout=io.StringIO())
+        self.assertEqual(set(PersonalRecord.objects.values_list(*fields)), incremental)
+
+    def test_nested_create_flags_sets(self):
+        response = self.client.post('/workoutsnested/', {
+            'name': 'Legs', 'date_performed': '2022-07-01',
+            'exercises': [{
+                'date_performed': '2022-07-01', 'exercise_type': self.squat.pk,
+                'exercise_sets': [
+                    {'date_performed': '2022-07-01', 'reps': 5, 'weight': 100},
+                    {'date_performed': '2022-07-01', 'reps': 5, 'weight': 90},
+                ],
+            }],
+        }, format='json')
+
+        exercise_sets = response.data['exercises'][0]['exercise_sets']
+        self.assertEqual(
+            [s['personal_records'] for s in exercise_sets], [['weight', 'estimated_1rm'], ['volume']])
+        retrieved = self.client.get('/workoutsnested/%s/' % response.data['id'])
+        self.assertNotIn('personal_records', retrieved.data['exercises'][0]['exercise_sets'][0])
+
+    def test_rebuild_command_matches_incremental_records(self):
+        for day, reps, weight in ((1, 5, 100), (1, 3, 110), (2, 5, 105), (3, 8, 80), (3, 8, 80)):
+            self.post_set('2022-06-%02d' % day, reps, weight)
+        fields = ('exercise_type', 'kind', 'reps', 'value', 'date_performed', 'exercise_set')
+        incremental = set(PersonalRecord.objects.values_list(*fields))
+
+        PersonalRecord.objects.all().delete()
+        call_command('rebuild_personal_records', stdout=io.StringIO())
+
+        self.assertEqual(set(PersonalRecord.objects.values_list(*fields)), incremental)
+
+
+class DailyVolumeTests(TrackerTestCase):
+    def setUp(self):
+        super().setUp()
+        for day in (1, 2, 3):
+            self.create_workout(date=datetime.date(2022, 6, day), exercises=2, sets=3)
+        rebuild_daily_summaries(self.user)
+
+    def test_rebuild_aggregates_per_type_and_day(self):
+        summary = DailyExerciseSummary.objects.get(exercise_type=self.squat, date_performed='2022-06-02')
+
+        self.assertEqual((summary.set_count, summary.total_reps, summary.volume), (3, 15, 1575))
+        self.assertEqual(DailyExerciseSummary.objects.count(), 6)
+        self.assertEqual(OneRepMax.objects.count(), 2)
+
+    def test_rebuild_command_replaces_stale_rows(self):
+        ExerciseSet.objects.filter(date_performed='2022-06-03').delete()
+
+        call_command('rebuild_daily_summaries', stdout=io.StringIO())
+
+        self.assertEqual(DailyExerciseSummary.objects.count(), 4)
+
+    def test_endpoint_filters_by_date_and_type(self):
+        response = self.client.get(
+            '/dailyvolume/?start_date=2022-06-02&end_date=2022-06-03&exercise_type=%s' % self.bench.pk)
+
+        self.assertEqual(
+            [(row['date_performed'], row['set_count'], row['volume']) for row in response.data['results']],
+            [('2022-06-02', 3, 1575), ('2022-06-03', 3, 1575)])
+
+    def test_endpoint_only_returns_own_rows(self):
+        other_type = ExerciseType.objects.create(user=self.other, name='Squat')
+        DailyExerciseSummary.objects.create(
+            user=self.other, exercise_type=other_type, date_performed='2022-06-01',
+            best_weight=1, best_reps=1, estimated_1rm=1, volume=1)
+
+        response = self.client.get('/dailyvolume/')
+
+        self.assertEqual(len(response.data['results']), 6)
+
+
+@override_settings(TRACKER_RESPONSE_CACHE=True)
+class ResponseCacheTests(TrackerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.create_workout()
+
+    @override_settings(TRACKER_RESPONSE_CACHE=False)
+    def test_lists_are_not_cached_without_a_shared_cache(self):
+        first = self.client.get('/workouts/')
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.get('/workouts/', HTTP_IF_NONE_MATCH='*')
+
+        self.assertTrue(queries)
+        self.assertEqual(second.status_code, 200)
+        self.assertNotIn('ETag', second)
+
+    def test_repeated_list_is_served_from_cache(self):
+        first = self.client.get('/workouts/')
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.get('/workouts/')
+
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(first['ETag'], second['ETag'])
+
+    def test_query_params_are_normalized_into_the_key(self):
+        first = self.client.get('/workoutsnested/?end_date=2022-07-01&start_date=2022-01-01')
+        second = self.client.get('/workoutsnested/?start_date=2022-01-01&end_date=2022-07-01')
+        other = self.client.get('/workoutsnested/?start_date=2022-06-02')
+
+        self.assertEqual(first['ETag'], second['ETag'])
+        self.assertNotEqual(first['ETag'], other['ETag'])
+        self.assertEqual(len(other.data['results']), 0)
+
+    def test_writes_invalidate_dependent_lists(self):
+        self.client.get('/workouts/')
+        before = self.client.get('/workoutsnested/')
+
+        self.client.post('/workouts/', {'name': 'Arms', 'date_performed': '2022-06-02'})
+        exercise = Exercise.objects.first()
+        self.client.post('/exercisesets/', {
+            'date_performed': '2022-06-01', 'exercise_type': self.squat.pk, 'exercise': exercise.pk,
+            'reps': 1, 'weight': 200,
+        })
+
+        self.assertEqual(len(self.client.get('/workouts/').data['results']), 2)
+        after = self.client.get('/workoutsnested/')
+        self.assertNotEqual(before['ETag'], after['ETag'])
+        self.assertEqual(len(after.data['results'][0]['exercises'][0]['exercise_sets']), 4)
+
+    def test_other_users_writes_do_not_invalidate(self):
+        etag = self.client.get('/exercisetypes/')['ETag']
+
+        other_client = APIClient()
+        other_client.force_authenticate(self.other)
+        other_client.post('/exercisetypes/', {'name': 'Curl'})
+
+        self.assertEqual(self.client.get('/exercisetypes/')['ETag'], etag)
+
+    def test_conditional_requests_get_not_modified(self):
+        response = self.client.get('/workouts/')
+
+        self.assertEqual(self.client.get('/workouts/', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.assertEqual(self.client.get('/workouts/', HTTP_IF_NONE_MATCH='"stale"').status_code, 200)
+
+    def test_writes_within_the_same_second_are_not_reported_unmodified(self):
+        response = self.client.get('/workouts/')
+        self.assertNotIn('Last-Modified', response)
+
+        self.client.post('/workouts/', {'name': 'Arms', 'date_performed': '2022-06-02'})
+
+        self.assertEqual(self.client.get('/workouts/', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+        self.assertEqual(
+            self.client.get('/workouts/', HTTP_IF_MODIFIED_SINCE=http_date(time.time() + 60)).status_code, 200)
+
+
+class BulkWriteTests(TrackerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.workout = self.create_workout(exercises=1, sets=0)
+        self.exercise = self.workout.exercises.get()
+
+    def set_payload(self, count, **overrides):
+        return [
+            dict({'date_performed': '2022-06-01', 'exercise_type': self.squat.pk,
+                  'exercise': self.exercise.pk, 'reps': 5, 'weight': 100 + i}, **overrides)
+            for i in range(count)
+        ]
+
+    def bulk(self, method, payload, url='/exercisesets/bulk/'):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, payload, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data['results'], len(queries)
+
+    def test_bulk_create_uses_constant_queries(self):
+        _, small = self.bulk('post', self.set_payload(2))
+        results, large = self.bulk('post', self.set_payload(30))
+
+        self.assertEqual(small, large)
+        self.assertEqual([result['status'] for result in results], [201] * 30)
+        self.assertEqual(ExerciseSet.objects.filter(user=self.user).count(), 32)
+        self.assertEqual(DailyExerciseSummary.objects.get().set_count, 32)
+
+    def test_bulk_create_reports_per_item_errors(self):
+        other_type = ExerciseType.objects.create(user=self.other, name='Theirs')
+        payload = self.set_payload(3)
+        payload[1]['exercise_type'] = other_type.pk
+        payload[2]['reps'] = 'many'
+
+        results, _ = self.bulk('post', payload)
+
+        self.assertEqual([result['status'] for result in results], [201, 400, 400])
+        self.assertIn('exercise_type', results[1]['errors'])
+        self.assertIn('reps', results[2]['errors'])
+        self.assertEqual(ExerciseSet.objects.count(), 1)
+
+    def test_bulk_update_and_delete(self):
+        created, _ = self.bulk('post', self.set_payload(3))
+        ids = [result['data']['id'] for result in created]
+
+        updated, _ = self.bulk('patch', [
+            {'id': ids[0], 'reps': 8}, {'id': ids[1], 'date_performed': '2022-06-02'}, {'id': 0, 'reps': 1},
+        ])
+        self.assertEqual([result['status'] for result in updated], [200, 200, 404])
+        self.assertEqual(ExerciseSet.objects.get(pk=ids[0]).reps, 8)
+        self.assertEqual(DailyExerciseSummary.objects.count(), 2)
+
+        deleted, _ = self.bulk('delete', [ids[0], ids[1], 0])
+        self.assertEqual([result['status'] for result in deleted], [204, 204, 404])
+        self.assertEqual(list(ExerciseSet.objects.values_list('pk', flat=True)), [ids[2]])
+        self.assertEqual(DailyExerciseSummary.objects.get().set_count, 1)
+
+    def test_bulk_update_writes_only_the_fields_each_item_sent(self):
+        created, _ = self.bulk('post', self.set_payload(2))
+        ids = [result['data']['id'] for result in created]
+
+        with CaptureQueriesContext(connection) as queries:
+            updated, _ = self.bulk('patch', [{'id': ids[0], 'reps': 8}, {'id': ids[1], 'weight': 50}])
+
+        self.assertEqual([result['status'] for result in updated], [200, 200])
+        self.assertEqual(list(ExerciseSet.objects.order_by('pk').values_list('reps', 'weight')), [(8, 100), (5, 50)])
+        updates = [query['sql'] for query in queries if query['sql'].startswith('UPDATE "exercise_set"')]
+        self.assertEqual(len(updates), 2)
+        for sql in updates:
+            self.assertFalse('"reps" =' in sql and '"weight" =' in sql, sql)
+
+    def test_bulk_exercises(self):
+        payload = [
+            {'date_performed': '2022-06-01', 'exercise_type': self.bench.pk, 'workout': self.workout.pk},
+            {'date_performed': '2022-06-01', 'exercise_type': self.bench.pk, 'workout': 0},
+        ]
+
+        results, _ = self.bulk('post', payload, url='/exercises/bulk/')
+        self.assertEqual([result['status'] for result in results], [201, 400])
+
+        self.bulk('post', self.set_payload(2))
+        results, _ = self.bulk('delete', [self.exercise.pk], url='/exercises/bulk/')
+        self.assertEqual(results[0]['status'], 204)
+        self.assertFalse(ExerciseSet.objects.exists())
+        self.assertFalse(DailyExerciseSummary.objects.exists())
+
+    def test_bulk_writes_at_the_limit_on_distinct_days(self):
+        start = datetime.date(2020, 1, 1)
+        count = ExerciseSetViewSet.bulk_max_items
+        payload = self.set_payload(count)
+        for i, item in enumerate(payload):
+            item['date_performed'] = str(start + datetime.timedelta(days=i))
+
+        created, _ = self.bulk('post', payload)
+        self.assertEqual({result['status'] for result in created}, {201})
+        self.assertEqual(DailyExerciseSummary.objects.count(), count)
+
+        ids = [result['data']['id'] for result in created]
+        updated, _ = self.bulk('patch', [{'id': pk, 'reps': 3} for pk in ids])
+        self.assertEqual({result['status'] for result in updated}, {200})
+        self.assertEqual(set(DailyExerciseSummary.objects.values_list('best_reps', flat=True)), {3})
+
+        deleted, _ = self.bulk('delete', ids)
+        self.assertEqual({result['status'] for result in deleted}, {204})
+        self.assertFalse(DailyExerciseSummary.objects.exists())
+
+    def test_bulk_rejects_non_lists(self):
+        response = self.client.post('/exercisesets/bulk/', {'reps': 1}, format='json')
+
+        self.assertEqual(response.status_code, 400)
+
+
+class ExportTests(TrackerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.create_workout(date=datetime.date(2022, 6, 1), exercises=2, sets=2)
+        self.create_workout(date=datetime.date(2022, 6, 2), exercises=1, sets=1)
+        self.create_workout(user=self.other)
+
+    def export(self, url):
+        response = self.client.get(url, HTTP_ACCEPT='text/csv, application/x-ndjson')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode('utf-8')
+
+    def test_csv_export(self):
+        lines = self.export('/export/csv/').splitlines()
+
+        self.assertEqual(lines[0], 'workout_id,workout_name,workout_date,exercise_id,exercise_type,'
+                                   'set_id,date_performed,reps,weight,percentage')
+        self.assertEqual(len(lines), 6)
+        self.assertTrue(lines[1].endswith(',Squat,1,2022-06-01,5,100.0,'))
+
+    def test_ndjson_export_honors_date_filters(self):
+        lines = self.export('/export/ndjson/?start_date=2022-06-02').splitlines()
+
+        self.assertEqual(len(lines), 1)
+        self.assertEqual(json.loads(lines[0])['workout_date'], '2022-06-02')
+
+    def test_unknown_format(self):
+        self.assertEqual(self.client.get('/export/xml/').status_code, 404)
+
+
+class ImportTests(TrackerTestCase):
+    CSV = (
+        'workout_id,workout_name,workout_date,exercise_id,exercise_type,set_id,date_performed,reps,weight,percentage\n'
+        '1,Legs,2022-06-01,10,Squat,100,2022-06-01,5,100,\n'
+        '1,Legs,2022-06-01,10,Squat,101,2022-06-01,5,105,80\n'
+        '1,Legs,2022-06-01,11,Lunge,102,2022-06-01,10,40,\n'
+        '2,Push,2022-06-03,12,Bench Press,103,2022-06-03,8,not-a-weight,\n'
+        '2,Push,2022-06-03,12,Bench Press,104,2022-06-03,8,70,\n'
+    )
+
+    def upload(self, content, import_format='csv', query=''):
+        upload = SimpleUploadedFile('history.' + import_format, content.encode('utf-8'))
+        return self.client.post('/import/%s/%s' % (import_format, query), {'file': upload}, format='multipart')
+
+    def test_csv_import_groups_rows_and_reuses_exercise_types(self):
+        response = self.upload(self.CSV)
+
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(
+            {key: response.data[key] for key in ('rows', 'exercise_types', 'workouts', 'exercises', 'sets')},
+            {'rows': 5, 'exercise_types': 1, 'workouts': 2, 'exercises': 3, 'sets': 4})
+        self.assertEqual(response.data['errors'], [{'line': 5, 'error': 'weight: "not-a-weight" is not a number'}])
+        self.assertEqual(ExerciseSet.objects.filter(exercise_type=self.squat).count(), 2)
+        self.assertEqual(ExerciseSet.objects.get(weight=105).percentage, 80)
+        self.assertEqual(DailyExerciseSummary.objects.filter(user=self.user).count(), 3)
+
+    def test_import_refreshes_only_the_days_it_touched(self):
+        self.create_workout(date=datetime.date(2022, 5, 1), exercises=1, sets=1)
+        rebuild_daily_summaries(self.user)
+        DailyExerciseSummary.objects.filter(user=self.user).update(volume=1)
+
+        self.upload(self.CSV)
+
+        self.assertEqual(DailyExerciseSummary.objects.get(date_performed=datetime.date(2022, 5, 1)).volume, 1)
+        self.assertEqual(
+            DailyExerciseSummary.objects.get(exercise_type=self.squat, date_performed=datetime.date(2022, 6, 1)).volume,
+            1025)
+        record = PersonalRecord.objects.get(exercise_type=self.squat, kind=PersonalRecord.WEIGHT, reps=5)
+        self.assertEqual((record.value, record.exercise_set), (105, ExerciseSet.objects.get(weight=105)))
+        self.assertEqual(OneRepMax.objects.get(exercise_type=self.squat).weight, epley(105, 5))
+
+    def test_dry_run_writes_nothing(self):
+        response = self.upload(self.CSV, query='?dry_run=1')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['sets'], 4)
+        self.assertFalse(Workout.objects.exists())
+        self.assertEqual(ExerciseType.objects.count(), 2)
+
+    def test_export_round_trips_through_ndjson_import(self):
+        self.create_workout(date=datetime.date(2022, 6, 1), exercises=2, sets=3)
+        exported = b''.join(self.client.get('/export/ndjson/').streaming_content).decode('utf-8')
+
+        importer = HistoryImporter(self.other, batch_size=2)
+        stats = importer.run(read_ndjson(io.StringIO(exported)))
+
+        self.assertEqual((stats['workouts'], stats['exercises'], stats['sets']), (1, 2, 6))
+        self.assertEqual(
+            sorted(ExerciseSet.objects.filter(user=self.other).values_list('reps', 'weight')),
+            sorted(ExerciseSet.objects.filter(user=self.user).values_list('reps', 'weight')))
+
+    def test_management_command(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as fileobj:
+            fileobj.write(self.CSV)
+        self.addCleanup(os.remove, fileobj.name)
+
+        out = io.StringIO()
+        call_command('import_history', self.user.email, fileobj.name, stdout=out, stderr=io.StringIO())
+
+        self.assertIn('Imported 1 exercise types, 2 workouts, 3 exercises and 4 sets', out.getvalue())
+
+
+class ProfilingTests(TrackerTestCase):
+    def test_unsampled_requests_have_no_server_timing(self):
+        response = self.client.get('/workouts/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Server-Timing', response)
+
+    @override_settings(TRACKER_PROFILE_SAMPLE_RATE=1, TRACKER_PROFILE_SLOW_QUERY_MS=0)
+    def test_sampled_request_reports_timings_and_queries(self):
+        self.create_workout()
+
+        with self.assertLogs('workouttracker.tracker.profiling', 'INFO') as logs, \
+                CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/workoutsnested/')
+
+        self.assertEqual(response.status_code, 200)
+        timings = [entry.split(';')[0] for entry in response['Server-Timing'].split(', ')]
+        self.assertEqual(timings, ['total', 'db', 'auth', 'perm', 'serialize', 'render'])
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertIn('desc="%s queries"' % len(queries), response['Server-Timing'])
+
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual(line['view'], 'workoutsnested-list')
+        self.assertEqual(line['user'], self.user.pk)
+        self.assertEqual(line['queries'], len(queries))
+        self.assertEqual(len(line['slow_queries']), min(len(queries), 5))
+
+
+class SoftDeleteTests(TrackerTestCase):
+    def test_deleting_a_workout_marks_its_rows_with_one_update_per_table(self):
+        workout = self.create_workout(exercises=2, sets=3)
+        kept = self.create_workout(date=datetime.date(2022, 6, 2))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.delete('/workouts/%s/' % workout.pk)
+
+        self.assertEqual(response.status_code, 204)
+        updates = [q['sql'] for q in queries if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len([sql for sql in updates if 'deleted_at' in sql]), 3)
+        self.assertEqual(set(Workout.objects.all()), {kept})
+        self.assertEqual(Exercise.objects.filter(workout=workout).count(), 0)
+        self.assertEqual(ExerciseSet.all_objects.filter(exercise__workout=workout, deleted_at__isnull=False).count(), 6)
+        self.assertEqual(ExerciseSet.objects.count(), 6)
+
+    def test_deleted_rows_are_hidden_and_summaries_refreshed(self):
+        workout = self.create_workout()
+        self.client.delete('/exercisetypes/%s/' % self.squat.pk)
+
+        self.assertEqual([e['id'] for e in self.client.get('/exercisetypes/').data['results']], [self.bench.pk])
+        self.assertEqual(self.client.get('/exercisetypes/%s/' % self.squat.pk).status_code, 404)
+        sets = self.client.get('/workoutsnested/%s/' % workout.pk).data['exercises']
+        self.assertEqual([e['exercise_type'] for e in sets], [self.bench.pk])
+        self.assertFalse(DailyExerciseSummary.objects.filter(exercise_type=self.squat).exists())
+        self.assertFalse(OneRepMax.objects.filter(exercise_type=self.squat).exists())
+
+    def test_deleting_a_type_with_a_long_history_refreshes_it_by_range(self):
+        self.create_workout()
+        exercise = Exercise.objects.filter(exercise_type=self.squat).get()
+        start = datetime.date(2018, 1, 1)
+        ExerciseSet.objects.bulk_create(
+            ExerciseSet(user=self.user, exercise=exercise, exercise_type=self.squat,
+                        date_performed=start + datetime.timedelta(days=i), reps=5, weight=100)
+            for i in range(1500))
+        rebuild_daily_summaries(self.user)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.delete('/exercisetypes/%s/' % self.squat.pk)
+
+        self.assertEqual(response.status_code, 204)
+        summary_deletes = [q['sql'] for q in queries
+                           if q['sql'].startswith('DELETE FROM "daily_exercise_summary"')]
+        self.assertEqual(len(summary_deletes), 1)
+        self.assertFalse(DailyExerciseSummary.objects.filter(exercise_type=self.squat).exists())
+        self.assertFalse(PersonalRecord.objects.filter(exercise_type=self.squat).exists())
+        self.assertTrue(DailyExerciseSummary.objects.filter(exercise_type=self.bench).exists())
+
+    def test_purge_removes_expired_rows_in_batches(self):
+        expired = self.create_workout()
+        recent = self.create_workout(date=datetime.date(2022, 6, 2))
+        expired.delete()
+        recent.delete()
+        Workout.all_objects.filter(pk=expired.pk).update(deleted_at=datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc))
+        Exercise.all_objects.filter(workout=expired).update(deleted_at=datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc))
+        ExerciseSet.all_objects.filter(exercise__workout=expired).update(
+            deleted_at=datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc))
+        assign_perm('tracker.view_workout', self.other, expired)
+
+        out = io.StringIO()
+        call_command('purge_deleted', batch_size=2, stdout=out)
+
+        self.assertIn('tracker.ExerciseSet: 6 row(s) purged', out.getvalue())
+        self.assertEqual(list(Workout.all_objects.all()), [recent])
+        self.assertEqual(ExerciseSet.all_objects.count(), 6)
+        self.assertFalse(UserObjectPermission.objects.exists())
+
+
+class PlanTests(TrackerTestCase):
+    def setUp(self):
+        super().setUp()
+        OneRepMax.objects.create(user=self.user, exercise_type=self.squat, weight=140)
+        OneRepMax.objects.create(user=self.user, exercise_type=self.bench, weight=100)
+
+    def template(self, weeks=12, **kwargs):
+        return {
+            'name': 'Strength', 'start_date': '2022-07-04', 'weeks': weeks, 'days': [
+                {'day': 0, 'name': 'Heavy', 'exercises': [
+                    {'exercise_type': self.squat.pk, 'sets': 5, 'reps': 5, 'percentage': 75, 'progression': 2.5},
+                    {'exercise_type': self.bench.pk, 'sets': 3, 'reps': 8, 'percentage': 70},
+                ]},
+                {'day': 3, 'exercises': [
+                    {'exercise_type': self.bench.pk, 'sets': 5, 'reps': 3, 'percentage': 85},
+                ]},
+            ], **kwargs}
+
+    def test_expands_template(self):
+        ContentType.objects.get_for_model(ExerciseType)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/plans/', self.template(), format='json')
+        # Only reads are compared, as SQLite splits large INSERTs to stay under
+        # its variable limit: the shares, the exercise types and the one rep maxes.
+        plan_queries = [q['sql'][:20] for q in queries if q['sql'].startswith('SELECT')]
+        self.assertEqual(len(plan_queries), 3)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data, {
+            'workouts': 24, 'exercises': 36, 'sets': 12 * 13,
+            'start_date': datetime.date(2022, 7, 4), 'end_date': datetime.date(2022, 9, 22)})
+        self.assertEqual(
+            list(Workout.objects.filter(user=self.user).order_by('date_performed').values_list('name', flat=True)[:2]),
+            ['Heavy week 1', 'Strength week 1'])
+
+        squats = ExerciseSet.objects.filter(exercise_type=self.squat).order_by('date_performed')
+        self.assertEqual([(s.weight, s.percentage, s.planned) for s in (squats[0], squats.last())],
+                         [(105, 75, True), (142.5, 102.5, True)])
+        self.assertEqual(set(ExerciseSet.objects.filter(reps=3).values_list('weight', flat=True)), {85})
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post('/plans/', self.template(weeks=1), format='json')
+        self.assertEqual([q['sql'][:20] for q in queries if q['sql'].startswith('SELECT')], plan_queries)
+
+    def test_planned_sets_count_once_performed(self):
+        self.client.post('/plans/', self.template(weeks=1), format='json')
+
+        self.assertFalse(DailyExerciseSummary.objects.exists())
+        self.assertFalse(PersonalRecord.objects.exists())
+        self.assertEqual(OneRepMax.objects.get(exercise_type=self.squat).weight, 140)
+        self.assertEqual(len(self.client.get('/export/csv/').getvalue().decode().splitlines()), 1)
+
+        exercise_set = ExerciseSet.objects.filter(exercise_type=self.squat).first()
+        response = self.client.patch('/exercisesets/%s/' % exercise_set.pk, {'planned': False, 'weight': 150})
+        self.assertEqual(response.status_code, 200)
+
+        summary = DailyExerciseSummary.objects.get()
+        self.assertEqual((summary.exercise_type_id, summary.set_count, summary.best_weight), (self.squat.pk, 1, 150))
+        self.assertEqual(OneRepMax.objects.get(exercise_type=self.squat).weight, 175)
+        self.assertEqual(self.client.get('/exercisesets/?planned=false').data['results'][0]['id'], exercise_set.pk)
+
+    def test_rejects_missing_and_unowned_exercise_types(self):
+        OneRepMax.objects.filter(exercise_type=self.bench).delete()
+        response = self.client.post('/plans/', self.template(), format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['days'], ['No one rep max for Bench Press.'])
+
+        template = self.template()
+        template['days'][1]['exercises'][0]['exercise_type'] = ExerciseType.objects.create(user=self.other, name='Row').pk
+        self.assertEqual(self.client.post('/plans/', template, format='json').status_code, 400)
+
+        self.assertEqual(self.client.post('/plans/', self.template(weeks=52, rounding=-1), format='json').status_code, 400)
+        self.assertFalse(Workout.objects.exists())
+
+
+@override_settings(TRACKER_SYNC_LAG_SECONDS=0)
+class SyncTests(TrackerTestCase):
+    def sync(self, since='', **params):
+        response = self.client.get('/sync/', {'since': since, **params})
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def test_returns_only_changes_since_the_watermark(self):
+        workout = self.create_workout(exercises=1, sets=2)
+        self.create_workout(user=self.other)
+        first = self.sync()
+        self.assertEqual(len(first['exercisetypes']), 2)
+        self.assertEqual(len(first['exercisesets']), 2)
+        self.assertEqual(first['workouts'][0]['name'], 'Workout')
+
+        self.assertFalse(any(self.sync(first['watermark'])[name] for name in ('workouts', 'exercisesets')))
+
+        exercise_set = ExerciseSet.objects.first()
+        self.client.patch('/exercisesets/%s/' % exercise_set.pk, {'reps': 8})
+        delta = self.sync(first['watermark'])
+        self.assertEqual([(s['id'], s['reps']) for s in delta['exercisesets']], [(exercise_set.pk, 8)])
+        self.assertEqual(delta['workouts'], [])
+
+        self.client.delete('/workouts/%s/' % workout.pk)
+        delta = self.sync(delta['watermark'])
+        self.assertEqual([w['id'] for w in delta['workouts']], [workout.pk])
+        self.assertIsNotNone(delta['workouts'][0]['deleted_at'])
+        self.assertNotIn('name', delta['workouts'][0])
+        self.assertEqual(len(delta['exercisesets']), 2)
+
+    def test_paginates_large_deltas(self):
+        for day in range(1, 4):
+            self.create_workout(date=datetime.date(2022, 6, day))
+
+        seen = []
+        data = {'watermark': '', 'has_more': True}
+        while data['has_more']:
+            data = self.sync(data['watermark'], limit=4)
+            rows = [(name, row['id']) for name in ('exercisetypes', 'workouts', 'exercises', 'exercisesets')
+                    for row in data[name]]
+            self.assertLessEqual(len(rows), 4)
+            seen.extend(rows)
+
+        self.assertEqual(len(seen), len(set(seen)))
+        self.assertEqual(len(seen), 2 + 3 + 6 + 18)
+
+    @override_settings(TRACKER_SYNC_LAG_SECONDS=60)
+    def test_recent_rows_are_sent_again(self):
+        self.create_workout()
+        first = self.sync()
+
+        self.assertEqual(len(self.sync(first['watermark'])['workouts']), 1)
+
+    @override_settings(TRACKER_SYNC_LAG_SECONDS=60)
+    def test_pages_never_move_past_the_lag(self):
+        for day in range(1, 4):
+            self.create_workout(date=datetime.date(2022, 6, day))
+
+        first = self.sync(limit=4)
+        second = self.sync(first['watermark'], limit=4)
+
+        self.assertTrue(first['has_more'])
+        self.assertEqual(second['workouts'], first['workouts'])
+
+    def test_watermarks_older_than_the_retention_need_a_full_resync(self):
+        workout = self.create_workout()
+        watermark = self.sync()['watermark']
+        self.client.delete('/workouts/%s/' % workout.pk)
+        expired = timezone.now() - datetime.timedelta(days=settings.TRACKER_SOFT_DELETE_RETENTION_DAYS + 1)
+        for model in (Workout, Exercise, ExerciseSet):
+            model.all_objects.filter(user=self.user).update(deleted_at=expired, updated_at=expired)
+        call_command('purge_deleted', stdout=io.StringIO())
+
+        with mock.patch('django.utils.timezone.now', return_value=timezone.now() + datetime.timedelta(
+                days=settings.TRACKER_SOFT_DELETE_RETENTION_DAYS + 1)):
+            response = self.client.get('/sync/', {'since': watermark})
+
+        self.assertEqual(response.status_code, 410)
+        self.assertEqual(response.data['detail'].code, 'full_resync')
+        self.assertEqual(self.client.get('/sync/').status_code, 200)
+
+    def test_rejects_invalid_watermarks(self):
+        self.assertEqual(self.client.get('/sync/', {'since': 'nonsense'}).status_code, 400)
+        self.assertEqual(self.client.get('/sync/', {'limit': '0'}).status_code, 400)
+
+
+class ValuesListTests(TrackerTestCase):
+    def setUp(self):
+        super().setUp()
+        for day in range(1, 4):
+            self.create_workout(date=datetime.date(2022, 6, day))
+        ExerciseSet.objects.filter(weight=105).update(percentage=72.5)
+        for day in range(1, 4):
+            UserWeight.objects.create(user=self.user, weight=80.5 + day, date=datetime.date(2022, 6, day))
+        self.create_workout(user=self.other)
+
+    def get(self, url, values):
+        get_cache().clear()
+        with override_settings(TRACKER_VALUES_LISTS=values), CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_output_matches_serializers(self):
+        urls = [
+            '/workouts/', '/workouts/?page_size=2', '/workouts/?limit=2&offset=1',
+            '/exercisetypes/', '/exercisetypes/?limit=1',
+            '/exercisesets/', '/exercisesets/?page_size=5', '/exercisesets/?limit=4&offset=7',
+            '/exercisesets/?exercise_type=%s&start_date=2022-06-02' % self.bench.pk,
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                expected, expected_queries = self.get(url, False)
+                response, queries = self.get(url, True)
+                self.assertEqual(response.content, expected.content)
+                self.assertLessEqual(queries, expected_queries)
+
+        cursor = json.loads(self.get('/exercisesets/?page_size=5', True)[0].content)['next']
+        self.assertEqual(self.get(cursor, True)[0].content, self.get(cursor, False)[0].content)
+
+    def test_user_weights_match_serializer(self):
+        # UserWeightViewSet is not routed, so it is called directly.
+        view = UserWeightViewSet.as_view({'get': 'list'})
+        responses = []
+        for values in (False, True):
+            request = APIRequestFactory().get('/userweights/', {'page_size': 2})
+            force_authenticate(request, self.user)
+            with override_settings(TRACKER_VALUES_LISTS=values):
+                responses.append(view(request).render().content)
+
+        self.assertEqual(responses[0], responses[1])
+        self.assertEqual(len(json.loads(responses[1])['results']), 2)
+
+    def test_rejects_fields_that_need_instances(self):
+        with self.assertRaises(ImproperlyConfigured):
+            ValuesSerializer(NestedWorkoutSerializer)
+
+
+class ColumnarTests(TrackerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.create_workout()
+        self.create_workout(user=self.other)
+        ExerciseSet.objects.filter(user=self.user, weight=105).update(percentage=75)
+
+    def test_columns_match_the_regular_list(self):
+        rows = self.client.get('/exercisesets/?exercise_type=%s' % self.squat.pk).data['results']
+
+        with self.assertNumQueries(2):
+            response = self.client.get(
+                '/exercisesets/?exercise_type=%s' % self.squat.pk,
+                HTTP_ACCEPT='application/vnd.tracker.columnar+json')
+
+        self.assertEqual(response['Content-Type'], 'application/vnd.tracker.columnar+json')
+        columns = json.loads(response.content)['results']
+        self.assertEqual(list(columns), ['id', 'date_performed', 'exercise_type', 'exercise', 'reps', 'weight', 'percentage', 'planned'])
+        self.assertEqual([dict(zip(columns, values)) for values in zip(*columns.values())], rows)
+
+    def test_pages_keep_the_format(self):
+        first = json.loads(self.client.get('/exercisesets/?format=columnar&page_size=4').content)
+        second = json.loads(self.client.get(first['next']).content)
+
+        self.assertEqual(len(first['results']['id']), 4)
+        self.assertEqual(len(second['results']['id']), 2)
+        self.assertIsNone(second['next'])
+
+    def test_packed(self):
+        sets = list(ExerciseSet.objects.filter(user=self.user).order_by('date_performed', 'id'))
+
+        content = self.client.get('/exercisesets/?format=packed').content
+
+        self.assertEqual(content[:4], b'TRK1')
+        count, header_length = struct.unpack('<II', content[4:12])
+        header = json.loads(content[12:12 + header_length])
+        self.assertEqual(count, len(sets))
+        self.assertIsNone(header['next'])
+        offset = 12 + header_length
+        columns = {}
+        for field, typecode in header['columns']:
+            values = array.array(typecode)
+            values.frombytes(content[offset:offset + values.itemsize * count])
+            columns[field] = values.tolist()
+            offset += values.itemsize * count
+        self.assertEqual(offset, len(content))
+        self.assertEqual(columns['id'], [s.pk for s in sets])
+        self.assertEqual(columns['date_performed'][0], (sets[0].date_performed - datetime.date(1970, 1, 1)).days)
+        self.assertEqual(columns['weight'], [s.weight for s in sets])
+        self.assertTrue(math.isnan(columns['percentage'][0]))
+        self.assertEqual(columns['percentage'][1], 75)
+        self.assertEqual(columns['planned'], [0] * len(sets))
+
+    def test_errors_and_other_actions_stay_json(self):
+        exercise_set = ExerciseSet.objects.filter(user=self.user).first()
+
+        self.assertEqual(
+            self.client.get('/exercisesets/%s/?format=columnar' % exercise_set.pk).status_code, 404)
+        response = self.client.get('/exercisesets/?format=packed&cursor=nonsense')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response['Content-Type'], 'application/json')
+
+
+@override_settings(TRACKER_DATABASE_REPLICAS=list(REPLICA_ALIASES))
+class ReplicaRouterTests(TrackerTestMixin, TransactionTestCase):
+    # The test runner adds the replicas as mirrors of the test database. They
+    # have connections of their own, so they only see committed rows.
+    databases = {'default', *REPLICA_ALIASES}
+
+    def setUp(self):
+        super().setUp()
+        self.create_workout(exercises=1, sets=1)
+
+    def replica_queries(self):
+        return [CaptureQueriesContext(connections[alias]) for alias in REPLICA_ALIASES]
+
+    def get_workouts(self, client=None):
+        return [w['id'] for w in (client or self.client).get('/workoutsnested/').data['results']]
+
+    def read_workouts(self, client=None):
+        """
+        Returns the number of workouts listed and of the queries the replicas
+        served for it.
+        """
+        replicas = self.replica_queries()
+        with replicas[0], replicas[1]:
+            workouts = self.get_workouts(client)
+        return len(workouts), sum(len(replica.captured_queries) for replica in replicas)
+
+    def test_viewset_reads_spread_over_replicas(self):
+        replicas = self.replica_queries()
+        with replicas[0], replicas[1]:
+            for _ in range(20):
+                self.assertEqual(len(self.get_workouts()), 1)
+                self.assertEqual(len(self.client.get('/exercisesets/').data['results']), 1)
+        self.assertTrue(all(replica.captured_queries for replica in replicas))
+
+    @override_settings(TRACKER_DATABASE_REPLICAS=[])
+    def test_reads_use_primary_without_replicas(self):
+        self.assertEqual(self.read_workouts(), (1, 0))
+
+    def test_writes_pin_the_user_to_the_primary(self):
+        response = self.client.post('/workouts/', {'name': 'Arms', 'date_performed': '2022-06-02'})
+        self.assertEqual(response.status_code, 201)
+
+        self.assertEqual(self.read_workouts(), (2, 0))
+
+        # The cookie pins this client even without the cache entry, and the
+        # cache entry pins the user's other clients, which have no cookie.
+        get_cache().clear()
+        self.assertEqual(self.read_workouts(), (2, 0))
+        self.client.post('/workouts/', {'name': 'Back', 'date_performed': '2022-06-03'})
+        other_device = APIClient()
+        other_device.force_authenticate(self.user)
+        self.assertEqual(self.read_workouts(other_device), (3, 0))
+
+        other_user = APIClient()
+        other_user.force_authenticate(self.other)
+        self.assertTrue(self.read_workouts(other_user)[1])
+
+    @override_settings(TRACKER_REPLICA_PIN_SECONDS=0)
+    def test_pin_expires(self):
+        self.client.post('/workouts/', {'name': 'Arms', 'date_performed': '2022-06-02'})
+
+        self.assertTrue(self.read_workouts()[1])
+
+    def test_failed_writes_do_not_pin(self):
+        response = self.client.post('/workouts/', {'name': 'Arms'})
+        self.assertEqual(response.status_code, 400)
+
+        self.assertNotIn('tracker_primary_until', response.cookies)
+        self.assertTrue(self.read_workouts()[1])
+
+
+class AuthenticationTests(TrackerTestCase):
+    def setUp(self):
+        super().setUp()
+        clear_user_cache()
+        self.workout = self.create_workout(exercises=1, sets=1)
+
+    def jwt_client(self, user):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Bearer %s' % AccessToken.for_user(user))
+        return client
+
+    def auth_queries(self, client, path):
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return [q['sql'] for q in queries if 'FROM "tracker_user" ' in q['sql'] or '"authtoken_token"' in q['sql']]
+
+    def test_jwt_user_is_loaded_once(self):
+        client = self.jwt_client(self.user)
+
+        self.assertEqual(len(self.auth_queries(client, '/workouts/')), 1)
+        self.assertEqual(self.auth_queries(client, '/workouts/'), [])
+        self.assertEqual(self.auth_queries(client, '/workouts/%s/' % self.workout.pk), [])
+        self.assertEqual(client.get('/workouts/').data['results'][0]['id'], self.workout.pk)
+
+        self.assertEqual(self.jwt_client(self.other).get('/workouts/%s/' % self.workout.pk).status_code, 404)
+
+    @override_settings(TRACKER_AUTH_USER_CACHE_SECONDS=0)
+    def test_jwt_user_cache_can_be_turned_off(self):
+        client = self.jwt_client(self.user)
+
+        self.assertEqual(len(self.auth_queries(client, '/workouts/')), 1)
+        self.assertEqual(len(self.auth_queries(client, '/workouts/')), 1)
+
+    def test_deactivating_a_user_evicts_it(self):
+        client = self.jwt_client(self.user)
+        client.get('/workouts/')
+
+        self.user.is_active = False
+        self.user.save()
+
+        self.assertEqual(client.get('/workouts/').status_code, 401)
+
+    def test_token_authentication_makes_one_query(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Token %s' % Token.objects.create(user=self.user).key)
+
+        self.assertEqual(len(self.auth_queries(client, '/workouts/')), 1)
+
+
+class ConnectionBenchmarkTests(TransactionTestCase):
+    def test_reports_both_modes(self):
+        output = io.StringIO()
+        call_command('benchmark_connections', requests=3, stdout=output)
+
+        lines = output.getvalue().splitlines()
+        self.assertEqual([line.split()[0] for line in lines], ['CONN_MAX_AGE=0', 'CONN_MAX_AGE=60'])
+
+
+class BenchmarkTests(TestCase):
+    def test_benchmark_covers_every_route(self):
+        with tempfile.NamedTemporaryFile('r', suffix='.json') as fileobj:
+            call_command('benchmark_api', users=1, workouts=3, repeat=1, output=fileobj.name, stdout=io.StringIO())
+            results = json.load(fileobj)['results']
+
+        self.assertEqual([r for r in results if r['status'] >= 400], [])
+        self.assertTrue(all(r['queries'] > 0 and r['peak_memory_kb'] > 0 for r in results if r['name'] != 'api root'))
+        paths = {r['path'].split('?')[0] for r in results}
+        for prefix, _, _ in router.registry:
+            self.assertIn('/%s/' % prefix, paths)
+        self.assertTrue({'/export/csv/', '/import/csv/', '/sync/'} <= paths)
+
+
+# Read workers use their own connections, so the data must be committed.
+class AsyncReadTests(TransactionTestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.user = User.objects.create(email='lifter@example.com')
+        self.squat = ExerciseType.objects.create(user=self.user, name='Squat')
+        self.factory = AsyncRequestFactory()
+
+    def call(self, view, request, **kwargs):
+        force_authenticate(request, self.user)
+        response = async_to_sync(view)(request, **kwargs)
+        response.render()
+        return response
+
+    def test_views_are_sync_unless_enabled(self):
+        view = WorkoutViewSet.as_view({'get': 'list'})
+
+        self.assertFalse(asyncio.iscoroutinefunction(view))
+
+    @override_settings(TRACKER_ASYNC_READS=True)
+    def test_list_and_retrieve(self):
+        workout = Workout.objects.create(user=self.user, name='Legs', date_performed=datetime.date(2022, 6, 1))
+        exercise = Exercise.objects.create(
+            user=self.user, workout=workout, exercise_type=self.squat, date_performed=workout.date_performed)
+        ExerciseSet.objects.create(
+            user=self.user, exercise=exercise, exercise_type=self.squat,
+            date_performed=workout.date_performed, reps=5, weight=100)
+
+        list_view = NestedWorkoutViewSet.as_view({'get': 'list'})
+        detail_view = NestedWorkoutViewSet.as_view({'get': 'retrieve'})
+        self.assertTrue(asyncio.iscoroutinefunction(list_view))
+
+        listed = self.call(list_view, self.factory.get('/workoutsnested/'))
+        retrieved = self.call(detail_view, self.factory.get('/workoutsnested/%s/' % workout.pk), pk=workout.pk)
+
+        self.assertEqual(listed.status_code, 200)
+        self.assertEqual(listed.data['results'][0]['exercises'][0]['exercise_sets'][0]['weight'], 100)
+        self.assertEqual(retrieved.data['id'], workout.pk)
+
+    @override_settings(TRACKER_ASYNC_READS=True)
+    def test_writes_run_through_async_view(self):
+        view = WorkoutViewSet.as_view({'get': 'list', 'post': 'create'})
+        request = self.factory.post(
+            '/workouts/', {'name': 'Legs', 'date_performed': '2022-06-01'}, content_type='application/json')
+
+        response = self.call(view, request)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Workout.objects.get().user, self.user)
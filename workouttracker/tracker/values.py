@@ -0,0 +1,79 @@
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework import serializers
+from rest_framework.response import Response
+
+from workouttracker.tracker.pagination import TrackerCursorPagination
+
+
+class ValuesSerializer:
+    """
+    Produces the same representation as ``serializer_class`` straight from
+    ``values_list()`` rows. Each readable field of the serializer becomes one
+    column: relations to a primary key are sent as the stored id, other model
+    fields through the serializer field's own ``to_representation``, so the
+    output cannot drift from the regular serializer. Fields that need a model
+    instance (nested serializers, hyperlinks, method fields) are rejected.
+    """
+
+    def __init__(self, serializer_class):
+        self.columns = []
+        for field in serializer_class().fields.values():
+            if field.write_only:
+                continue
+            if field.source == '*' or isinstance(field, (
+                    serializers.BaseSerializer, serializers.HyperlinkedRelatedField,
+                    serializers.ManyRelatedField, serializers.SerializerMethodField)):
+                raise ImproperlyConfigured(
+                    '%s.%s cannot be read from values().' % (serializer_class.__name__, field.field_name))
+            if isinstance(field, serializers.PrimaryKeyRelatedField) and field.pk_field is None:
+                convert = None
+            else:
+                convert = field.to_representation
+            self.columns.append((field.field_name, field.source.replace('.', '__'), convert))
+
+    @property
+    def lookups(self):
+        return [lookup for _, lookup, _ in self.columns]
+
+    def to_representation(self, rows):
+        columns = [(name, convert) for name, _, convert in self.columns]
+        return [
+            {name: value if value is None or convert is None else convert(value)
+             for (name, convert), value in zip(columns, row)}
+            for row in rows
+        ]
+
+
+_values_serializers = {}
+
+
+def get_values_serializer(serializer_class):
+    if serializer_class not in _values_serializers:
+        _values_serializers[serializer_class] = ValuesSerializer(serializer_class)
+    return _values_serializers[serializer_class]
+
+
+class ValuesListMixin:
+    """
+    Serves list requests through ``ValuesSerializer`` when
+    ``TRACKER_VALUES_LISTS`` is on, which it is unless turned off to compare
+    against the regular serializers. The ordering fields are read too, so
+    cursor pagination can take its position from the rows.
+    """
+
+    def list(self, request, *args, **kwargs):
+        if not getattr(settings, 'TRACKER_VALUES_LISTS', True):
+            return super().list(request, *args, **kwargs)
+
+        values_serializer = get_values_serializer(self.get_serializer_class())
+        lookups = values_serializer.lookups
+        ordering = getattr(self, 'ordering', None) or TrackerCursorPagination.ordering
+        ordering = [field.lstrip('-') for field in ordering]
+        queryset = self.filter_queryset(self.get_queryset()).values_list(
+            *lookups, *[field for field in ordering if field not in lookups], named=True)
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(values_serializer.to_representation(page))
+        return Response(values_serializer.to_representation(queryset))
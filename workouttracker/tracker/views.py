@@ -1,144 +1,205 @@
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import render
+from django.db import transaction
 from django.db.models import Prefetch
 from requests import request
 from rest_framework import viewsets
 from rest_framework import permissions
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.parsers import MultiPartParser
+from rest_framework.response import Response
+from rest_framework.views import APIView
 from guardian.mixins import PermissionRequiredMixin, PermissionListMixin
-from guardian.shortcuts import assign_perm, get_objects_for_user
 
-from workouttracker.tracker.models import User, UserWeight, ExerciseType, Workout, Exercise, ExerciseSet
-from workouttracker.tracker.serializers import NestedExerciseSerializer, NestedWorkoutSerializer, UserSerializer, UserWeightSerializer, ExerciseTypeSerializer, WorkoutSerializer, ExerciseSerializer, ExerciseSetSerializer
+from workouttracker.tracker.models import User, UserWeight, ExerciseType, Workout, Exercise, ExerciseSet, DailyExerciseSummary, PersonalRecord
+from workouttracker.tracker.async_views import AsyncReadMixin
+from workouttracker.tracker.bulk import BulkWriteMixin
+from workouttracker.tracker.columnar import ColumnarListMixin
+from workouttracker.tracker.db import ReplicaReadMixin
+from workouttracker.tracker.export import EXPORT_FORMATS, export_rows
+from workouttracker.tracker.importer import IMPORT_READERS, HistoryImporter
+from workouttracker.tracker.plans import generate_plan
+from workouttracker.tracker.profiling import ProfiledViewMixin
+from workouttracker.tracker.cache import CachedListMixin, InvalidatesCacheMixin
+from workouttracker.tracker.analytics import (
+    record_new_sets, refresh_daily_summaries, refresh_summary_ranges, summary_keys, summary_ranges, weekly_progress)
+from workouttracker.tracker.shortcuts import get_objects_for_owner, get_permission_checker
+from workouttracker.tracker.sync import get_changes
+from workouttracker.tracker.values import ValuesListMixin
+from workouttracker.tracker.serializers import NestedExerciseSerializer, NestedWorkoutSerializer, UserSerializer, UserWeightSerializer, ExerciseTypeSerializer, WorkoutSerializer, ExerciseSerializer, ExerciseSetSerializer, ExerciseProgressSerializer, WeeklyExerciseProgressSerializer, PersonalRecordSerializer, DailyVolumeSerializer, PlanTemplateSerializer
 
 # Create your views here.
 
 
+PERMISSION_ACTIONS = {
+    'GET': 'view',
+    'HEAD': 'view',
+    'OPTIONS': 'view',
+    'POST': 'add',
+    'PUT': 'change',
+    'PATCH': 'change',
+    'DELETE': 'delete',
+}
+
+
+def has_object_permission(request, obj, owner_id):
+    """
+    Owners are compared by FK id, so checking them costs no query. Anyone else
+    needs a guardian permission for the request method, read through the
+    request's shared ``ObjectPermissionChecker``.
+    """
+    user = request.user
+    if user.is_superuser:
+        return True
+    if not user.is_active:
+        return False
+
+    action = PERMISSION_ACTIONS.get(request.method)
+    if action is None:
+        return False
+    if owner_id == user.pk:
+        return True
+    return get_permission_checker(request).has_perm(
+        '%s.%s_%s' % (obj._meta.app_label, action, obj._meta.model_name), obj)
+
+
 class IsOwner(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
-        if request.user.is_superuser:
-            return True
-
-        if obj.user == request.user:
-            if request.method == 'GET':
-                return obj.user.has_perm('tracker.view_' + obj.__class__.__name__.lower())
-            elif request.method == 'POST':
-                return obj.user.has_perm('tracker.add_' + obj.__class__.__name__.lower())
-            elif request.method == 'PUT':
-                return obj.user.has_perm('tracker.change_' + obj.__class__.__name__.lower())
-            elif request.method == 'DELETE':
-                return obj.user.has_perm('tracker.delete_' + obj.__class__.__name__.lower())
-        return False
+        return has_object_permission(request, obj, obj.user_id)
 
 
 class IsRelatedExerciseTypeOwner(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
-        if request.user.is_superuser:
-            return True
-
-        if obj.exercise_type.user == request.user:
-            if request.method == 'GET':
-                return obj.exercise_type.user.has_perm('tracker.view_' + obj.exercise_type.__class__.__name__.lower())
-            elif request.method == 'POST':
-                return obj.exercise_type.user.has_perm('tracker.add_' + obj.exercise_type.__class__.__name__.lower())
-            elif request.method == 'PUT':
-                return obj.exercise_type.user.has_perm('tracker.change_' + obj.exercise_type.__class__.__name__.lower())
-            elif request.method == 'DELETE':
-                return obj.exercise_type.user.has_perm('tracker.delete_' + obj.exercise_type.__class__.__name__.lower())
-        return False
+        exercise_type = obj._state.fields_cache.get('exercise_type')
+        if exercise_type is None:
+            owner_id = ExerciseType.objects.filter(pk=obj.exercise_type_id).values_list('user_id', flat=True).first()
+            exercise_type = ExerciseType(pk=obj.exercise_type_id, user_id=owner_id)
+        return has_object_permission(request, exercise_type, exercise_type.user_id)
 
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(ProfiledViewMixin, ReplicaReadMixin, viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAuthenticated]
+    ordering = ('id',)
 
 
-class UserWeightViewSet(viewsets.ModelViewSet):
+class UserWeightViewSet(ProfiledViewMixin, ReplicaReadMixin, ValuesListMixin, InvalidatesCacheMixin, viewsets.ModelViewSet):
     queryset = UserWeight.objects.all()
     serializer_class = UserWeightSerializer
-    permission_classes = [permissions.IsAuthenticated, ]
+    permission_classes = [permissions.IsAuthenticated, IsOwner]
+    ordering = ('date', 'id')
+    cache_invalidates = (UserWeight,)
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
-        assign_perm('tracker.view_userweight',
-                    self.request.user, serializer.instance)
-        assign_perm('tracker.add_userweight',
-                    self.request.user, serializer.instance)
-        assign_perm('tracker.change_userweight',
-                    self.request.user, serializer.instance)
-        assign_perm('tracker.delete_userweight',
-                    self.request.user, serializer.instance)
 
     def get_queryset(self):
-        queryset = get_objects_for_user(
-            self.request.user, 'tracker.view_userweight')
+        queryset = get_objects_for_owner(
+            self.request.user, 'tracker.view_userweight', request=self.request)
         return queryset
 
 
-class ExerciseTypeViewSet(viewsets.ModelViewSet):
+class ExerciseTypeViewSet(ProfiledViewMixin, ReplicaReadMixin, CachedListMixin, ValuesListMixin, InvalidatesCacheMixin, viewsets.ModelViewSet):
     queryset = ExerciseType.objects.all()
     serializer_class = ExerciseTypeSerializer
-    permission_classes = [permissions.IsAuthenticated, ]
+    permission_classes = [permissions.IsAuthenticated, IsOwner]
+    ordering = ('id',)
+    cache_dependencies = (ExerciseType,)
+    cache_invalidates = (ExerciseType, Exercise, ExerciseSet)
 
-    # Assign user as logged-in user and assign permissions
+    # Assign user as logged-in user
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
-        assign_perm('tracker.view_exercisetype',
-                    self.request.user, serializer.instance)
-        assign_perm('tracker.add_exercisetype',
-                    self.request.user, serializer.instance)
-        assign_perm('tracker.change_exercisetype',
-                    self.request.user, serializer.instance)
-        assign_perm('tracker.delete_exercisetype',
-                    self.request.user, serializer.instance)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        ranges = summary_ranges(instance.exercise_sets.all())
+        instance.delete()
+        refresh_summary_ranges(ranges)
 
     def get_queryset(self):
-        queryset = get_objects_for_user(
-            self.request.user, 'tracker.view_exercisetype')
+        queryset = get_objects_for_owner(
+            self.request.user, 'tracker.view_exercisetype', request=self.request)
         return queryset
 
+    @action(detail=True, methods=['get'])
+    def progress(self, request, pk=None):
+        exercise_type = self.get_object()
+        queryset = exercise_type.daily_summaries.filter(user=request.user).order_by('date_performed')
+
+        start_date = request.query_params.get('start_date', None)
+        if start_date is not None:
+            queryset = queryset.filter(date_performed__gte=start_date)
+
+        end_date = request.query_params.get('end_date', None)
+        if end_date is not None:
+            queryset = queryset.filter(date_performed__lte=end_date)
 
-class WorkoutViewSet(viewsets.ModelViewSet):
+        period = request.query_params.get('period', 'day')
+        if period == 'day':
+            serializer = ExerciseProgressSerializer(queryset, many=True)
+        elif period == 'week':
+            serializer = WeeklyExerciseProgressSerializer(weekly_progress(queryset), many=True)
+        else:
+            raise ValidationError({'period': 'Expected "day" or "week".'})
+        return Response(serializer.data)
+
+    @action(detail=True, methods=['get'])
+    def records(self, request, pk=None):
+        exercise_type = self.get_object()
+        queryset = (PersonalRecord.objects
+                    .filter(user=request.user, exercise_type=exercise_type)
+                    .order_by('kind', 'reps'))
+        return Response(PersonalRecordSerializer(queryset, many=True).data)
+
+
+class WorkoutViewSet(ProfiledViewMixin, ReplicaReadMixin, AsyncReadMixin, CachedListMixin, ValuesListMixin, InvalidatesCacheMixin, viewsets.ModelViewSet):
     queryset = Workout.objects.all()
     serializer_class = WorkoutSerializer
-    permission_classes = [permissions.IsAuthenticated, ]
+    permission_classes = [permissions.IsAuthenticated, IsOwner]
+    cache_dependencies = (Workout,)
+    cache_invalidates = (Workout, Exercise, ExerciseSet)
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
-        assign_perm('tracker.view_workout',
-                    self.request.user, serializer.instance)
-        assign_perm('tracker.add_workout',
-                    self.request.user, serializer.instance)
-        assign_perm('tracker.change_workout',
-                    self.request.user, serializer.instance)
-        assign_perm('tracker.delete_workout',
-                    self.request.user, serializer.instance)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        ranges = summary_ranges(ExerciseSet.objects.filter(exercise__workout=instance))
+        instance.delete()
+        refresh_summary_ranges(ranges)
 
     def get_queryset(self):
-        queryset = get_objects_for_user(
-            self.request.user, 'tracker.view_workout')
+        queryset = get_objects_for_owner(
+            self.request.user, 'tracker.view_workout', request=self.request)
         return queryset
 
 
-class ExerciseViewSet(viewsets.ModelViewSet):
+class ExerciseViewSet(ProfiledViewMixin, ReplicaReadMixin, AsyncReadMixin, BulkWriteMixin, InvalidatesCacheMixin, viewsets.ModelViewSet):
     queryset = Exercise.objects.all()
     serializer_class = ExerciseSerializer
-    permission_classes = [permissions.IsAuthenticated, ]
+    permission_classes = [permissions.IsAuthenticated, IsOwner]
+    cache_invalidates = (Exercise, ExerciseSet)
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
-        assign_perm('tracker.view_exercise',
-                    self.request.user, serializer.instance)
-        assign_perm('tracker.add_exercise',
-                    self.request.user, serializer.instance)
-        assign_perm('tracker.change_exercise',
-                    self.request.user, serializer.instance)
-        assign_perm('tracker.delete_exercise',
-                    self.request.user, serializer.instance)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        ranges = summary_ranges(instance.exercise_sets.all())
+        instance.delete()
+        refresh_summary_ranges(ranges)
+
+    def perform_bulk_destroy(self, queryset):
+        ranges = summary_ranges(ExerciseSet.objects.filter(exercise__in=queryset))
+        queryset.delete()
+        refresh_summary_ranges(ranges)
 
     def get_queryset(self):
-        queryset = get_objects_for_user(
-            self.request.user, 'tracker.view_exercise')
+        queryset = get_objects_for_owner(
+            self.request.user, 'tracker.view_exercise', request=self.request)
 
         workout = self.request.query_params.get('workout', None)
         if workout is not None:
@@ -163,25 +224,46 @@ class ExerciseViewSet(viewsets.ModelViewSet):
         return queryset
 
 
-class ExerciseSetViewSet(viewsets.ModelViewSet):
+class ExerciseSetViewSet(ProfiledViewMixin, ReplicaReadMixin, AsyncReadMixin, ColumnarListMixin, ValuesListMixin, BulkWriteMixin, InvalidatesCacheMixin, viewsets.ModelViewSet):
     queryset = ExerciseSet.objects.all()
     serializer_class = ExerciseSetSerializer
-    permission_classes = [permissions.IsAuthenticated, ]
+    permission_classes = [permissions.IsAuthenticated, IsOwner]
+    cache_invalidates = (ExerciseSet,)
 
+    @transaction.atomic
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
-        assign_perm('tracker.view_exerciseset',
-                    self.request.user, serializer.instance)
-        assign_perm('tracker.add_exerciseset',
-                    self.request.user, serializer.instance)
-        assign_perm('tracker.change_exerciseset',
-                    self.request.user, serializer.instance)
-        assign_perm('tracker.delete_exerciseset',
-                    self.request.user, serializer.instance)
+        serializer.context['personal_records'] = record_new_sets([serializer.instance])
+
+    @transaction.atomic
+    def perform_update(self, serializer):
+        keys = summary_keys([serializer.instance])
+        serializer.save()
+        refresh_daily_summaries(keys | summary_keys([serializer.instance]), edited=[serializer.instance])
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        keys = summary_keys([instance])
+        instance.delete()
+        refresh_daily_summaries(keys, deleted=[instance.pk])
+
+    def perform_bulk_create(self, objs):
+        objs = ExerciseSet.objects.bulk_create(objs)
+        record_new_sets(objs)
+        return objs
+
+    def perform_bulk_update(self, objs, fields, originals):
+        ExerciseSet.objects.bulk_update(objs, fields)
+        refresh_daily_summaries(summary_keys(originals) | summary_keys(objs), edited=objs)
+
+    def perform_bulk_destroy(self, queryset):
+        exercise_sets = list(queryset)
+        queryset.delete()
+        refresh_daily_summaries(summary_keys(exercise_sets), deleted=[s.pk for s in exercise_sets])
 
     def get_queryset(self):
-        queryset = get_objects_for_user(
-            self.request.user, 'tracker.view_exerciseset')
+        queryset = get_objects_for_owner(
+            self.request.user, 'tracker.view_exerciseset', request=self.request)
         exercise = self.request.query_params.get('exercise', None)
         if exercise is not None:
             queryset = queryset.filter(exercise=exercise)
@@ -202,30 +284,60 @@ class ExerciseSetViewSet(viewsets.ModelViewSet):
         if date_performed is not None:
             queryset = queryset.filter(date_performed=date_performed)
 
+        planned = self.request.query_params.get('planned', None)
+        if planned is not None:
+            queryset = queryset.filter(planned=planned.lower() in ('1', 'true', 'yes'))
+
+        return queryset
+
+
+class DailyVolumeViewSet(ProfiledViewMixin, ReplicaReadMixin, viewsets.ReadOnlyModelViewSet):
+    queryset = DailyExerciseSummary.objects.all()
+    serializer_class = DailyVolumeSerializer
+    permission_classes = [permissions.IsAuthenticated, ]
+
+    def get_queryset(self):
+        queryset = DailyExerciseSummary.objects.filter(user=self.request.user)
+
+        exercise_types = self.request.query_params.getlist('exercise_type', None)
+        if exercise_types is not None and len(exercise_types) > 0:
+            queryset = queryset.filter(exercise_type__in=exercise_types)
+
+        start_date = self.request.query_params.get('start_date', None)
+        if start_date is not None:
+            queryset = queryset.filter(date_performed__gte=start_date)
+
+        end_date = self.request.query_params.get('end_date', None)
+        if end_date is not None:
+            queryset = queryset.filter(date_performed__lte=end_date)
+
         return queryset
 
 
 ##############################################################################################
 
-class NestedExerciseViewSet(viewsets.ModelViewSet):
+class NestedExerciseViewSet(ProfiledViewMixin, ReplicaReadMixin, AsyncReadMixin, InvalidatesCacheMixin, viewsets.ModelViewSet):
     queryset = Exercise.objects.all()
     serializer_class = NestedExerciseSerializer
-    permission_classes = [permissions.IsAuthenticated, ]
+    permission_classes = [permissions.IsAuthenticated, IsOwner]
+    cache_invalidates = (Exercise, ExerciseSet)
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
-        assign_perm('tracker.view_exercise',
-                    self.request.user, serializer.instance)
-        assign_perm('tracker.add_exercise',
-                    self.request.user, serializer.instance)
-        assign_perm('tracker.change_exercise',
-                    self.request.user, serializer.instance)
-        assign_perm('tracker.delete_exercise',
-                    self.request.user, serializer.instance)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        ranges = summary_ranges(instance.exercise_sets.all())
+        instance.delete()
+        refresh_summary_ranges(ranges)
 
     def get_queryset(self):
-        queryset = get_objects_for_user(
-            self.request.user, 'tracker.view_exercise')
+        queryset = get_objects_for_owner(
+            self.request.user, 'tracker.view_exercise', request=self.request)
+        queryset = queryset.prefetch_related(
+            Prefetch('exercise_sets', queryset=get_objects_for_owner(
+                self.request.user, 'tracker.view_exerciseset', request=self.request)),
+        )
 
         start_date = self.request.query_params.get('start_date', None)
         if start_date is not None:
@@ -242,25 +354,31 @@ class NestedExerciseViewSet(viewsets.ModelViewSet):
         return queryset
 
 
-class NestedWorkoutViewSet(viewsets.ModelViewSet):
+class NestedWorkoutViewSet(ProfiledViewMixin, ReplicaReadMixin, AsyncReadMixin, CachedListMixin, InvalidatesCacheMixin, viewsets.ModelViewSet):
     queryset = Workout.objects.all()
     serializer_class = NestedWorkoutSerializer
-    permission_classes = [permissions.IsAuthenticated, ]
+    permission_classes = [permissions.IsAuthenticated, IsOwner]
+    cache_dependencies = (Workout, Exercise, ExerciseSet)
+    cache_invalidates = (Workout, Exercise, ExerciseSet)
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
-        assign_perm('tracker.view_workout',
-                    self.request.user, serializer.instance)
-        assign_perm('tracker.add_workout',
-                    self.request.user, serializer.instance)
-        assign_perm('tracker.change_workout',
-                    self.request.user, serializer.instance)
-        assign_perm('tracker.delete_workout',
-                    self.request.user, serializer.instance)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        ranges = summary_ranges(ExerciseSet.objects.filter(exercise__workout=instance))
+        instance.delete()
+        refresh_summary_ranges(ranges)
         
     def get_queryset(self):
-        queryset = get_objects_for_user(
-            self.request.user, 'tracker.view_workout')
+        queryset = get_objects_for_owner(
+            self.request.user, 'tracker.view_workout', request=self.request)
+        queryset = queryset.prefetch_related(
+            Prefetch('exercises', queryset=get_objects_for_owner(
+                self.request.user, 'tracker.view_exercise', request=self.request)),
+            Prefetch('exercises__exercise_sets', queryset=get_objects_for_owner(
+                self.request.user, 'tracker.view_exerciseset', request=self.request)),
+        )
 
         start_date = self.request.query_params.get('start_date', None)
         if start_date is not None:
@@ -275,3 +393,64 @@ class NestedWorkoutViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(date_performed=date_performed)
         
         return queryset
+
+
+##############################################################################################
+
+class ExportView(ProfiledViewMixin, APIView):
+    permission_classes = [permissions.IsAuthenticated, ]
+
+    # The body is streamed as CSV or NDJSON regardless of the Accept header.
+    def perform_content_negotiation(self, request, force=False):
+        return super().perform_content_negotiation(request, force=True)
+
+    def get(self, request, export_format):
+        if export_format not in EXPORT_FORMATS:
+            raise NotFound('Unknown export format "%s".' % export_format)
+        stream, content_type = EXPORT_FORMATS[export_format]
+
+        rows = export_rows(
+            request.user,
+            start_date=request.query_params.get('start_date', None),
+            end_date=request.query_params.get('end_date', None),
+        )
+        response = StreamingHttpResponse(stream(rows), content_type=content_type)
+        response['Content-Disposition'] = 'attachment; filename="training-history.%s"' % export_format
+        return response
+
+
+class ImportView(ProfiledViewMixin, APIView):
+    permission_classes = [permissions.IsAuthenticated, ]
+    parser_classes = [MultiPartParser, ]
+
+    def post(self, request, import_format):
+        if import_format not in IMPORT_READERS:
+            raise NotFound('Unknown import format "%s".' % import_format)
+        upload = request.data.get('file', None)
+        if upload is None:
+            raise ValidationError({'file': 'A file upload is required.'})
+
+        dry_run = request.query_params.get('dry_run', '').lower() in ('1', 'true', 'yes')
+        importer = HistoryImporter(request.user, dry_run=dry_run)
+        stats = importer.run(IMPORT_READERS[import_format](upload.file))
+        return Response(stats, status=200 if dry_run else 201)
+
+
+class PlanView(ProfiledViewMixin, APIView):
+    permission_classes = [permissions.IsAuthenticated, ]
+
+    def post(self, request):
+        serializer = PlanTemplateSerializer(data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        return Response(generate_plan(request.user, serializer.validated_data), status=201)
+
+
+class SyncView(ProfiledViewMixin, APIView):
+    permission_classes = [permissions.IsAuthenticated, ]
+    max_limit = 1000
+
+    def get(self, request):
+        limit = request.query_params.get('limit', '500')
+        if not limit.isdigit() or not 0 < int(limit) <= self.max_limit:
+            raise ValidationError({'limit': ['Must be between 1 and %s.' % self.max_limit]})
+        return Response(get_changes(request.user, request.query_params.get('since', None), int(limit)))
@@ -25,6 +25,7 @@ router.register(r'exercisetypes', views.ExerciseTypeViewSet)
 router.register(r'workouts', views.WorkoutViewSet)
 router.register(r'exercises', views.ExerciseViewSet)
 router.register(r'exercisesets', views.ExerciseSetViewSet)
+router.register(r'dailyvolume', views.DailyVolumeViewSet)
 
 router.register(r'exercisesnested', views.NestedExerciseViewSet, basename='exercisesnested')
 router.register(r'workoutsnested', views.NestedWorkoutViewSet, basename='workoutsnested')
@@ -33,5 +34,9 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('dj_rest_auth/', include('dj_rest_auth.urls')),
     path('dj_rest_auth/registration/', include('dj_rest_auth.registration.urls')),
+    path('export/<str:export_format>/', views.ExportView.as_view(), name='export'),
+    path('import/<str:import_format>/', views.ImportView.as_view(), name='import'),
+    path('plans/', views.PlanView.as_view(), name='plans'),
+    path('sync/', views.SyncView.as_view(), name='sync'),
     path('', include(router.urls)),
 ]